@@ -0,0 +1,70 @@
+import random
+import time
+from datetime import date, timedelta
+
+from backend.services.calendrier import count_working_days, count_working_days_batch, get_maroc_holidays
+
+# Jours ouvrables sur des intervalles de 10 ans : boucle jour par jour d'origine (conversions
+# Hijri recalculées chaque jour) contre le calendrier pré-calculé.
+#     python -m backend.benchmarks.bench_calendrier
+RANGE_YEARS = 10
+CHECKED_RANGES = 200
+REFERENCE_CALLS = 3
+CALLS = 2000
+BATCH_SIZE = 500
+
+
+def reference_working_days(start: date, end: date) -> int:
+    # Ancienne implémentation de calculate_working_days, conservée comme référence
+    total_days = 0
+    current = start
+    while current < end:
+        holidays = get_maroc_holidays(current.year)
+        if current.weekday() < 5 and current not in holidays:
+            total_days += 1
+        current += timedelta(days=1)
+    return total_days
+
+
+def random_range(rng: random.Random, max_days: int):
+    start = date(2015, 1, 1) + timedelta(days=rng.randint(0, 3650))
+    return start, start + timedelta(days=rng.randint(0, max_days))
+
+
+def per_call_ms(fn, calls: int, *args) -> float:
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn(*args)
+    return (time.perf_counter() - started) * 1000 / calls
+
+
+def main():
+    rng = random.Random(0)
+
+    # Résultats identiques à la boucle d'origine (intervalles jusqu'à 10 ans)
+    for _ in range(CHECKED_RANGES):
+        start, end = random_range(rng, RANGE_YEARS * 366)
+        assert count_working_days(start, end) == reference_working_days(start, end), (start, end)
+    print({"intervalles_verifies": CHECKED_RANGES})
+
+    start = date(2015, 3, 14)
+    end = start + timedelta(days=RANGE_YEARS * 365)
+    count_working_days(start, end)
+    print({
+        "intervalle": f"{start} -> {end}",
+        "avant_ms": round(per_call_ms(reference_working_days, REFERENCE_CALLS, start, end), 2),
+        "apres_ms": round(per_call_ms(count_working_days, CALLS, start, end), 4),
+    })
+
+    # list_audits : une date de début par audit "En cours", même date de fin
+    starts = [random_range(rng, 0)[0] for _ in range(BATCH_SIZE)]
+    today = date.today()
+    print({
+        "audits": BATCH_SIZE,
+        "unitaire_ms": round(per_call_ms(lambda: [count_working_days(s, today) for s in starts], 20), 2),
+        "groupe_ms": round(per_call_ms(count_working_days_batch, 20, starts, today), 2),
+    })
+
+
+if __name__ == "__main__":
+    main()
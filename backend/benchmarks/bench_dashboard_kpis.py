@@ -0,0 +1,165 @@
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event, func
+from sqlalchemy.orm import Session
+
+# Tous les modèles : les relations et clés étrangères doivent être résolues
+import backend.models.commentaire
+import backend.models.demande_audit
+import backend.models.DemandeurContact
+import backend.models.email
+import backend.models.ip
+import backend.models.PieceJointe
+import backend.models.plan
+import backend.models.plan_search
+import backend.models.ports
+import backend.models.rollup
+import backend.models.vulnerability
+from backend.models.affectation import Affectation
+from backend.models.associations import affect_auditeur
+from backend.models.audit import Audit
+from backend.models.auditeur import Auditeur
+from backend.models.prestataire import Prestataire
+from backend.services.dashboard import compute_dashboard_kpis
+from database import Base
+
+# /admin/kpis : une requête par indicateur, en série (avant) contre requêtes consolidées
+# exécutées en parallèle sur des connexions distinctes (après). Allers-retours comptés par
+# requête SQL émise ; BENCH_RTT_MS simule la latence réseau d'un aller-retour vers la base.
+#     python -m backend.benchmarks.bench_dashboard_kpis
+BENCH_DB_URL = os.getenv("BENCH_DB_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_kpis.db')}")
+RTT_MS = (0.0, 2.0) if os.getenv("BENCH_RTT_MS") is None else (float(os.getenv("BENCH_RTT_MS")),)
+CALLS = 30
+AUDIT_COUNT = 20_000
+
+
+def seed(engine):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(2)
+    with Session(engine) as db:
+        db.bulk_insert_mappings(Prestataire, [
+            {"id": i, "nom": f"Prestataire {i}", "budget_total": rng.random() * 1e5,
+             "realisation": rng.choice([0, None, rng.random() * 1e4]), "solde": rng.random() * 1e3}
+            for i in range(1, 41)
+        ])
+        db.bulk_insert_mappings(Auditeur, [
+            {"id": i, "nom": "Nom", "prenom": "Prénom", "email": f"auditeur{i}@example.com", "phone": "0600000000",
+             "prestataire_id": rng.randint(1, 40)}
+            for i in range(1, 401)
+        ])
+        db.bulk_insert_mappings(Affectation, [
+            {"id": i, "demande_audit_id": i, "type_audit": rng.choice(["Pentest", "Revue de configuration", "Revue de code"]),
+             "prestataire_id": rng.randint(1, 40)}
+            for i in range(1, AUDIT_COUNT + 1)
+        ])
+        db.execute(affect_auditeur.insert(), [
+            {"affectation_id": rng.randint(1, AUDIT_COUNT), "auditeur_id": auditeur_id} for auditeur_id in range(1, 300)
+        ])
+        db.bulk_insert_mappings(Audit, [
+            {"id": i, "demande_audit_id": i, "affectation_id": i, "prestataire_id": rng.randint(1, 40),
+             "etat": rng.choice(["EN COURS", "SUSPENDU", "TERMINE"])}
+            for i in range(1, AUDIT_COUNT + 1)
+        ])
+        db.commit()
+
+
+def reference_dashboard_kpis(db: Session) -> dict:
+    # Ancienne implémentation de /admin/kpis (une requête par indicateur), conservée comme référence
+    total_auditeurs = db.query(Auditeur).count()
+    total_prestataires = db.query(Prestataire).count()
+    auditeurs_occupees = db.query(Auditeur).join(Auditeur.affectations).distinct().count()
+    audit_types = (
+        db.query(Affectation.type_audit, func.count(Audit.id).label("count"))
+        .join(Audit, Audit.affectation_id == Affectation.id)
+        .group_by(Affectation.type_audit)
+        .all()
+    )
+    taux_occupation = (auditeurs_occupees / total_auditeurs) * 100 if total_auditeurs > 0 else 0
+    total_audits = db.query(Audit).count()
+    audits_en_cours = db.query(Audit).filter(Audit.etat == "EN COURS").count()
+    audits_suspendu = db.query(Audit).filter(Audit.etat == "SUSPENDU").count()
+    audits_termines = db.query(Audit).filter(Audit.etat == "TERMINE").count()
+    total_affectations = db.query(Affectation).count()
+    top_prestataires = (
+        db.query(Prestataire.nom, func.count(Affectation.id).label("nb_affects"))
+        .join(Affectation)
+        .group_by(Prestataire.id)
+        .order_by(func.count(Affectation.id).desc())
+        .limit(5)
+        .all()
+    )
+    audits_par_prestataire = (
+        db.query(Prestataire.nom, func.count(Audit.id).label("nb_audits"))
+        .join(Affectation, Affectation.prestataire_id == Prestataire.id)
+        .join(Audit, Audit.affectation_id == Affectation.id)
+        .group_by(Prestataire.nom)
+        .all()
+    )
+    budget_total_alloue = db.query(func.coalesce(func.sum(Prestataire.budget_total), 0)).scalar()
+    realisation_total = db.query(func.coalesce(func.sum(Prestataire.realisation), 0)).scalar()
+    solde_total = db.query(func.coalesce(func.sum(Prestataire.solde), 0)).scalar()
+    taux_conso_budget = (realisation_total / budget_total_alloue) * 100 if budget_total_alloue > 0 else 0
+    prestataires_inactifs = db.query(Prestataire).filter(func.coalesce(Prestataire.realisation, 0) == 0).count()
+
+    return {
+        "auditeurs_total": total_auditeurs,
+        "prestataires_total": total_prestataires,
+        "taux_occupation_auditeurs": round(taux_occupation, 2),
+        "audits_total": total_audits,
+        "audits_en_cours": audits_en_cours,
+        "audits_suspendu": audits_suspendu,
+        "audits_termines": audits_termines,
+        "affectations_total": total_affectations,
+        "budget_total_alloue": round(budget_total_alloue, 2),
+        "realisation_total": round(realisation_total, 2),
+        "solde_total": round(solde_total, 2),
+        "taux_conso_budget": round(taux_conso_budget, 2),
+        "prestataires_inactifs": prestataires_inactifs,
+        "top_prestataires": [{"nom": nom, "nb_affects": nb_affects} for nom, nb_affects in top_prestataires],
+        "types_audit": [{"type": t, "count": c} for t, c in audit_types],
+        "audits_par_prestataire": [{"nom": nom, "nb_audits": nb_audits} for nom, nb_audits in audits_par_prestataire],
+    }
+
+
+def main():
+    engine = create_engine(BENCH_DB_URL)
+    seed(engine)
+
+    state = {"round_trips": 0, "rtt": 0.0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def count_round_trip(*args):
+        state["round_trips"] += 1
+        if state["rtt"]:
+            time.sleep(state["rtt"])
+
+    with Session(engine) as db:
+        results = {}
+        for name, compute in (("avant", reference_dashboard_kpis), ("apres", compute_dashboard_kpis)):
+            state["round_trips"] = 0
+            results[name] = compute(db)
+            results[f"{name}_allers_retours"] = state["round_trips"]
+        assert results["avant"] == results["apres"]
+
+        for rtt_ms in RTT_MS:
+            state["rtt"] = rtt_ms / 1000
+            timings = {}
+            for name, compute in (("avant", reference_dashboard_kpis), ("apres", compute_dashboard_kpis)):
+                compute(db)
+                started = time.perf_counter()
+                for _ in range(CALLS):
+                    compute(db)
+                timings[f"{name}_ms"] = round((time.perf_counter() - started) * 1000 / CALLS, 1)
+            print({
+                "rtt_ms": rtt_ms,
+                "allers_retours": f"{results['avant_allers_retours']} -> {results['apres_allers_retours']}",
+                **timings,
+            })
+
+
+if __name__ == "__main__":
+    main()
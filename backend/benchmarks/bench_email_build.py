@@ -0,0 +1,117 @@
+import email
+import os
+import tempfile
+import time
+from email.mime.application import MIMEApplication
+from email.mime.image import MIMEImage
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import make_msgid
+
+from jinja2 import Environment, FileSystemLoader
+
+from settings import settings
+from backend.services import email as email_service
+
+# Construction des emails : logo relu et template réécrit à chaque message, PDF encodé pour
+# chaque destinataire (avant) contre logo, templates et pièce jointe préparés une fois (après).
+#     python -m backend.benchmarks.bench_email_build
+# Template et logo générés dans un dossier temporaire : les résultats ne dépendent pas des
+# templates déployés
+MESSAGES = 300
+PDF_SIZE = 300_000
+TEMPLATE_NAME = "bench_template.html"
+TEMPLATE = (
+    '<html><body><img src="/pictures/logo.png" alt="logo"><h1>{{ subject }}</h1><p>{{ body }}</p>'
+    '{% for i in range(20) %}<div class="row">ligne {{ i }}</div>{% endfor %}</body></html>'
+)
+
+
+def reference_build_email(template_env, logo_path, to_email, subject, body, template_name,
+                          pdf_filename=None, pdf_content=None) -> MIMEMultipart:
+    # Ancienne implémentation de build_email, conservée comme référence
+    msg = MIMEMultipart('mixed')
+    msg['From'] = settings.SMTP_USER
+    msg['To'] = to_email
+    msg['Subject'] = subject
+    msg['Message-ID'] = make_msgid()
+
+    context = {"subject": subject, "body": body.replace('\n', '<br>')}
+    html = template_env.get_template(template_name).render(context)
+    html = html.replace('src="/pictures/logo.png"', 'src="cid:logo_cam"')
+
+    alt_part = MIMEMultipart('alternative')
+    alt_part.attach(MIMEText(body, 'plain'))
+    alt_part.attach(MIMEText(html, 'html'))
+    msg.attach(alt_part)
+
+    with open(logo_path, "rb") as img_file:
+        logo = MIMEImage(img_file.read())
+        logo.add_header('Content-ID', '<logo_cam>')
+        logo.add_header('Content-Disposition', 'inline', filename="logo.png")
+        msg.attach(logo)
+
+    if pdf_content and pdf_filename:
+        pdf = MIMEApplication(pdf_content, Name=pdf_filename)
+        pdf['Content-Disposition'] = f'attachment; filename="{pdf_filename}"'
+        msg.attach(pdf)
+
+    return msg
+
+
+def decoded_parts(msg) -> list:
+    parsed = email.message_from_bytes(msg.as_bytes())
+    return [(part.get_content_type(), part.get("Content-Disposition"), part.get("Content-ID"),
+             part.get_payload(decode=True)) for part in parsed.walk() if not part.is_multipart()]
+
+
+def messages_per_second(build) -> float:
+    build().as_bytes()
+    started = time.perf_counter()
+    for _ in range(MESSAGES):
+        build().as_bytes()
+    return MESSAGES / (time.perf_counter() - started)
+
+
+def main():
+    from PIL import Image
+
+    assets_dir = tempfile.mkdtemp()
+    with open(os.path.join(assets_dir, TEMPLATE_NAME), "w", encoding="utf-8") as template_file:
+        template_file.write(TEMPLATE)
+    logo_path = os.path.join(assets_dir, "logo.png")
+    Image.new("RGB", (512, 280), (0, 122, 61)).save(logo_path)
+
+    reference_env = Environment(loader=FileSystemLoader(assets_dir))
+    email_service.template_env = Environment(loader=email_service.LogoCidLoader(assets_dir), auto_reload=False)
+    email_service.LOGO_PATH = logo_path
+    email_service.get_logo_payload.cache_clear()
+
+    pdf = os.urandom(PDF_SIZE)
+    args = ("destinataire@example.com", "Sujet", "Corps\nligne 2", TEMPLATE_NAME)
+
+    before = reference_build_email(reference_env, logo_path, *args, "fiche.pdf", pdf)
+    after = email_service.build_email(*args, "fiche.pdf", pdf)
+    assert decoded_parts(before) == decoded_parts(after)
+
+    attachment = email_service.encode_attachment("fiche.pdf", pdf)
+    cases = {
+        "sans_piece_jointe": (
+            lambda: reference_build_email(reference_env, logo_path, *args),
+            lambda: email_service.build_email(*args),
+        ),
+        "pdf_300_ko": (
+            lambda: reference_build_email(reference_env, logo_path, *args, "fiche.pdf", pdf),
+            lambda: email_service.build_email(*args, "fiche.pdf", attachment),
+        ),
+    }
+    for name, (reference, current) in cases.items():
+        print({
+            "cas": name,
+            "avant_msg_par_s": round(messages_per_second(reference)),
+            "apres_msg_par_s": round(messages_per_second(current)),
+        })
+
+
+if __name__ == "__main__":
+    main()
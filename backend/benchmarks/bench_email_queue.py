@@ -0,0 +1,102 @@
+import smtplib
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+
+from settings import settings
+from backend.services import email_queue
+
+# Envoi des emails : une connexion SMTP ouverte dans la requête pour chaque message (avant)
+# contre dépôt dans la file et envoi par les workers sur connexions réutilisées (après).
+#     python -m backend.benchmarks.bench_email_queue
+# Serveur SMTP local de débogage lancé par le script (messages acceptés puis ignorés), sans
+# STARTTLS ni authentification : la poignée de main TLS et le login d'un vrai serveur ne font
+# qu'augmenter l'écart
+MESSAGES = 500
+
+
+class SinkHandler(socketserver.StreamRequestHandler):
+    received = 0
+    lock = threading.Lock()
+
+    def reply(self, line: str):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 localhost bench")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.reply("250 localhost")
+            elif command == b"DATA":
+                self.reply("354 fin par <CRLF>.<CRLF>")
+                while self.rfile.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                with SinkHandler.lock:
+                    SinkHandler.received += 1
+                self.reply("250 OK")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def build_message(i: int) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = "bench@localhost"
+    msg["To"] = "destinataire@localhost"
+    msg["Subject"] = f"Benchmark {i}"
+    msg.set_content("Corps du message de test\n" * 20)
+    return msg
+
+
+def main():
+    server = SinkServer(("127.0.0.1", 0), SinkHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    settings.SMTP_SERVER, settings.SMTP_PORT = server.server_address
+    settings.SMTP_PASSWORD = ""
+    email_queue.SMTP_STARTTLS = False
+
+    messages = [build_message(i) for i in range(MESSAGES)]
+
+    # Avant : connexion, envoi et fermeture dans la requête, pour chaque message
+    started = time.perf_counter()
+    for msg in messages:
+        with smtplib.SMTP(settings.SMTP_SERVER, settings.SMTP_PORT) as smtp:
+            smtp.send_message(msg)
+    before = time.perf_counter() - started
+
+    # Après : la requête ne fait que déposer le message dans la file
+    SinkHandler.received = 0
+    started = time.perf_counter()
+    for msg in messages:
+        assert email_queue.enqueue_message(msg)
+    enqueued = time.perf_counter() - started
+    drained = email_queue.wait_for_email_queue(60)
+    after = time.perf_counter() - started
+
+    print({
+        "messages": MESSAGES,
+        "workers": email_queue.EMAIL_WORKERS,
+        "avant_ms_dans_la_requete": round(before * 1000 / MESSAGES, 3),
+        "avant_msg_par_s": round(MESSAGES / before),
+        "apres_ms_dans_la_requete": round(enqueued * 1000 / MESSAGES, 3),
+        "apres_msg_par_s": round(MESSAGES / after),
+        "file_videe": drained,
+        "recus": SinkHandler.received,
+    })
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
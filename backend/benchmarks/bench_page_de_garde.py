@@ -0,0 +1,78 @@
+import os
+import tempfile
+import time
+from io import BytesIO
+
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+import backend.services.plan as plan_service
+
+# Page de garde des exports de plans : modèle rechargé et styles recopiés à chaque export
+# (avant) contre page de garde préparée une fois puis réutilisée (après).
+#     python -m backend.benchmarks.bench_page_de_garde
+# Sans Page_de_garde.xlsx ou pictures/logo.png à la racine du dépôt, un modèle stylé et un
+# logo de remplacement sont générés
+EXPORTS = 50
+SYNTHETIC_ROWS = 29
+SYNTHETIC_COLS = 7
+
+
+def build_synthetic_cover(path: str):
+    wb = Workbook()
+    ws = wb.active
+    side = Side(style="thin")
+    for row in range(1, SYNTHETIC_ROWS + 1):
+        for col in range(1, SYNTHETIC_COLS + 1):
+            cell = ws.cell(row=row, column=col, value=f"L{row}C{col}")
+            cell.font = Font(bold=row == 1, size=12)
+            cell.fill = PatternFill(start_color="DDEBF7", end_color="DDEBF7", fill_type="solid")
+            cell.border = Border(left=side, right=side, top=side, bottom=side)
+            cell.alignment = Alignment(horizontal="center", wrap_text=True)
+    for col in "ABCDEFG":
+        ws.column_dimensions[col].width = 18
+    ws.merge_cells("B2:F4")
+    ws.merge_cells("B10:F12")
+    wb.save(path)
+
+
+def build_synthetic_logo(path: str):
+    from PIL import Image
+
+    Image.new("RGB", (512, 280), (0, 122, 61)).save(path)
+
+
+def export_ms(invalidate: bool) -> float:
+    started = time.perf_counter()
+    for _ in range(EXPORTS):
+        if invalidate:
+            plan_service._cover_cache["key"] = None
+        wb = Workbook(write_only=True)
+        plan_service.write_cover_sheet(wb)
+        wb.save(BytesIO())
+    return (time.perf_counter() - started) * 1000 / EXPORTS
+
+
+def main():
+    assets_dir = tempfile.mkdtemp()
+    if not os.path.exists(plan_service.COVER_PATH):
+        plan_service.COVER_PATH = os.path.join(assets_dir, "Page_de_garde.xlsx")
+        build_synthetic_cover(plan_service.COVER_PATH)
+    if not os.path.exists(plan_service.COVER_LOGO_PATH):
+        plan_service.COVER_LOGO_PATH = os.path.join(assets_dir, "logo.png")
+        build_synthetic_logo(plan_service.COVER_LOGO_PATH)
+
+    export_ms(invalidate=False)
+    before = export_ms(invalidate=True)
+    after = export_ms(invalidate=False)
+    print({
+        "modele": plan_service.COVER_PATH,
+        "logo": plan_service.COVER_LOGO_PATH,
+        "avant_ms_par_export": round(before, 1),
+        "apres_ms_par_export": round(after, 1),
+        "gain_ms_par_export": round(before - after, 1),
+    })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import tempfile
+import time
+from datetime import date
+
+from jinja2 import Environment, FileSystemLoader
+from weasyprint import HTML
+
+# Tous les modèles : les relations doivent être résolues pour les objets d'exemple
+import backend.models.audit
+import backend.models.commentaire
+import backend.models.email
+import backend.models.ip
+import backend.models.PieceJointe
+import backend.models.plan
+import backend.models.plan_search
+import backend.models.ports
+import backend.models.rollup
+import backend.models.vulnerability
+from backend.models.affectation import Affectation
+from backend.models.auditeur import Auditeur
+from backend.models.demande_audit import Demande_Audit
+from backend.models.DemandeurContact import DemandeurContact
+from backend.models.prestataire import Prestataire
+from backend.services.pdf_render import LOGO_URL, PDF_TEMPLATE_DIR, get_pdf_template, render_pdf_file
+
+# Fiches PDF (demande d'audit et affectation) : Environment Jinja créé et template chargé à
+# chaque appel, polices, CSS et logo rechargés par WeasyPrint pour chaque document (avant)
+# contre templates compilés et contexte de rendu partagés par le processus (après).
+#     python -m backend.benchmarks.bench_pdf_render
+# Utilise les templates déployés (PDF_TEMPLATE_DIR) et des objets d'exemple non enregistrés
+HTML_RENDERS = 300
+PDF_RENDERS = 20
+AUDIT_TEMPLATE = "fiche_demande_audit_template.html"
+AFFECT_TEMPLATE = "affect_template.html"
+
+
+def sample_affectation() -> Affectation:
+    demande = Demande_Audit(
+        id=1, nom_app="Application de test", description="Description de l'application",
+        demandeur_email="demandeur@example.com", date_creation=date.today(),
+        fichiers_attaches=["fichiers_attaches_audit/piece.pdf"], comptes_test=[],
+        contacts=[
+            DemandeurContact(nom=f"Nom {i}", prenom="Prénom", email=f"contact{i}@example.com",
+                             phone="0600000000", entite="Entité")
+            for i in range(3)
+        ],
+    )
+    return Affectation(
+        id=1, type_audit="Pentest", date_affectation=date.today(), demande_audit=demande,
+        prestataire=Prestataire(nom="Prestataire"),
+        auditeurs=[Auditeur(nom="Auditeur", prenom="Prénom", email="auditeur@example.com", phone="0600000000")],
+    )
+
+
+def template_contexts(affect: Affectation) -> dict:
+    # Mêmes variables que render_audit_html et generate_affect_pdf
+    demande = affect.demande_audit
+    return {
+        AUDIT_TEMPLATE: {
+            "demande_audit": demande,
+            "fichiers": demande.fichiers_attaches,
+            "fichiers_attaches_urls": [],
+            "architecture_file_url": "",
+            "logo_path": LOGO_URL,
+            "contacts": demande.contacts,
+            "comptes_test": demande.comptes_test,
+            "architecture_filename": "Aucun",
+        },
+        AFFECT_TEMPLATE: {"affect": affect, "logo_path": LOGO_URL, "contacts": demande.contacts},
+    }
+
+
+def reference_html(name: str, context: dict) -> str:
+    # Ancien rendu : Environment créé et template chargé (deux fois pour la demande) à chaque appel
+    env = Environment(loader=FileSystemLoader(PDF_TEMPLATE_DIR))
+    env.get_template(name)
+    return env.get_template(name).render(**context)
+
+
+def per_second(fn, calls: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return calls / (time.perf_counter() - started)
+
+
+def main():
+    out_dir = tempfile.mkdtemp()
+    pdf_path = os.path.join(out_dir, "fiche.pdf")
+
+    for name, context in template_contexts(sample_affectation()).items():
+        html_content = get_pdf_template(name).render(**context)
+        assert html_content == reference_html(name, context)
+
+        print({
+            "fiche": name,
+            "html_avant_par_s": round(per_second(lambda: reference_html(name, context), HTML_RENDERS)),
+            "html_apres_par_s": round(per_second(lambda: get_pdf_template(name).render(**context), HTML_RENDERS)),
+            "pdf_avant_par_s": round(per_second(
+                lambda: HTML(string=reference_html(name, context)).write_pdf(pdf_path), PDF_RENDERS), 2),
+            "pdf_apres_par_s": round(per_second(
+                lambda: render_pdf_file(get_pdf_template(name).render(**context), pdf_path), PDF_RENDERS), 2),
+        })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, extract, text
+from sqlalchemy.orm import Session
+
+# Tous les modèles : les relations et clés étrangères doivent être résolues
+import backend.models.affectation
+import backend.models.audit
+import backend.models.auditeur
+import backend.models.commentaire
+import backend.models.demande_audit
+import backend.models.DemandeurContact
+import backend.models.email
+import backend.models.ip
+import backend.models.PieceJointe
+import backend.models.plan_search
+import backend.models.ports
+import backend.models.prestataire
+import backend.models.rollup
+import backend.models.vulnerability
+from backend.models.plan import Plan
+from backend.services.plan import apply_plan_filters
+from database import Base
+
+# Filtres année/mois des plans : extract() sur la colonne (avant) contre intervalles semi-ouverts
+# appuyés sur les index du modèle (après), sur une table de 100 000 plans.
+#     python -m backend.benchmarks.bench_plan_filters
+# Base de travail distincte de celle de l'application (BENCH_DB_URL, SQLite temporaire par défaut)
+BENCH_DB_URL = os.getenv("BENCH_DB_URL", f"sqlite:///{os.path.join(tempfile.gettempdir(), 'bench_plans.db')}")
+PLAN_COUNT = 100_000
+REPEAT = 20
+TYPES_AUDIT = ("Pentest", "Revue de configuration", "Revue de code")
+NIVEAUX = ("Bon", "Moyen", "Faible")
+
+
+def seed(engine):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(0)
+    origin = date(2010, 1, 1)
+    rows = [
+        {
+            "ref": f"PLAN-{i:06d}",
+            "application": f"App {i % 500}",
+            "type_audit": rng.choice(TYPES_AUDIT),
+            "niveau_securite": rng.choice(NIVEAUX),
+            "date_realisation": origin + timedelta(days=rng.randint(0, 5500)),
+            "date_cloture": origin + timedelta(days=rng.randint(0, 5500)),
+            "date_rapport": origin + timedelta(days=rng.randint(0, 5500)),
+        }
+        for i in range(PLAN_COUNT)
+    ]
+    with engine.begin() as connection:
+        connection.execute(Plan.__table__.insert(), rows)
+        # Statistiques à jour, comme sur une base en service : le planificateur choisit l'index
+        connection.execute(text("ANALYZE"))
+
+
+def timed_ms(query) -> tuple:
+    count = query.count()
+    started = time.perf_counter()
+    for _ in range(REPEAT):
+        query.count()
+    return count, round((time.perf_counter() - started) * 1000 / REPEAT, 2)
+
+
+def query_plan(db: Session, query) -> list:
+    if db.bind.dialect.name != "sqlite":
+        return []
+    sql = str(query.statement.compile(db.bind, compile_kwargs={"literal_binds": True}))
+    return [row[-1] for row in db.execute(text(f"EXPLAIN QUERY PLAN {sql}"))]
+
+
+def main():
+    engine = create_engine(BENCH_DB_URL)
+    seed(engine)
+
+    with Session(engine) as db:
+        cases = {
+            "realisation 2020-03": (
+                db.query(Plan).filter(extract('year', Plan.date_realisation) == 2020,
+                                      extract('month', Plan.date_realisation) == 3),
+                apply_plan_filters(db.query(Plan), realisation_year=2020, realisation_month=3),
+            ),
+            "cloture 2018 + type_audit": (
+                db.query(Plan).filter(extract('year', Plan.date_cloture) == 2018, Plan.type_audit == "Revue de code"),
+                apply_plan_filters(db.query(Plan), cloture_year=2018, type_audit="Revue de code"),
+            ),
+            "realisation 2021 + niveau": (
+                db.query(Plan).filter(extract('year', Plan.date_realisation) == 2021, Plan.niveau_securite == "Faible"),
+                apply_plan_filters(db.query(Plan), realisation_year=2021, niveau_securite="Faible"),
+            ),
+        }
+        for name, (before, after) in cases.items():
+            before_count, before_ms = timed_ms(before)
+            after_count, after_ms = timed_ms(after)
+            assert before_count == after_count, name
+            print({
+                "filtre": name,
+                "lignes": after_count,
+                "avant_ms": before_ms,
+                "apres_ms": after_ms,
+                "plan_avant": query_plan(db, before),
+                "plan_apres": query_plan(db, after),
+            })
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwt
+
+from backend.config import keycloak_config
+
+# Coût d'authentification par requête : vérification RS256 complète à chaque appel (avant)
+# contre payload servi par le cache des jetons vérifiés (après).
+#     python -m backend.benchmarks.bench_token_cache
+# Clé de signature générée localement et déposée dans le magasin JWKS : aucun appel à Keycloak
+REQUESTS = 5000
+BENCH_KID = "bench"
+
+
+def signed_token() -> str:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+    store = keycloak_config.jwks_store
+    store._keys = {BENCH_KID: private_key.public_key()}
+    store._fetched_at = time.monotonic()
+    claims = {"sub": "bench", "aud": "account", "exp": int(time.time()) + 3600,
+              "realm_access": {"roles": ["admin"]}}
+    return jwt.encode(claims, pem, algorithm="RS256", headers={"kid": BENCH_KID})
+
+
+def per_request_us(token: str) -> float:
+    keycloak_config.decode_jwt(token)
+    started = time.perf_counter()
+    for _ in range(REQUESTS):
+        keycloak_config.decode_jwt(token)
+    return (time.perf_counter() - started) * 1e6 / REQUESTS
+
+
+def main():
+    token = signed_token()
+    cache = keycloak_config.token_cache
+    max_size = cache.max_size
+
+    cache.max_size = 0
+    before = per_request_us(token)
+    cache.max_size = max_size
+    cache.clear()
+    after = per_request_us(token)
+
+    print({
+        "requetes": REQUESTS,
+        "avant_us_par_requete": round(before, 1),
+        "apres_us_par_requete": round(after, 1),
+        "cache": cache.stats(),
+    })
+
+
+if __name__ == "__main__":
+    main()
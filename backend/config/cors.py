@@ -17,4 +17,8 @@ def configure_cors(app):
         allow_credentials=True,
         allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH"],
         allow_headers=["*"],
+        expose_headers=[
+            "X-Next-Cursor", "X-Total-Count", "X-Snapshot-Generated-At",
+            "ETag", "Content-Range", "Accept-Ranges", "Content-Disposition",
+        ],
     )
@@ -0,0 +1,119 @@
+import threading
+import time
+from typing import Optional
+
+import requests
+from fastapi import HTTPException
+from jose import jwk
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from log_config import setup_logger
+
+logger = setup_logger()
+
+
+def build_http_session(pool_size: int = 10, retries: int = 2) -> requests.Session:
+    # Session HTTP réutilisable : connexions keep-alive en pool, nouvelles tentatives sur 5xx
+    session = requests.Session()
+    retry = Retry(total=retries, backoff_factor=0.2, status_forcelist=(502, 503, 504), allowed_methods=("GET",))
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class JWKSKeyStore:
+    # Clés publiques du realm, construites une seule fois et indexées par kid.
+    # Rafraîchies à l'expiration du TTL ou sur kid inconnu (rotation Keycloak) ;
+    # un seul thread interroge Keycloak à la fois, les autres réutilisent son résultat.
+    # En cas d'indisponibilité de Keycloak, les clés déjà connues restent utilisées ;
+    # les tentatives suivant un échec sont espacées (intervalle doublé à chaque échec).
+
+    def __init__(self, jwks_url: str, ttl: float, min_refresh_interval: float, timeout: tuple,
+                 session: Optional[requests.Session] = None):
+        self.jwks_url = jwks_url
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.timeout = timeout
+        self.session = session or build_http_session()
+
+        self._keys = {}
+        self._fetched_at = None
+        self._last_attempt = None
+        self._failures = 0
+        self._last_error = None
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _fetch_keys(self) -> dict:
+        response = self.session.get(self.jwks_url, timeout=self.timeout)
+        response.raise_for_status()
+
+        keys = {}
+        for key in response.json().get("keys", []):
+            kid = key.get("kid")
+            if not kid or key.get("use", "sig") != "sig":
+                continue
+            try:
+                keys[kid] = jwk.construct(key).public_key()
+            except Exception as e:
+                logger.warning(f"Clé JWKS {kid} ignorée : {e}")
+        return keys
+
+    def _retry_interval(self) -> float:
+        # Après n échecs consécutifs : min_refresh_interval * 2^(n-1), plafonné au TTL
+        if not self._failures:
+            return self.min_refresh_interval
+        backoff = self.min_refresh_interval * 2 ** (self._failures - 1)
+        return min(backoff, max(self.ttl, self.min_refresh_interval))
+
+    def refresh(self, seen_generation: Optional[int] = None):
+        if seen_generation is None:
+            seen_generation = self._generation
+
+        with self._lock:
+            # Un autre thread vient de rafraîchir pendant l'attente du verrou
+            if self._generation != seen_generation:
+                return
+
+            # Tentatives espacées (kid inconnus en rafale, Keycloak indisponible), y compris
+            # tant qu'aucune clé n'a pu être chargée : pas un appel à Keycloak par requête
+            now = time.monotonic()
+            if self._last_attempt is not None and now - self._last_attempt < self._retry_interval():
+                if self._fetched_at is None:
+                    raise HTTPException(status_code=503, detail=f"Error fetching JWKS: {self._last_error}")
+                return
+
+            self._last_attempt = now
+            try:
+                keys = self._fetch_keys()
+            except (requests.RequestException, ValueError) as e:
+                self._failures += 1
+                self._last_error = str(e)
+                if self._fetched_at is None:
+                    logger.error(f"Clés JWKS indisponibles, nouvelle tentative dans {self._retry_interval():.0f} s : {e}")
+                    raise HTTPException(status_code=503, detail=f"Error fetching JWKS: {str(e)}")
+                logger.warning(f"Keycloak indisponible, utilisation des clés JWKS en cache "
+                               f"(nouvelle tentative dans {self._retry_interval():.0f} s) : {e}")
+                return
+
+            self._failures = 0
+            self._last_error = None
+            self._keys = keys
+            self._fetched_at = now
+            self._generation += 1
+            logger.info(f"Clés JWKS rafraîchies ({len(keys)} clé(s))")
+
+    def get_key(self, kid: str):
+        generation = self._generation
+        if self._fetched_at is None or time.monotonic() - self._fetched_at >= self.ttl:
+            self.refresh(generation)
+            generation = self._generation
+
+        key = self._keys.get(kid)
+        if key is None:
+            # kid inconnu : rotation probable des clés côté Keycloak
+            self.refresh(generation)
+            key = self._keys.get(kid)
+        return key
@@ -1,15 +1,20 @@
+import logging
 import os
-from functools import lru_cache
 
 from dotenv import load_dotenv
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, OAuth2PasswordBearer
-from jose import JWTError, jwt, jwk
+from jose import JWTError, jwt
 from keycloak import KeycloakOpenID
-import requests
+
+from backend.config.jwks import JWKSKeyStore
+from backend.config.token_cache import VerifiedTokenCache, TokenPayload
+from log_config import setup_logger
 
 load_dotenv()
 
+logger = setup_logger()
+
 server_url = os.getenv("KEYCLOAK_SERVER_URL")
 client_id = os.getenv("KEYCLOAK_CLIENT_ID")
 realm_name = os.getenv("KEYCLOAK_REALM_NAME")
@@ -30,50 +35,62 @@ KEYCLOAK_URL = f"{server_url}/realms/{realm_name}"
 CLIENT_ID = client_id
 
 
-@lru_cache()
-def get_keycloak_public_key():
-    jwks_url = f"{KEYCLOAK_URL}/protocol/openid-connect/certs"
-    try:
-        response = requests.get(jwks_url)
-        response.raise_for_status()
-        return response.json()
-    except requests.RequestException as e:
-        raise HTTPException(status_code=503, detail=f"Error fetching JWKS: {str(e)}")
+jwks_store = JWKSKeyStore(
+    jwks_url=f"{KEYCLOAK_URL}/protocol/openid-connect/certs",
+    ttl=float(os.getenv("KEYCLOAK_JWKS_TTL", "300")),
+    min_refresh_interval=float(os.getenv("KEYCLOAK_JWKS_MIN_REFRESH_INTERVAL", "10")),
+    timeout=(
+        float(os.getenv("KEYCLOAK_HTTP_CONNECT_TIMEOUT", "3")),
+        float(os.getenv("KEYCLOAK_HTTP_READ_TIMEOUT", "5"))
+    )
+)
+
+token_cache = VerifiedTokenCache(
+    max_size=int(os.getenv("KEYCLOAK_TOKEN_CACHE_SIZE", "1024")),
+    max_ttl=float(os.getenv("KEYCLOAK_TOKEN_CACHE_TTL", "300"))
+)
 
 
 def decode_jwt(token: str):
-    public_key = get_keycloak_public_key()
+    # Jeton déjà vérifié et non expiré : pas de nouvelle vérification de signature
+    payload = token_cache.get(token)
+    if payload is not None:
+        return payload
+
     headers = jwt.get_unverified_header(token)
     if not headers or 'kid' not in headers:
         raise HTTPException(status_code=403, detail="Invalid token: no kid header")
 
-    for key in public_key['keys']:
-        if key['kid'] == headers['kid']:
-            try:
-                public_key_pem = jwk.construct(key).public_key()
-            except Exception as e:
-                raise HTTPException(
-                    status_code=403,
-                    detail="Error converting JWK to public key: " + str(e)
-                )
-            try:
-                # 👇 Return full payload with all claims
-                payload = jwt.decode(token, public_key_pem, algorithms=["RS256"], audience="account")
-                return payload
-            except JWTError as e:
-                raise HTTPException(status_code=403, detail="Invalid token: " + str(e))
-
-    raise HTTPException(status_code=403, detail="Invalid key")
+    public_key = jwks_store.get_key(headers['kid'])
+    if public_key is None:
+        raise HTTPException(status_code=403, detail="Invalid key")
+
+    try:
+        # 👇 Return full payload with all claims
+        payload = TokenPayload(jwt.decode(token, public_key, algorithms=["RS256"], audience="account"))
+    except JWTError as e:
+        raise HTTPException(status_code=403, detail="Invalid token: " + str(e))
+
+    token_cache.put(token, payload)
+    return payload
 
 def get_current_user(token: str = Depends(oauth2_scheme)):
     return decode_jwt(token)
 
+def get_user_roles(user: dict) -> frozenset:
+    if isinstance(user, TokenPayload):
+        return user.roles
+    return frozenset(role.lower() for role in (user.get("realm_access") or {}).get("roles", []))
+
 def get_current_active_user_with_roles(required_roles: list[str]):
+    # Rôles requis normalisés une seule fois, à la déclaration de la route
+    required = frozenset(role.lower() for role in required_roles)
+
     def role_checker(user: dict = Depends(get_current_user)):
-        user_roles = user.get("realm_access", {}).get("roles", [])
-        print("User roles:", user_roles)
-        print("Required roles:", required_roles)
-        if not any(r.lower() in [ur.lower() for ur in user_roles] for r in required_roles):
+        user_roles = get_user_roles(user)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Rôles utilisateur : {sorted(user_roles)} / rôles requis : {sorted(required)}")
+        if required.isdisjoint(user_roles):
             raise HTTPException(status_code=403, detail="Insufficient role privileges")
         return user
     return role_checker
@@ -0,0 +1,40 @@
+from functools import lru_cache
+
+from backend.config.keycloak_config import get_current_active_user_with_roles, get_user_roles
+
+# Matrice rôle -> permissions : point unique de déclaration des accès par rôle
+ROLE_PERMISSIONS = {
+    "admin": {
+        "affectations", "audits", "plans", "prestataires", "logs",
+        "dashboard_admin", "demandes_creation", "demandes_validation",
+    },
+    "gacam_team": {
+        "affectations", "audits", "plans", "prestataires", "demandes_validation",
+    },
+    "project_manager": {
+        "dashboard_manager", "demandes_creation",
+    },
+}
+
+
+def roles_for_permission(permission: str) -> list:
+    roles = [role for role, permissions in ROLE_PERMISSIONS.items() if permission in permissions]
+    if not roles:
+        raise ValueError(f"Permission inconnue : {permission}")
+    return roles
+
+
+@lru_cache(maxsize=None)
+def permission_roles(permission: str) -> frozenset:
+    return frozenset(roles_for_permission(permission))
+
+
+def has_permission(user: dict, permission: str) -> bool:
+    # Contrôle dans le corps d'une route, quand la permission dépend de la ressource demandée
+    return not get_user_roles(user).isdisjoint(permission_roles(permission))
+
+
+@lru_cache(maxsize=None)
+def require_permission(permission: str):
+    # Une seule dépendance par permission, construite au chargement des routes
+    return get_current_active_user_with_roles(roles_for_permission(permission))
@@ -0,0 +1,87 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+
+class TokenPayload(dict):
+    # Payload JWT (dict classique) portant ses rôles normalisés, calculés une seule
+    # fois par jeton puisque le même objet est resservi par le cache
+    __slots__ = ("_roles",)
+
+    @property
+    def roles(self) -> frozenset:
+        try:
+            return self._roles
+        except AttributeError:
+            self._roles = frozenset(
+                role.lower() for role in (self.get("realm_access") or {}).get("roles", [])
+            )
+            return self._roles
+
+
+class VerifiedTokenCache:
+    # Payloads des jetons déjà vérifiés (signature RS256, audience, exp), indexés par
+    # empreinte SHA-256 du jeton. Une entrée n'est jamais servie au-delà du exp du jeton
+    # ni au-delà de max_ttl ; LRU borné à max_size entrées.
+
+    def __init__(self, max_size: int, max_ttl: float):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        if self.max_size <= 0:
+            return None
+
+        key = self._key(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token: str, payload: dict):
+        if self.max_size <= 0:
+            return
+
+        expires_at = time.time() + self.max_ttl
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, exp)
+
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -3,8 +3,10 @@ import os
 from dotenv import load_dotenv
 from fastapi import FastAPI, Depends, HTTPException, Form
 from fastapi.staticfiles import StaticFiles
+from sqlalchemy.orm import Session
 from backend.config.cors import configure_cors
 from backend.config.keycloak_config import get_current_user, keycloak_openid, get_current_active_user_with_roles
+from backend.config.permissions import require_permission
 
 from backend.routes.demande_audit import (router as demande_audit_router)
 from backend.routes.affectation import (router as affectation_router)
@@ -14,13 +16,39 @@ from backend.routes.admin_dashboard import (router as admin_router)
 from backend.routes.prestataire import (router as prestataire_router)
 from backend.routes.logs import (router as logs_router)
 from backend.routes.project_manager_dashboard import (router as manager_router)
+from backend.routes.fichiers import (router as fichiers_router)
+
+from backend.services.plan_search import has_unindexed_plans
+from backend.services.plan_import import shutdown_plan_imports
+from backend.services.rollup import rollups_empty
+from backend.services.schema_upgrade import missing_columns
+from backend.services.pdf_render import wait_for_pdf_renders, shutdown_pdf_renders
+from backend.services.email_queue import wait_for_email_queue
+from backend.services.email_outbox import wait_for_outbox
 
 from database import Base, engine
+from log_config import setup_logger
 
 load_dotenv()
+logger = setup_logger()
 
 Base.metadata.create_all(bind=engine)
 
+# Colonnes et index ajoutés aux tables existantes : étape de migration explicite, lancée une
+# fois au déploiement (python -m backend.services.schema_upgrade) et non par chaque worker
+pending_columns = missing_columns(engine)
+if pending_columns:
+    logger.warning(f"Schéma non migré, colonnes manquantes : {', '.join(pending_columns)}. "
+                   f"Lancer python -m backend.services.schema_upgrade")
+
+# Rattrapages (index de recherche des plans, rollups KPI) : faits par la même commande,
+# ici simple vérification
+with Session(engine) as db:
+    if has_unindexed_plans(db):
+        logger.warning("Plans absents de l'index de recherche. Lancer python -m backend.services.schema_upgrade")
+    if rollups_empty(db):
+        logger.warning("Rollups KPI vides. Lancer python -m backend.services.schema_upgrade")
+
 docs_url = "/docs"
 redoc_url = "/redoc"
 openapi_url = "/openapi.json"
@@ -37,23 +65,44 @@ app = FastAPI(
 )
 
 configure_cors(app)
+
+@app.on_event("shutdown")
+def stop_plan_imports():
+    # Laisser finir les imports de plans en file, puis libérer les processus d'analyse
+    shutdown_plan_imports(timeout=float(os.getenv("PLAN_IMPORT_SHUTDOWN_TIMEOUT", "30")))
+
+@app.on_event("shutdown")
+def flush_pdf_renders():
+    # Terminer les fiches PDF en cours (leurs callbacks mettent des emails en file)
+    wait_for_pdf_renders(timeout=float(os.getenv("PDF_RENDER_SHUTDOWN_TIMEOUT", "30")))
+    shutdown_pdf_renders()
+
+@app.on_event("shutdown")
+def flush_email_queue():
+    # Laisser partir les emails encore en file avant l'arrêt
+    wait_for_email_queue(timeout=float(os.getenv("EMAIL_SHUTDOWN_TIMEOUT", "10")))
+    wait_for_outbox(timeout=5)
 #app.add_middleware(LoggingMiddleware)
 
 app.include_router(demande_audit_router, prefix="/audits", tags=["Demandes Audits"])
-app.include_router(affectation_router, prefix="/affectation", tags=["Affectations"], dependencies=[Depends(get_current_active_user_with_roles(["admin", "gacam_team"]))])
-app.include_router(audit_router, prefix="/audit", tags=["Audits"], dependencies=[Depends(get_current_active_user_with_roles(["admin", "gacam_team"]))])
-app.include_router(plan_router, prefix="/plan", tags=["Plans"], dependencies=[Depends(get_current_active_user_with_roles(["admin", "gacam_team"]))])
-app.include_router(admin_router, prefix="/admin", tags=["Admin Dashboard"], dependencies=[Depends(get_current_active_user_with_roles(["admin"]))])
-app.include_router(prestataire_router, prefix="/prestataire", tags=["Prestataire"], dependencies=[Depends(get_current_active_user_with_roles(["admin", "gacam_team"]))])
-app.include_router(logs_router, prefix="/logs", tags=["Logs"], dependencies=[Depends(get_current_active_user_with_roles(["admin"]))])
-app.include_router(manager_router, prefix="/manager", tags=["Manager"], dependencies=[Depends(get_current_active_user_with_roles(["project_manager"]))])
-
-
-app.mount("/fichiers_attaches_audit", StaticFiles(directory="fichiers_attaches_audit"), name="fichiers_attaches_audit")
-app.mount("/fiches_demandes_audit", StaticFiles(directory="fiches_demandes_audit"), name="fiches_demandes_audit")
-app.mount("/fichiers_affectations", StaticFiles(directory="fichiers_affectations"), name="fichiers_affectations")
-app.mount("/commentaires_audit", StaticFiles(directory="commentaires_audit"), name="commentaires_audit")
-app.mount("/prestataire", StaticFiles(directory="prestataire"), name="prestataire")
+app.include_router(affectation_router, prefix="/affectation", tags=["Affectations"], dependencies=[Depends(require_permission("affectations"))])
+app.include_router(audit_router, prefix="/audit", tags=["Audits"], dependencies=[Depends(require_permission("audits"))])
+app.include_router(plan_router, prefix="/plan", tags=["Plans"], dependencies=[Depends(require_permission("plans"))])
+app.include_router(admin_router, prefix="/admin", tags=["Admin Dashboard"], dependencies=[Depends(require_permission("dashboard_admin"))])
+app.include_router(prestataire_router, prefix="/prestataire", tags=["Prestataire"], dependencies=[Depends(require_permission("prestataires"))])
+app.include_router(logs_router, prefix="/logs", tags=["Logs"], dependencies=[Depends(require_permission("logs"))])
+app.include_router(manager_router, prefix="/manager", tags=["Manager"], dependencies=[Depends(require_permission("dashboard_manager"))])
+app.include_router(fichiers_router, prefix="/fichiers", tags=["Fichiers"])
+
+
+# Montages statiques historiques, sans contrôle d'accès : désactivés par défaut, le front passe
+# par /fichiers/<chemin> (LEGACY_STATIC_MOUNTS=true seulement le temps d'une migration)
+if os.getenv("LEGACY_STATIC_MOUNTS", "false").lower() == "true":
+    app.mount("/fichiers_attaches_audit", StaticFiles(directory="fichiers_attaches_audit"), name="fichiers_attaches_audit")
+    app.mount("/fiches_demandes_audit", StaticFiles(directory="fiches_demandes_audit"), name="fiches_demandes_audit")
+    app.mount("/fichiers_affectations", StaticFiles(directory="fichiers_affectations"), name="fichiers_affectations")
+    app.mount("/commentaires_audit", StaticFiles(directory="commentaires_audit"), name="commentaires_audit")
+    app.mount("/prestataire", StaticFiles(directory="prestataire"), name="prestataire")
 
 @app.get("/")
 def root():
@@ -10,6 +10,8 @@ class PieceJointe(Base):
     audit_id = Column(Integer, ForeignKey("audits.id"), nullable=False)
     filename = Column(String(100), nullable=False)
     filepath = Column(String(300), nullable=False)
+    taille = Column(Integer, nullable=True)
+    sha256 = Column(String(64), nullable=True)
     auteur = Column(String, nullable=False)
     upload_date = Column(DateTime, default=datetime.utcnow)
 
@@ -12,6 +12,7 @@ class Affectation(Base):
     date_affectation = Column(Date, default=date.today, nullable=False)
     type_audit = Column(String(150), nullable=False)
     affectationpath = Column(String(255), nullable=True)
+    pdf_status = Column(String(20), nullable=True)  # pending / ready / failed
     prestataire_id = Column(Integer, ForeignKey("prestataires.id"))
     etat = Column(String(50), default="En attente")
 
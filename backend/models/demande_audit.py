@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, Boolean, func, Text, JSON
+from sqlalchemy import Column, Integer, String, Date, Boolean, func, Text, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy_utils import EmailType
 
@@ -7,6 +7,10 @@ from datetime import date
 
 class Demande_Audit(Base):
     __tablename__ = "demandes_audits"
+    __table_args__ = (
+        # Liste filtrée par état, triée par date de création (pagination par curseur)
+        Index("ix_demandes_audits_etat_date_id", "etat", "date_creation", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     etat = Column(String(50), default="En attente", index=True)
@@ -57,6 +61,7 @@ class Demande_Audit(Base):
     fichiers_attaches = Column(JSON, nullable=True)
     fichiers_attaches_urls = Column(JSON, nullable=True)
     fiche_demande_path = Column(String(255), nullable=True)
+    pdf_status = Column(String(20), nullable=True)  # pending / ready / failed
 
     affectations = relationship("Affectation", back_populates="demande_audit")
     audit = relationship("Audit", back_populates="demande_audit")
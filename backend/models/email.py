@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime
+from sqlalchemy import Column, Integer, String, Text, DateTime, Float, LargeBinary, Index
 from database import Base
 from datetime import datetime
 
@@ -14,3 +14,14 @@ class Email(Base):
     status = Column(String(100))
     sent_at = Column(DateTime)
     error_message = Column(Text, nullable=True)
+
+    # Outbox : suivi des envois et message MIME sérialisé (renvoi sans reconstruction)
+    message_id = Column(String(255), nullable=True, index=True)
+    attempts = Column(Integer, nullable=True, default=0)
+    latency_ms = Column(Float, nullable=True)
+    created_at = Column(DateTime, nullable=True, default=datetime.utcnow)
+    mime_payload = Column(LargeBinary(length=16 * 1024 * 1024), nullable=True)
+
+    __table_args__ = (
+        Index("ix_emails_status_sent_at", "status", "sent_at", "id"),
+    )
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Date, JSON, event, func, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Date, JSON, event, func, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship, Session
 from database import Base
 
@@ -12,8 +12,8 @@ class Plan(Base):
     type_application = Column(String(100), nullable=True)
     type_audit = Column(String(100), nullable=True)
     date_realisation = Column(Date, nullable=True)
-    date_cloture = Column(Date, nullable=True)
-    date_rapport = Column(Date, nullable=True)
+    date_cloture = Column(Date, nullable=True, index=True)
+    date_rapport = Column(Date, nullable=True, index=True)
     niveau_securite = Column(String(50), nullable=True)
     nb_vulnerabilites = Column(JSON, nullable=True)
     taux_remediation = Column(Float, nullable=True)
@@ -24,6 +24,13 @@ class Plan(Base):
     audit_id = Column(Integer, ForeignKey("audits.id"))
     audit = relationship("Audit", back_populates="plans")
 
+    __table_args__ = (
+        # Filtres par période (et tri/pagination sur date_realisation, id)
+        Index("ix_plans_date_realisation_id", "date_realisation", "id"),
+        Index("ix_plans_type_audit_date_realisation", "type_audit", "date_realisation"),
+        Index("ix_plans_niveau_securite_date_realisation", "niveau_securite", "date_realisation"),
+    )
+
 
 """@event.listens_for(Plan, "before_insert")
 def generate_ref(mapper, connection, target):
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, ForeignKey, Index
+from database import Base
+
+
+class PlanSearchGram(Base):
+    # Index n-grammes (ref + application normalisées) pour la recherche de plans
+    __tablename__ = "plan_search_grams"
+
+    plan_id = Column(Integer, ForeignKey("plans.id", ondelete="CASCADE"), primary_key=True)
+    gram = Column(String(3), primary_key=True)
+
+    __table_args__ = (
+        Index("ix_plan_search_grams_gram_plan", "gram", "plan_id"),
+    )
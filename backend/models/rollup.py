@@ -0,0 +1,12 @@
+from sqlalchemy import Column, Integer, String
+from database import Base
+
+
+class KpiRollup(Base):
+    # Compteurs mensuels pré-agrégés (plans réalisés, audits terminés) pour les graphiques
+    __tablename__ = "kpi_rollups"
+
+    metric = Column(String(50), primary_key=True)
+    annee = Column(Integer, primary_key=True)
+    mois = Column(Integer, primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
@@ -1,172 +1,103 @@
-from fastapi import APIRouter, Depends
+from typing import Optional, List
+
+from fastapi import APIRouter, Depends, Response, HTTPException, Query
 from sqlalchemy.orm import Session
 from datetime import date
-from sqlalchemy import func
 from unidecode import unidecode
 
 from database import get_db
 
-from backend.models.auditeur import (Auditeur)
-from backend.models.prestataire import Prestataire
-from backend.models.plan import Plan
-from backend.models.affectation import Affectation
-from backend.models.audit import Audit
+from backend.config.keycloak_config import token_cache
+from backend.services.blob_store import collect_garbage
+from backend.services.dashboard import compute_dashboard_kpis, compute_affect_prestataires, compute_prestataires_kpi
+from backend.schemas.email import EmailOutboxResponse, EmailReplayRequest
+from backend.services.email_outbox import list_outbox, replay_emails, EMAIL_OUTBOX_PAGE_MAX_SIZE
+from backend.services.kpi_snapshot import get_snapshot
+from backend.services.pdf_render import get_pdf_render_metrics
+from backend.services.rollup import get_rollup_series, rebuild_rollups, METRIC_PLANS_REALISES, METRIC_AUDITS_TERMINES
 
 router = APIRouter()
 
+def serve_snapshot(name: str, response: Response, compute):
+    # Payload servi depuis l'instantané, date de calcul exposée en en-tête
+    snapshot = get_snapshot(name, compute)
+    response.headers["X-Snapshot-Generated-At"] = snapshot["generated_at"].isoformat() + "Z"
+    return snapshot["payload"]
+
+def year_range(annee_debut: Optional[int], annee_fin: Optional[int]):
+    current_year = date.today().year
+    annee_debut = annee_debut or annee_fin or current_year
+    annee_fin = annee_fin or max(annee_debut, current_year)
+    if annee_debut > annee_fin:
+        raise HTTPException(status_code=400, detail="annee_debut doit être inférieure ou égale à annee_fin.")
+    return annee_debut, annee_fin
+
 @router.get("/kpis")
-def get_dashboard_kpis(db: Session = Depends(get_db)):
-    today = date.today()
-
-    total_auditeurs = db.query(Auditeur).count()
-    total_prestataires = db.query(Prestataire).count()
-
-    auditeurs_occupees = (
-        db.query(Auditeur)
-        .join(Auditeur.affectations)
-        .distinct()
-        .count()
-    )
-
-    audit_types = (
-        db.query(Affectation.type_audit, func.count(Audit.id).label("count"))
-        .join(Audit, Audit.affectation_id == Affectation.id)
-        .group_by(Affectation.type_audit)
-        .all()
-    )
-
-    taux_occupation = (auditeurs_occupees / total_auditeurs) * 100 if total_auditeurs > 0 else 0
-
-    total_audits = db.query(Audit).count()
-    audits_en_cours = db.query(Audit).filter(Audit.etat == "EN COURS").count()
-    audits_suspendu = db.query(Audit).filter(Audit.etat == "SUSPENDU").count()
-    audits_termines = db.query(Audit).filter(Audit.etat == "TERMINE").count()
-
-    total_affectations = db.query(Affectation).count()
-
-    top_prestataires = (
-        db.query(
-            Prestataire.nom,
-            func.count(Affectation.id).label("nb_affects")
-        )
-        .join(Affectation)
-        .group_by(Prestataire.id)
-        .order_by(func.count(Affectation.id).desc())
-        .limit(5)
-        .all()
-    )
-
-    audits_par_prestataire = (
-        db.query(
-            Prestataire.nom,
-            func.count(Audit.id).label("nb_audits")
-        )
-        .join(Affectation, Affectation.prestataire_id == Prestataire.id)
-        .join(Audit, Audit.affectation_id == Affectation.id)
-        .group_by(Prestataire.nom)
-        .all()
-    )
-
-    # === 🔢 KPIs Prestataires ===
-    budget_total_alloue = db.query(func.coalesce(func.sum(Prestataire.budget_total), 0)).scalar()
-    realisation_total = db.query(func.coalesce(func.sum(Prestataire.realisation), 0)).scalar()
-    solde_total = db.query(func.coalesce(func.sum(Prestataire.solde), 0)).scalar()
-
-    taux_conso_budget = (realisation_total / budget_total_alloue) * 100 if budget_total_alloue > 0 else 0
-
-    prestataires_inactifs = (
-        db.query(Prestataire).filter(func.coalesce(Prestataire.realisation, 0) == 0).count()
-    )
-
-    return {
-        # === KPIs Auditeurs / Audits ===
-        "auditeurs_total": total_auditeurs,
-        "prestataires_total": total_prestataires,
-        "taux_occupation_auditeurs": round(taux_occupation, 2),
-        "audits_total": total_audits,
-        "audits_en_cours": audits_en_cours,
-        "audits_suspendu": audits_suspendu,
-        "audits_termines": audits_termines,
-        "affectations_total": total_affectations,
-
-        # === KPIs Prestataires ===
-        "budget_total_alloue": round(budget_total_alloue, 2),
-        "realisation_total": round(realisation_total, 2),
-        "solde_total": round(solde_total, 2),
-        "taux_conso_budget": round(taux_conso_budget, 2),
-        "prestataires_inactifs": prestataires_inactifs,
-
-        # === Données supplémentaires ===
-        "top_prestataires": [
-            {"nom": nom, "nb_affects": nb_affects}
-            for nom, nb_affects in top_prestataires
-        ],
-        "types_audit": [
-            {"type": t, "count": c} for t, c in audit_types
-        ],
-        "audits_par_prestataire": [
-            {"nom": nom, "nb_audits": nb_audits}
-            for nom, nb_audits in audits_par_prestataire
-        ],
-    }
+def get_dashboard_kpis(response: Response, db: Session = Depends(get_db)):
+    return serve_snapshot("kpis", response, lambda: compute_dashboard_kpis(db))
 
 @router.get("/audits-par-mois")
-def get_plans_by_month(db: Session = Depends(get_db)):
-    results = (
-        db.query(
-            func.month(Plan.date_realisation).label("mois"),
-            func.count(Plan.id).label("nombre")
-        )
-        .group_by(func.month(Plan.date_realisation))
-        .order_by(func.month(Plan.date_realisation))
-        .all()
-    )
-    return [{"mois": mois, "nombre": nombre} for mois, nombre in results]
+def get_plans_by_month(
+    db: Session = Depends(get_db),
+    annee_debut: Optional[int] = None,
+    annee_fin: Optional[int] = None
+):
+    # Lecture directe des compteurs (année, mois) ; par défaut l'année en cours
+    annee_debut, annee_fin = year_range(annee_debut, annee_fin)
+    rows = get_rollup_series(db, METRIC_PLANS_REALISES, annee_debut, annee_fin)
+    return [{"annee": annee, "mois": mois, "nombre": total} for annee, mois, total in rows]
 
 @router.get("/affect-prestataires")
-def get_affect_prestataires(db: Session = Depends(get_db)):
-    results = (
-        db.query(Prestataire.nom, func.count(Affectation.id).label("nb_affectations"))
-        .join(Affectation, Prestataire.id == Affectation.prestataire_id)
-        .group_by(Prestataire.nom)
-        .order_by(func.count(Affectation.id).desc())
-        .limit(5)
-        .all()
-    )
-    return [{"nom": nom, "affectations": nb} for nom, nb in results]
+def get_affect_prestataires(response: Response, db: Session = Depends(get_db)):
+    return serve_snapshot("affect_prestataires", response, lambda: compute_affect_prestataires(db))
 
 @router.get("/taux-realisation-audits")
-def taux_realisation_audits(db: Session = Depends(get_db)):
-    results = (
-        db.query(
-            func.month(Audit.start_time).label("mois"),
-            func.count(Audit.id).label("audits_realises")
-        )
-        .filter(Audit.etat == "TERMINE")
-        .group_by(func.month(Audit.start_time))
-        .order_by(func.month(Audit.start_time))
-        .all()
-    )
-    return [{"mois": mois, "audits_realises": nb} for mois, nb in results]
+def taux_realisation_audits(
+    db: Session = Depends(get_db),
+    annee_debut: Optional[int] = None,
+    annee_fin: Optional[int] = None
+):
+    annee_debut, annee_fin = year_range(annee_debut, annee_fin)
+    rows = get_rollup_series(db, METRIC_AUDITS_TERMINES, annee_debut, annee_fin)
+    return [{"annee": annee, "mois": mois, "audits_realises": total} for annee, mois, total in rows]
+
+@router.post("/rollups/rebuild")
+def rebuild_kpi_rollups(db: Session = Depends(get_db)):
+    # Reconstruction des compteurs mensuels depuis les données brutes
+    return {"lignes": rebuild_rollups(db)}
+
+@router.post("/blobs/gc")
+def collect_unused_blobs():
+    # Suppression des fichiers stockés dont plus aucun chemin ne dépend
+    return collect_garbage()
 
 @router.get("/prestataires-kpi")
-def get_prestataires_kpi(db: Session = Depends(get_db)):
-    prestataires = db.query(Prestataire).all()
-
-    result = []
-    for p in prestataires:
-        budget_total = p.budget_total or 0
-        realisation = p.realisation or 0
-        solde = p.solde or 0
-
-        taux_conso = (realisation / budget_total * 100) if budget_total > 0 else 0
-
-        result.append({
-            "nom": p.nom,
-            "budget_total": round(budget_total, 2),
-            "realisation": round(realisation, 2),
-            "solde": round(solde, 2),
-            "taux_conso": round(taux_conso, 2),
-        })
-
-    return result
+def get_prestataires_kpi(response: Response, db: Session = Depends(get_db)):
+    return serve_snapshot("prestataires_kpi", response, lambda: compute_prestataires_kpi(db))
+
+@router.get("/emails", response_model=List[EmailOutboxResponse])
+def get_emails(
+    response: Response,
+    db: Session = Depends(get_db),
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=EMAIL_OUTBOX_PAGE_MAX_SIZE),
+    cursor: Optional[str] = None
+):
+    # Outbox paginée par curseur (en-tête X-Next-Cursor)
+    emails, next_cursor = list_outbox(db, status, limit, cursor)
+    response.headers["X-Next-Cursor"] = next_cursor or ""
+    return emails
+
+@router.post("/emails/replay")
+def replay_failed_emails(request: EmailReplayRequest, db: Session = Depends(get_db)):
+    return {"emails_remis_en_file": replay_emails(db, request.ids, request.status)}
+
+@router.get("/auth/token-cache")
+def get_token_cache_stats():
+    # Compteurs du cache des jetons vérifiés (hits / misses)
+    return token_cache.stats()
+
+@router.get("/pdf/metrics")
+def get_pdf_metrics():
+    # Taille du pool de rendu PDF, profondeur de file et durées de rendu
+    return get_pdf_render_metrics()
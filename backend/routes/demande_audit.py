@@ -1,19 +1,21 @@
 import json
 from datetime import date
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Body, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
 from sqlalchemy.testing import db
 from sqlalchemy.testing.pickleable import User
 
-from backend.config.keycloak_config import get_current_active_user_with_roles, get_current_user
+from backend.config.keycloak_config import get_current_user
+from backend.config.permissions import require_permission
 from backend.config.logger import log_user_action
 from database import get_db
-from backend.schemas.demande_audit import DemandeAuditResponse, ContactDemandeurCreate
+from backend.schemas.demande_audit import DemandeAuditResponse, DemandeAuditSummary, ContactDemandeurCreate
 from backend.models.demande_audit import Demande_Audit
-from backend.services.demande_audit import create_demande_audit, get_audit_by_id, get_all_audits, update_etat_audit
+from backend.services.demande_audit import create_demande_audit, get_audit_by_id, get_all_audits, update_etat_audit, \
+    get_demandes_page, count_demandes, DEMANDE_PAGE_DEFAULT_SIZE, DEMANDE_PAGE_MAX_SIZE
 
 from log_config import setup_logger
 
@@ -57,7 +59,7 @@ def create_audit_request(
     fichiers_attaches_urls: Optional[str] = Form(None),
     architecture_file: Optional[UploadFile] = File(None),
     db: Session = Depends(get_db),
-    user=Depends(get_current_active_user_with_roles(["project_manager", "admin"]))
+    user=Depends(require_permission("demandes_creation"))
 ):
     try:
         contacts_data_raw = json.loads(contacts)
@@ -126,18 +128,56 @@ def create_audit_request(
 
     return created_demande
 
+def list_demandes(db: Session, response: Response, limit: Optional[int], cursor: Optional[str], summary: bool, **filters):
+    # Sans limit ni cursor : liste complète (filtrée) ; sinon page suivante et total en en-têtes
+    if limit is None and cursor is None:
+        return get_all_audits(db, summary, **filters)
+    demandes, next_cursor = get_demandes_page(db, limit or DEMANDE_PAGE_DEFAULT_SIZE, cursor, summary, **filters)
+    response.headers["X-Next-Cursor"] = next_cursor or ""
+    response.headers["X-Total-Count"] = str(count_demandes(db, **filters))
+    return demandes
+
 @router.get("/", response_model=List[DemandeAuditResponse])
-def get_audits(db: Session = Depends(get_db), user=Depends(get_current_active_user_with_roles(["gacam_team", "admin"]))):
+def get_audits(
+    response: Response,
+    db: Session = Depends(get_db),
+    user=Depends(require_permission("demandes_validation")),
+    etat: Optional[str] = None,
+    demandeur_email: Optional[str] = None,
+    date_debut: Optional[date] = None,
+    date_fin: Optional[date] = None,
+    limit: Optional[int] = Query(None, ge=1, le=DEMANDE_PAGE_MAX_SIZE),
+    cursor: Optional[str] = None
+):
     logger.info("Récupération de la liste des audits")
     username = user.get("preferred_username")
     log_user_action(username, "Lecture de la liste des audits")
-    demande_audits = get_all_audits(db)
+    demande_audits = list_demandes(db, response, limit, cursor, False, etat=etat, demandeur_email=demandeur_email,
+                                   date_debut=date_debut, date_fin=date_fin)
     logger.info("Nombre d'audits récupérés: %d", len(demande_audits))
     return demande_audits
 
+@router.get("/summary", response_model=List[DemandeAuditSummary])
+def get_audits_summary(
+    response: Response,
+    db: Session = Depends(get_db),
+    user=Depends(require_permission("demandes_validation")),
+    etat: Optional[str] = None,
+    demandeur_email: Optional[str] = None,
+    date_debut: Optional[date] = None,
+    date_fin: Optional[date] = None,
+    limit: Optional[int] = Query(None, ge=1, le=DEMANDE_PAGE_MAX_SIZE),
+    cursor: Optional[str] = None
+):
+    # Grille des demandes : colonnes courtes uniquement, détail via /audits/{id}
+    username = user.get("preferred_username")
+    log_user_action(username, "Lecture de la liste des audits")
+    return list_demandes(db, response, limit, cursor, True, etat=etat, demandeur_email=demandeur_email,
+                         date_debut=date_debut, date_fin=date_fin)
+
 
 @router.get("/{audit_id}", response_model=DemandeAuditResponse)
-def get_audit(audit_id: int, db: Session = Depends(get_db), user=Depends(get_current_active_user_with_roles(["gacam_team", "admin"]))):
+def get_audit(audit_id: int, db: Session = Depends(get_db), user=Depends(require_permission("demandes_validation"))):
     logger.debug("Recherche de l'audit avec l'ID: %d", audit_id)
     username = user.get("preferred_username")
     log_user_action(username, "Lecture d'une demande", f"ID : {audit_id}")
@@ -154,7 +194,7 @@ def update_audit_etat(
     etat: str = Body(...),
     commentaire_rejet: str = Body(None),
     db: Session = Depends(get_db),
-    user=Depends(get_current_active_user_with_roles(["gacam_team", "admin"]))
+    user=Depends(require_permission("demandes_validation"))
 ):
     username = user.get("preferred_username")
     log_user_action(username, "Update Etat d'une demande", f"ID : {audit_id} | Etat : {etat}")
@@ -28,7 +28,7 @@ async def send_email_with_pdf_endpoint(email_request: EmailRequest):
             template_name=email_request.template_name
         )
 
-        return {"message": "Email envoyé avec succès"}
+        return {"message": "Email mis en file d'envoi"}
     except Exception as e:
         logger.error(f"Erreur: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
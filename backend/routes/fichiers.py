@@ -0,0 +1,46 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from backend.config.keycloak_config import get_current_user
+from backend.config.permissions import has_permission
+from backend.services.blob_store import resolve_stored_path
+from backend.services.file_serving import (SERVED_ROOTS, DEMANDE_ROOTS, DEMANDE_ALL_PERMISSION, is_demande_file_owner,
+                                           content_etag, etag_matches, cache_control)
+from database import get_db
+
+router = APIRouter()
+
+@router.api_route("/{file_path:path}", methods=["GET", "HEAD"], summary="Télécharger un fichier",
+                  description="Sert un fichier enregistré (ETag, 304, requêtes Range) après contrôle du rôle "
+                              "et, pour les pièces d'une demande, du demandeur")
+def serve_file(file_path: str, request: Request, db: Session = Depends(get_db),
+               user: dict = Depends(get_current_user)):
+    # Rôle vérifié avant toute recherche du fichier : pas de sondage des chemins existants
+    root = file_path.replace("\\", "/").lstrip("/").split("/", 1)[0]
+    permissions = SERVED_ROOTS.get(root)
+    if permissions is None:
+        raise HTTPException(status_code=404, detail="Fichier introuvable")
+    if not any(has_permission(user, permission) for permission in permissions):
+        raise HTTPException(status_code=403, detail="Accès refusé à ce fichier")
+    if (root in DEMANDE_ROOTS and not has_permission(user, DEMANDE_ALL_PERMISSION)
+            and not is_demande_file_owner(db, file_path, user.get("email"))):
+        raise HTTPException(status_code=403, detail="Accès refusé à ce fichier")
+
+    path = resolve_stored_path(file_path, SERVED_ROOTS)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Fichier introuvable")
+
+    stat = os.stat(path)
+    headers = {"ETag": content_etag(path, stat), "Cache-Control": cache_control(path)}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    # FileResponse gère Range / If-Range (206, 416) et l'envoi sans copie (pathsend) si le
+    # serveur ASGI le propose
+    return FileResponse(path, headers=headers, stat_result=stat, filename=os.path.basename(path),
+                        content_disposition_type="inline")
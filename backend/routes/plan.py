@@ -1,9 +1,10 @@
 import os
+from datetime import datetime
 from typing import Optional, List, Annotated
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
 from sqlalchemy.orm import Session
-from starlette.responses import FileResponse
+from starlette.responses import StreamingResponse, Response
 
 from backend.config.keycloak_config import get_current_user
 from backend.config.logger import log_user_action
@@ -11,9 +12,14 @@ from backend.models.vulnerability import Vulnerability
 from database import get_db
 from backend.models.audit import Audit
 from backend.models.plan import Plan
-from backend.schemas.plan import PlanResponse, PlanCreate, PlanUpdate
-from backend.services.plan import export_plans_to_excel, get_filtered_plans, process_uploaded_plan, update_plan, \
-    compute_vulnerability_summary, serialize_plan, compute_taux_remediation, generate_plan_ref
+from backend.schemas.plan import PlanResponse, PlanCreate, PlanUpdate, PlanImportJobResponse, PlanSearchResult
+from backend.services.plan import export_plans_to_excel, get_filtered_plans, update_plan, \
+    compute_vulnerability_summary, serialize_plan, compute_taux_remediation, generate_plan_ref, iter_export_file, get_plans_page, \
+    count_filtered_plans, invalidate_plan_count_cache, PLAN_PAGE_DEFAULT_SIZE, PLAN_PAGE_MAX_SIZE
+from backend.services.plan_import import submit_plan_import, get_plan_import, list_plan_imports, ImportQueueFull
+from backend.services.kpi_snapshot import invalidate_kpis
+from backend.services.rollup import record_plans_realises
+from backend.services.plan_search import search_plans, index_plan, PLAN_SEARCH_DEFAULT_LIMIT, PLAN_SEARCH_MAX_LIMIT
 
 from log_config import setup_logger
 
@@ -21,11 +27,29 @@ logger = setup_logger()
 
 router = APIRouter()
 
-@router.post("/upload")
-async def upload_plan(file: UploadFile = File(...), db: Session = Depends(get_db), user: dict = Depends(get_current_user)):
+@router.post("/upload", response_model=PlanImportJobResponse, status_code=202)
+async def upload_plan(file: UploadFile = File(...), user: dict = Depends(get_current_user)):
     username = user.get("preferred_username")
     log_user_action(username, "Importation d'un plan")
-    return await process_uploaded_plan(file, db)
+    if not file.filename.endswith((".xls", ".xlsx")):
+        raise HTTPException(status_code=400, detail="Format de fichier non supporté.")
+
+    contents = await file.read()
+    try:
+        return submit_plan_import(contents, file.filename, username)
+    except ImportQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/imports/", response_model=List[PlanImportJobResponse])
+def list_imports(user: dict = Depends(get_current_user)):
+    return list_plan_imports()
+
+@router.get("/imports/{job_id}", response_model=PlanImportJobResponse)
+def get_import(job_id: str, user: dict = Depends(get_current_user)):
+    job = get_plan_import(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import non trouvé.")
+    return job
 
 @router.get("/plans/download/")
 def export_plans(db: Session = Depends(get_db),
@@ -49,16 +73,22 @@ def export_plans(db: Session = Depends(get_db),
         rapport_month: Optional[int] = None):
     username = user.get("preferred_username")
     log_user_action(username, "Telechargement d'un plan")
-    file_path = export_plans_to_excel(db, ref, application, type_audit, niveau_securite, date_realisation, date_cloture, date_rapport, realisation_year,
-                                      realisation_month, cloture_year, cloture_month, rapport_year, rapport_month)
+    stream = export_plans_to_excel(db, ref, application, type_audit, niveau_securite, date_realisation, date_cloture, date_rapport, realisation_year,
+                                   realisation_month, cloture_year, cloture_month, rapport_year, rapport_month)
 
-    if file_path is None:
+    if stream is None:
         raise HTTPException(status_code=404, detail="Aucun plan trouvé à exporter.")
 
-    return FileResponse(file_path, media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", filename=file_path.split("/")[-1])
+    filename = f"plans_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+    return StreamingResponse(
+        iter_export_file(stream),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @router.get("/plans/", response_model=List[PlanResponse])
 def get_plans(
+    response: Response,
     db: Session = Depends(get_db),
     user: dict = Depends(get_current_user),
     ref: Optional[str] = None,
@@ -77,10 +107,14 @@ def get_plans(
     cloture_year: Optional[int] = None,
     cloture_month: Optional[int] = None,
     rapport_year: Optional[int] = None,
-    rapport_month: Optional[int] = None
+    rapport_month: Optional[int] = None,
+
+    # Pagination par curseur (date_realisation, id) : curseur suivant et total renvoyés en en-têtes
+    limit: Optional[int] = Query(None, ge=1, le=PLAN_PAGE_MAX_SIZE),
+    cursor: Optional[str] = None,
+    include_vulnerabilities: bool = True
 ):
-    plans = get_filtered_plans(
-        db=db,
+    filters = dict(
         ref=ref,
         application=application,
         type_audit=type_audit,
@@ -96,10 +130,29 @@ def get_plans(
         rapport_month=rapport_month
     )
 
+    if limit is None and cursor is None:
+        plans = get_filtered_plans(db=db, include_vulnerabilities=include_vulnerabilities, **filters)
+    else:
+        plans, next_cursor = get_plans_page(
+            db, limit or PLAN_PAGE_DEFAULT_SIZE, cursor, include_vulnerabilities, **filters
+        )
+        response.headers["X-Next-Cursor"] = next_cursor or ""
+        response.headers["X-Total-Count"] = str(count_filtered_plans(db, **filters))
+
     username = user.get("preferred_username")
     log_user_action(username, "Lecture du plan")
 
-    return [serialize_plan(p) for p in plans]
+    return [serialize_plan(p, include_vulnerabilities) for p in plans]
+
+@router.get("/search", response_model=List[PlanSearchResult])
+def search_plan(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(PLAN_SEARCH_DEFAULT_LIMIT, ge=1, le=PLAN_SEARCH_MAX_LIMIT),
+    db: Session = Depends(get_db),
+    user: dict = Depends(get_current_user)
+):
+    # Recherche sur ref et application (sans accents ni casse), résultats classés
+    return search_plans(db, q, limit)
 
 @router.post("/plan", response_model=PlanResponse)
 def create_plan(plan_data: PlanCreate, db: Session = Depends(get_db), user: dict = Depends(get_current_user)):
@@ -134,8 +187,13 @@ def create_plan(plan_data: PlanCreate, db: Session = Depends(get_db), user: dict
         vuln = Vulnerability(plan_id=plan.id, **vuln_data.dict())
         db.add(vuln)
 
+    index_plan(db, plan)
+    record_plans_realises(db, [plan.date_realisation])
+
     db.commit()
     db.refresh(plan)
+    invalidate_plan_count_cache()
+    invalidate_kpis("plans")
     return plan
 
 @router.put("/plans/{plan_id}", response_model=PlanResponse)
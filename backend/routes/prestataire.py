@@ -1,6 +1,7 @@
 from typing import List
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from datetime import date
 
@@ -31,8 +32,9 @@ async def create_prestataire(
 ):
     username = user.get("preferred_username")
     log_user_action(username, "Création d’un nouveau prestataire")
-    lettre_path = service.save_file(lettre_commande, nom) if lettre_commande else None
-    pv_path = service.save_file(pv_reception, nom) if pv_reception else None
+    # Copie des fichiers hors de la boucle d'événements (route async)
+    lettre_path = await run_in_threadpool(service.save_file, lettre_commande, nom) if lettre_commande else None
+    pv_path = await run_in_threadpool(service.save_file, pv_reception, nom) if pv_reception else None
 
     data = {
         "nom": nom,
@@ -96,8 +98,8 @@ async def update_prestataire(
         budget_jour_homme=budget_jour_homme,
     )
 
-    updated = service.update_prestataire_with_files(
-        db, prestataire_id, prestataire_data, pieces_jointes
+    updated = await run_in_threadpool(
+        service.update_prestataire_with_files, db, prestataire_id, prestataire_data, pieces_jointes
     )
 
     if not updated:
@@ -22,6 +22,7 @@ class AffectResponse(BaseModel):
     ips: List[IPResponse]
     date_affectation: date
     affectationpath: Optional[str] = None
+    pdf_status: Optional[str] = None
     etat: Optional[str]
 
     class Config:
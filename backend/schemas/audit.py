@@ -31,6 +31,8 @@ class PieceJointeResponse(BaseModel):
     filepath: str
     auteur: Optional[str]
     upload_date: datetime
+    taille: Optional[int] = None
+    sha256: Optional[str] = None
 
     class Config:
         from_attributes = True
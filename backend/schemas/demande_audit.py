@@ -79,6 +79,7 @@ class DemandeAuditResponse(DemandeAuditBase):
     date_creation: date
     etat: str
     fiche_demande_path: Optional[str] = None
+    pdf_status: Optional[str] = None
 
     @property
     def fichier_url(self):
@@ -86,6 +87,22 @@ class DemandeAuditResponse(DemandeAuditBase):
             return f"http://localhost:8000/{self.fichiers_attaches[0].replace(os.sep, '/')}"
         return None
 
+class DemandeAuditSummary(BaseModel):
+    id: int
+    etat: str
+    date_creation: date
+    updated_at: Optional[date] = None
+    demandeur_email: Optional[str] = None
+    nom_app: str
+    type_app: str
+    type_app_2: Optional[str] = None
+    date_previsionnelle: Optional[date] = None
+    fiche_demande_path: Optional[str] = None
+    pdf_status: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
 class DemandeAuditOut(DemandeAuditBase):
     id: int
     date_creation: date
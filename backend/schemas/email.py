@@ -2,7 +2,8 @@ from pydantic import BaseModel, EmailStr, validator
 from enum import Enum
 import base64
 import binascii
-from typing import Optional
+from datetime import datetime
+from typing import Optional, List
 
 
 class EmailContentType(str, Enum):
@@ -35,4 +36,26 @@ class EmailRequest(BaseModel):
     def validate_pdf_filename(cls, v):
         if not v.lower().endswith('.pdf'):
             raise ValueError("Le nom du fichier doit se terminer par .pdf")
-        return v
\ No newline at end of file
+        return v
+
+
+class EmailOutboxResponse(BaseModel):
+    id: int
+    message_id: Optional[str] = None
+    subject: Optional[str] = None
+    recipient: Optional[str] = None
+    sender: Optional[str] = None
+    status: Optional[str] = None
+    attempts: Optional[int] = None
+    latency_ms: Optional[float] = None
+    created_at: Optional[datetime] = None
+    sent_at: Optional[datetime] = None
+    error_message: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class EmailReplayRequest(BaseModel):
+    ids: Optional[List[int]] = None  # à défaut, tous les emails au statut indiqué
+    status: str = "failed"
@@ -1,7 +1,7 @@
 from typing import Optional, Dict, Any, List
 
 from pydantic import BaseModel
-from datetime import date
+from datetime import date, datetime
 
 from backend.schemas.vulnerability import VulnerabiliteCreate, VulnerabiliteResponse
 
@@ -53,4 +53,28 @@ class PlanResponse(PlanBase):
     vulnerabilites: List[VulnerabiliteResponse] = []
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class PlanImportError(BaseModel):
+    ref: str
+    erreur: str
+
+class PlanImportJobResponse(BaseModel):
+    job_id: str
+    filename: Optional[str] = None
+    status: str
+    rows_parsed: int = 0
+    plans_total: int = 0
+    plans_inserted: int = 0
+    errors: List[PlanImportError] = []
+    message: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+class PlanSearchResult(BaseModel):
+    id: int
+    ref: Optional[str] = None
+    application: Optional[str] = None
+    type_audit: Optional[str] = None
+    date_realisation: Optional[date] = None
+    rank: int
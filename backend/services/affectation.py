@@ -8,41 +8,56 @@ from backend.models.ip import IP
 from backend.models.ports import Port
 from backend.schemas.affectation import AffectSchema
 from backend.schemas.auditeur import AuditeurSchema
+from backend.services.kpi_snapshot import invalidate_kpis
+from backend.services.pdf_render import submit_pdf, get_pdf_template, LOGO_URL, PDF_STATUS_PENDING, PDF_STATUS_READY, PDF_STATUS_FAILED
 
-from jinja2 import Environment, FileSystemLoader
-from weasyprint import HTML
+from database import engine
 
 from log_config import setup_logger
 
 logger = setup_logger()
 
 def generate_affect_pdf(affect):
+    # HTML rendu dans la requête, PDF écrit par le pool de rendu (voir finalize_affect_pdf)
     logger.info(f"Génération du PDF via HTML pour l'affectation ID={affect.id}")
 
-    # Load the HTML template
-    env = Environment(loader=FileSystemLoader('templates'))
-    template = env.get_template('affect_template.html')
-
-    logo_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "pictures", "logo.png"))
-    logo_path_url = f"file:///{logo_path.replace(os.sep, '/')}"
+    # Load the HTML template (compilé une seule fois, voir pdf_render)
+    template = get_pdf_template('affect_template.html')
 
     contacts = affect.demande_audit.contacts if hasattr(affect.demande_audit, "contacts") else []
 
-    # Render the HTML with the data
-    html_content = template.render(affect=affect, logo_path=logo_path_url, contacts=contacts)
-
     # Prepare output folder
     pdf_dir = "fichiers_affectations"
     os.makedirs(pdf_dir, exist_ok=True)
     pdf_filename = f"fiche_affectation_{affect.id}_{affect.demande_audit.nom_app}_{affect.prestataire.nom}_{affect.date_affectation}.pdf"
     pdf_path = os.path.join(pdf_dir, pdf_filename)
 
-    # Generate PDF from HTML
-    HTML(string=html_content).write_pdf(pdf_path)
-
-    logger.info("PDF généré avec succès via HTML.")
+    affect_id = affect.id
+    try:
+        # Render the HTML with the data
+        html_content = template.render(affect=affect, logo_path=LOGO_URL, contacts=contacts)
+
+        # Generate PDF from HTML
+        submit_pdf(html_content, pdf_path, lambda path, error: finalize_affect_pdf(affect_id, path, error))
+    except Exception as e:
+        # Affectation déjà enregistrée : fiche en échec plutôt qu'un statut "pending" définitif
+        logger.error(f"Échec de la préparation de la fiche PDF de l'affectation ID={affect_id} : {e}")
+        finalize_affect_pdf(affect_id, None, str(e))
     return pdf_path.replace("\\", "/")
 
+def finalize_affect_pdf(affect_id: int, pdf_path, error):
+    with Session(engine) as db:
+        affect = db.get(Affectation, affect_id)
+        if affect is None:
+            logger.warning(f"Affectation ID={affect_id} introuvable à la fin du rendu PDF")
+            return
+        if error:
+            affect.pdf_status = PDF_STATUS_FAILED
+        else:
+            affect.affectationpath = pdf_path.replace("\\", "/")
+            affect.pdf_status = PDF_STATUS_READY
+        db.commit()
+
 def create_affect(db: Session, affect_data: AffectSchema):
     logger.info("Création d'une nouvelle affectation d'audit")
     affect = Affectation(
@@ -113,10 +128,12 @@ def create_affect(db: Session, affect_data: AffectSchema):
         db.commit()
         affect.ips.append(ip)
 
-    affectationpath = generate_affect_pdf(affect)
-    affect.affectationpath = affectationpath
+    # Fiche PDF générée en arrière-plan : affectationpath est renseigné à la fin du rendu
+    affect.pdf_status = PDF_STATUS_PENDING
     db.commit()
+    generate_affect_pdf(affect)
     db.refresh(affect)
+    invalidate_kpis("affectations", "auditeurs")
 
     logger.info(f"Affectation créée avec succès : ID={affect.id}")
     return affect
@@ -160,6 +177,7 @@ def create_auditeur(db: Session, auditeur_data: AuditeurSchema):
     db.add(auditeur)
     db.commit()
     db.refresh(auditeur)
+    invalidate_kpis("auditeurs")
     return auditeur
 
 def list_auditeurs(db: Session):
@@ -177,6 +195,7 @@ def delete_auditeur(db: Session, auditeur_id: int):
 
     db.delete(auditeur)
     db.commit()
+    invalidate_kpis("auditeurs")
     logger.info(f"Auditeur ID {auditeur_id} supprimé")
     return auditeur
 
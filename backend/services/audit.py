@@ -1,8 +1,7 @@
-from datetime import datetime, timedelta, date
+from datetime import datetime, date
 from pathlib import Path
-from typing import Optional
+from typing import Optional, List
 
-from hijri_converter import convert
 from fastapi import HTTPException, UploadFile
 from sqlalchemy.orm import Session, joinedload
 
@@ -12,8 +11,11 @@ from backend.models.auditeur import Auditeur
 from backend.models.affectation import Affectation
 from backend.models.commentaire import Commentaire
 from backend.schemas.audit import AuditBase
+from backend.services.kpi_snapshot import invalidate_kpis
+from backend.services.rollup import record_audit_etat_change
+from backend.services.upload_storage import save_upload, UPLOAD_KIND_PIECE_JOINTE
+from backend.services.calendrier import count_working_days, count_working_days_batch
 from log_config import setup_logger
-import os
 from uuid import uuid4
 
 logger = setup_logger()
@@ -36,6 +38,7 @@ def create_audit(db: Session, audit_data: AuditBase):
     affectation = db.query(Affectation).get(audit_data.affectation_id)
     affectation.etat = "Commencé"
     db.commit()
+    invalidate_kpis("audits", "affectations")
 
     logger.info(f"Affectation créée avec succès : ID={audit.id}")
     return audit
@@ -71,62 +74,18 @@ def list_audits(db: Session):
         .all()
     )
 
-    for audit in audits:
-        audit.current_duration = compute_current_duration(audit)  # attribut non stocké, juste pour réponse
+    durations = compute_current_durations(audits)
+    for audit, duration in zip(audits, durations):
+        audit.current_duration = duration  # attribut non stocké, juste pour réponse
 
     return audits
 
 
-def get_maroc_holidays(year: int):
-    # Jours fériés fixes (calendrier grégorien)
-    fixed_holidays = [
-        date(year, 1, 1),    # Jour de l'an
-        date(year, 5, 1),    # Fête du Travail
-        date(year, 7, 30),   # Fête du Trône
-        date(year, 8, 14),   # Allégeance
-        date(year, 8, 20),   # Révolution du Roi et du Peuple
-        date(year, 8, 21),   # Fête de la Jeunesse
-        date(year, 11, 6),   # Marche Verte
-        date(year, 11, 18),  # Fête de l’Indépendance
-    ]
-
-    # Jours fériés religieux (convertis depuis Hijri vers Grégorien)
-    hijri_holidays = [
-        (10, 1),   # Aïd al-Fitr
-        (10, 2),   # Aïd al-Fitr (2ème jour)
-        (12, 10),  # Aïd al-Adha
-        (12, 11),  # Aïd al-Adha (2ème jour)
-        (1, 1),    # Ras el-Am (Nouvel an Hégirien)
-        (3, 12),   # Mouloud (Anniversaire du Prophète)
-        (1, 10),   # Achoura
-    ]
-
-    dynamic_holidays = []
-    for hijri_month, hijri_day in hijri_holidays:
-        # Tester la conversion sur 2 années hégiriennes qui peuvent chevaucher le même an grégorien
-        for hijri_year in [year - 1, year]:
-            try:
-                g_date = convert.Hijri(hijri_year, hijri_month, hijri_day).to_gregorian()
-                if g_date.year == year:
-                    dynamic_holidays.append(date(g_date.year, g_date.month, g_date.day))
-            except Exception:
-                continue
-
-    return fixed_holidays + dynamic_holidays
-
 def calculate_working_days(start: date, end: date) -> float:
     if start > end:
         return 0.0
 
-    total_days = 0
-    current = start
-    while current < end:
-        holidays = get_maroc_holidays(current.year)
-        if current.weekday() < 5 and current not in holidays:
-            total_days += 1
-        current += timedelta(days=1)
-
-    return total_days
+    return count_working_days(start, end)
 
 def update_audit_duration(audit: Audit):
     now = datetime.utcnow()
@@ -150,6 +109,16 @@ def compute_current_duration(audit: Audit):
         duration += calculate_working_days(audit.start_time.date(), now.date())
     return round(duration, 2)
 
+def compute_current_durations(audits: List[Audit]) -> List[float]:
+    # Version groupée de compute_current_duration : les jours ouvrables de tous les audits
+    # "En cours" sont calculés en un seul passage sur un index cumulatif partagé
+    today = datetime.utcnow().date()
+    en_cours = [audit for audit in audits if audit.etat == "En cours" and audit.start_time]
+    added_days = count_working_days_batch([audit.start_time.date() for audit in en_cours], today)
+    added_by_audit = {id(audit): days for audit, days in zip(en_cours, added_days)}
+
+    return [round(audit.total_duration + added_by_audit.get(id(audit), 0), 2) for audit in audits]
+
 def change_audit_etat(db: Session, audit_id: int, new_etat: str):
     if new_etat not in VALID_ETATS:
         raise HTTPException(status_code=400, detail="État invalide")
@@ -158,6 +127,9 @@ def change_audit_etat(db: Session, audit_id: int, new_etat: str):
     if not audit:
         raise HTTPException(status_code=404, detail="Audit non trouvé")
 
+    # État et date de début lus avant update_audit_duration, qui remet start_time à None
+    # en quittant "Terminé" : le mois compté dans le rollup doit être décrémenté
+    old_etat, old_start = audit.etat, audit.start_time
     update_audit_duration(audit)
 
     # Redémarrage si "Suspendu" => "En cours"
@@ -165,6 +137,7 @@ def change_audit_etat(db: Session, audit_id: int, new_etat: str):
         audit.start_time = datetime.utcnow()
 
     audit.etat = new_etat
+    record_audit_etat_change(db, old_etat, old_start, new_etat, audit.start_time)
 
     # 🔁 Si terminé, mise à jour realisation & solde du prestataire
     if new_etat == "Terminé" and audit.prestataire and audit.total_duration > 0:
@@ -185,6 +158,7 @@ def change_audit_etat(db: Session, audit_id: int, new_etat: str):
 
     db.commit()
     db.refresh(audit)
+    invalidate_kpis("audits", "prestataires")
     return audit
 
 
@@ -206,21 +180,20 @@ def add_commentaire(db: Session, audit_id: int, contenu: str, auteur: str):
 UPLOAD_DIR = "commentaires_audit"
 
 def upload_piece_jointe(db: Session, audit_id: int, file: UploadFile, auteur: str):
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
     unique_filename = f"{uuid4()}_{file.filename}"
-    filepath = os.path.join(UPLOAD_DIR, unique_filename)
-
-    with open(filepath, "wb") as buffer:
-        buffer.write(file.file.read())
+    # Copie par blocs (le fichier n'est jamais chargé entier en mémoire), taille plafonnée
+    stored = save_upload(file, UPLOAD_DIR, unique_filename, UPLOAD_KIND_PIECE_JOINTE)
 
     # Convertir les backslashes \ en slashes / pour une compatibilité Web
-    web_friendly_path = Path(filepath).as_posix()
+    web_friendly_path = Path(stored.path).as_posix()
 
     piece = PieceJointe(
         audit_id=audit_id,
         filename=file.filename,
         auteur=auteur,
-        filepath=web_friendly_path
+        filepath=web_friendly_path,
+        taille=stored.size,
+        sha256=stored.sha256
     )
     db.add(piece)
     db.commit()
@@ -0,0 +1,198 @@
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Collection, Iterable, Optional
+
+from log_config import setup_logger
+
+logger = setup_logger()
+
+# Stockage adressé par contenu : chaque fichier reçu est rangé une seule fois sous
+# BLOB_STORE_DIR/ab/cd/<sha256>, les chemins enregistrés en base (fichiers_attaches_audit/...,
+# prestataire/<nom>/..., commentaires_audit/...) sont des liens physiques vers ce blob.
+# Les anciens chemins et les montages statiques restent donc valides tels quels, et le
+# nombre de liens du blob sert de compteur de références (1 = plus utilisé)
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "blobs")
+BLOB_TMP_DIR = os.path.join(BLOB_STORE_DIR, "tmp")
+# Un blob non référencé n'est supprimé qu'après ce délai (lien en cours de création)
+BLOB_GC_GRACE_SECONDS = float(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+
+# Dossiers des fichiers reçus, relus par la migration et la résolution des chemins
+UPLOAD_ROOTS = ("fichiers_attaches_audit", "prestataire", "commentaires_audit")
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+_lock = threading.Lock()
+_hardlinks_supported = True
+
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(BLOB_STORE_DIR, sha256[:2], sha256[2:4], sha256)
+
+
+def new_temp_file():
+    # Fichier temporaire dans le stockage : même système de fichiers que les blobs
+    os.makedirs(BLOB_TMP_DIR, exist_ok=True)
+    return tempfile.NamedTemporaryFile(dir=BLOB_TMP_DIR, suffix=".part", delete=False)
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _link_into_place(source: str, dest_path: str):
+    global _hardlinks_supported
+    # Lien créé à côté puis renommé : remplacement atomique d'un fichier de même nom
+    os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+    staging = f"{dest_path}.link"
+    if os.path.lexists(staging):
+        os.remove(staging)
+    if _hardlinks_supported:
+        try:
+            os.link(source, staging)
+        except OSError as e:
+            # Autre système de fichiers ou liens non gérés : copie simple, sans déduplication
+            _hardlinks_supported = False
+            logger.warning(f"Liens physiques indisponibles pour le stockage des fichiers, copie simple : {e}")
+    if not _hardlinks_supported:
+        shutil.copyfile(source, staging)
+    os.replace(staging, dest_path)
+
+
+def store_file(temp_path: str, sha256: str, dest_path: str):
+    # Le premier exemplaire d'un contenu devient le blob, les suivants ne sont pas conservés
+    blob = blob_path(sha256)
+    try:
+        with _lock:
+            if not os.path.exists(blob):
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(temp_path, blob)
+                temp_path = None
+            else:
+                # Blob réutilisé : rafraîchir sa date pour le protéger du ramasse-miettes
+                os.utime(blob)
+            _link_into_place(blob, dest_path)
+    finally:
+        if temp_path is not None:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+
+def _drop_blob_if_unused(sha256: str) -> bool:
+    blob = blob_path(sha256)
+    try:
+        if os.stat(blob).st_nlink > 1:
+            return False
+        os.remove(blob)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def resolve_stored_path(stored_path: Optional[str], roots: Collection[str] = UPLOAD_ROOTS) -> Optional[str]:
+    # Couche de compatibilité : chemins enregistrés avant ou après le stockage par contenu,
+    # avec séparateurs Windows ou non, ramenés à un fichier existant sous un dossier connu
+    if not stored_path:
+        return None
+    relative = Path(stored_path.replace("\\", "/").lstrip("/"))
+    if not relative.parts or relative.is_absolute() or ".." in relative.parts or relative.parts[0] not in roots:
+        return None
+    path = str(relative)
+    return path if os.path.isfile(path) else None
+
+
+def release_files(stored_paths: Iterable[Optional[str]]) -> int:
+    # Suppression des fichiers d'un enregistrement supprimé ; le blob part avec le dernier lien
+    released = 0
+    for stored_path in stored_paths:
+        path = resolve_stored_path(stored_path)
+        if path is None:
+            continue
+        with _lock:
+            try:
+                linked = os.stat(path).st_nlink > 1
+                sha256 = file_sha256(path) if linked else None
+                os.remove(path)
+            except OSError as e:
+                logger.warning(f"Impossible de supprimer le fichier {path} : {e}")
+                continue
+            released += 1
+            if sha256:
+                _drop_blob_if_unused(sha256)
+    return released
+
+
+def collect_garbage(grace_seconds: float = BLOB_GC_GRACE_SECONDS) -> dict:
+    # Blobs dont plus aucun chemin ne dépend (fichiers remplacés, suppressions hors application)
+    # et fichiers temporaires abandonnés
+    limit = time.time() - grace_seconds
+    removed_blobs = 0
+    freed_bytes = 0
+    removed_temp = 0
+    for root, _, files in os.walk(BLOB_STORE_DIR):
+        in_tmp = os.path.abspath(root) == os.path.abspath(BLOB_TMP_DIR)
+        for name in files:
+            path = os.path.join(root, name)
+            with _lock:
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime > limit or (not in_tmp and stat.st_nlink > 1):
+                        continue
+                    os.remove(path)
+                except OSError:
+                    continue
+            if in_tmp:
+                removed_temp += 1
+            else:
+                removed_blobs += 1
+                freed_bytes += stat.st_size
+    logger.info(f"Ramasse-miettes des fichiers : {removed_blobs} blob(s) supprimé(s), {freed_bytes} octets libérés")
+    return {"blobs_supprimes": removed_blobs, "octets_liberes": freed_bytes, "temporaires_supprimes": removed_temp}
+
+
+def migrate_existing_files() -> dict:
+    # Reprise des fichiers déjà présents : chaque contenu est rangé dans le stockage et les
+    # doublons deviennent des liens vers le même blob (les chemins ne changent pas)
+    migrated = 0
+    deduplicated = 0
+    freed_bytes = 0
+    for upload_root in UPLOAD_ROOTS:
+        for root, _, files in os.walk(upload_root):
+            for name in files:
+                path = os.path.join(root, name)
+                if name.endswith((".part", ".link")) or os.stat(path).st_nlink > 1:
+                    continue
+                sha256 = file_sha256(path)
+                blob = blob_path(sha256)
+                with _lock:
+                    if not os.path.exists(blob):
+                        os.makedirs(os.path.dirname(blob), exist_ok=True)
+                        try:
+                            os.link(path, blob)
+                        except OSError:
+                            shutil.copyfile(path, blob)
+                        migrated += 1
+                    else:
+                        size = os.stat(path).st_size
+                        _link_into_place(blob, path)
+                        deduplicated += 1
+                        freed_bytes += size if _hardlinks_supported else 0
+    logger.info(f"Migration des fichiers : {migrated} blob(s) créé(s), {deduplicated} doublon(s) remplacé(s)")
+    return {"blobs_crees": migrated, "doublons": deduplicated, "octets_liberes": freed_bytes}
+
+
+if __name__ == "__main__":
+    # python -m backend.services.blob_store [migrate|gc]
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    print(migrate_existing_files() if command == "migrate" else collect_garbage())
@@ -0,0 +1,103 @@
+from bisect import bisect_left
+from datetime import date
+from functools import lru_cache
+from typing import List, Tuple
+
+from hijri_converter import convert
+
+
+def get_maroc_holidays(year: int):
+    # Jours fériés fixes (calendrier grégorien)
+    fixed_holidays = [
+        date(year, 1, 1),    # Jour de l'an
+        date(year, 5, 1),    # Fête du Travail
+        date(year, 7, 30),   # Fête du Trône
+        date(year, 8, 14),   # Allégeance
+        date(year, 8, 20),   # Révolution du Roi et du Peuple
+        date(year, 8, 21),   # Fête de la Jeunesse
+        date(year, 11, 6),   # Marche Verte
+        date(year, 11, 18),  # Fête de l’Indépendance
+    ]
+
+    # Jours fériés religieux (convertis depuis Hijri vers Grégorien)
+    hijri_holidays = [
+        (10, 1),   # Aïd al-Fitr
+        (10, 2),   # Aïd al-Fitr (2ème jour)
+        (12, 10),  # Aïd al-Adha
+        (12, 11),  # Aïd al-Adha (2ème jour)
+        (1, 1),    # Ras el-Am (Nouvel an Hégirien)
+        (3, 12),   # Mouloud (Anniversaire du Prophète)
+        (1, 10),   # Achoura
+    ]
+
+    dynamic_holidays = []
+    for hijri_month, hijri_day in hijri_holidays:
+        # Tester la conversion sur 2 années hégiriennes qui peuvent chevaucher le même an grégorien
+        for hijri_year in [year - 1, year]:
+            try:
+                g_date = convert.Hijri(hijri_year, hijri_month, hijri_day).to_gregorian()
+                if g_date.year == year:
+                    dynamic_holidays.append(date(g_date.year, g_date.month, g_date.day))
+            except Exception:
+                continue
+
+    return fixed_holidays + dynamic_holidays
+
+
+@lru_cache(maxsize=None)
+def get_weekday_holiday_ordinals(year: int) -> Tuple[int, ...]:
+    # Calculé une seule fois par année : ordinaux triés et dédoublonnés des jours
+    # fériés qui tombent en semaine (ceux du week-end ne changent pas le décompte)
+    return tuple(sorted({d.toordinal() for d in get_maroc_holidays(year) if d.weekday() < 5}))
+
+
+def count_weekdays(start: date, end: date) -> int:
+    # Nombre de jours du lundi au vendredi dans l'intervalle [start, end)
+    nb_days = end.toordinal() - start.toordinal()
+    if nb_days <= 0:
+        return 0
+
+    full_weeks, remainder = divmod(nb_days, 7)
+    first_weekday = start.weekday()
+    partial = sum(1 for i in range(remainder) if (first_weekday + i) % 7 < 5)
+    return full_weeks * 5 + partial
+
+
+def count_holidays(start: date, end: date) -> int:
+    # Nombre de jours fériés en semaine dans l'intervalle [start, end), par recherche dichotomique
+    if start >= end:
+        return 0
+
+    start_ord = start.toordinal()
+    end_ord = end.toordinal()
+    total = 0
+    for year in range(start.year, date.fromordinal(end_ord - 1).year + 1):
+        ordinals = get_weekday_holiday_ordinals(year)
+        total += bisect_left(ordinals, end_ord) - bisect_left(ordinals, start_ord)
+    return total
+
+
+def count_working_days(start: date, end: date) -> int:
+    # Jours ouvrables dans [start, end) : semaines entières calculées arithmétiquement,
+    # jours fériés soustraits par recherche dans le calendrier pré-calculé
+    if start >= end:
+        return 0
+    return count_weekdays(start, end) - count_holidays(start, end)
+
+
+def count_working_days_batch(starts: List[date], end: date) -> List[int]:
+    # Décompte groupé vers une même date de fin : les dates de début sont triées puis
+    # un index cumulatif (clé = ordinal) est construit en un seul passage, de la plus
+    # récente à la plus ancienne, chaque segment n'étant compté qu'une fois
+    ordinals = sorted({d.toordinal() for d in starts if d < end}, reverse=True)
+
+    cumulative = {}
+    total = 0
+    upper = end
+    for ordinal in ordinals:
+        day = date.fromordinal(ordinal)
+        total += count_working_days(day, upper)
+        cumulative[ordinal] = total
+        upper = day
+
+    return [cumulative.get(d.toordinal(), 0) for d in starts]
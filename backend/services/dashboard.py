@@ -0,0 +1,187 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func, case, select, distinct
+from sqlalchemy.orm import Session
+
+from backend.models.affectation import Affectation
+from backend.models.associations import affect_auditeur
+from backend.models.audit import Audit
+from backend.models.auditeur import Auditeur
+from backend.models.prestataire import Prestataire
+from log_config import setup_logger
+
+logger = setup_logger()
+
+# Les requêtes KPI indépendantes tournent en parallèle, chacune sur sa propre connexion du pool
+DASHBOARD_QUERY_WORKERS = int(os.getenv("DASHBOARD_QUERY_WORKERS", "6"))
+
+_query_pool = ThreadPoolExecutor(max_workers=DASHBOARD_QUERY_WORKERS, thread_name_prefix="dashboard-kpi")
+
+
+def query_effectifs(db: Session):
+    # Auditeurs, auditeurs affectés et affectations : un seul aller-retour (sous-requêtes scalaires)
+    return db.execute(select(
+        select(func.count(Auditeur.id)).scalar_subquery(),
+        select(func.count(distinct(affect_auditeur.c.auditeur_id)))
+        .select_from(affect_auditeur.join(Affectation, Affectation.id == affect_auditeur.c.affectation_id))
+        .scalar_subquery(),
+        select(func.count(Affectation.id)).scalar_subquery(),
+    )).one()
+
+
+def query_audits_par_etat(db: Session):
+    # Agrégation conditionnelle : total et répartition par état en un seul passage
+    return db.query(
+        func.count(Audit.id),
+        func.coalesce(func.sum(case((Audit.etat == "EN COURS", 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Audit.etat == "SUSPENDU", 1), else_=0)), 0),
+        func.coalesce(func.sum(case((Audit.etat == "TERMINE", 1), else_=0)), 0),
+    ).one()
+
+
+def query_budget_prestataires(db: Session):
+    return db.query(
+        func.count(Prestataire.id),
+        func.coalesce(func.sum(Prestataire.budget_total), 0),
+        func.coalesce(func.sum(Prestataire.realisation), 0),
+        func.coalesce(func.sum(Prestataire.solde), 0),
+        func.coalesce(func.sum(case((func.coalesce(Prestataire.realisation, 0) == 0, 1), else_=0)), 0),
+    ).one()
+
+
+def query_types_audit(db: Session):
+    return (
+        db.query(Affectation.type_audit, func.count(Audit.id).label("count"))
+        .join(Audit, Audit.affectation_id == Affectation.id)
+        .group_by(Affectation.type_audit)
+        .all()
+    )
+
+
+def query_top_prestataires(db: Session):
+    return (
+        db.query(
+            Prestataire.nom,
+            func.count(Affectation.id).label("nb_affects")
+        )
+        .join(Affectation)
+        .group_by(Prestataire.id)
+        .order_by(func.count(Affectation.id).desc())
+        .limit(5)
+        .all()
+    )
+
+
+def query_audits_par_prestataire(db: Session):
+    return (
+        db.query(
+            Prestataire.nom,
+            func.count(Audit.id).label("nb_audits")
+        )
+        .join(Affectation, Affectation.prestataire_id == Prestataire.id)
+        .join(Audit, Audit.affectation_id == Affectation.id)
+        .group_by(Prestataire.nom)
+        .all()
+    )
+
+
+KPI_QUERIES = {
+    "effectifs": query_effectifs,
+    "audits": query_audits_par_etat,
+    "budget": query_budget_prestataires,
+    "types_audit": query_types_audit,
+    "top_prestataires": query_top_prestataires,
+    "audits_par_prestataire": query_audits_par_prestataire,
+}
+
+
+def _run_query(bind, query):
+    with Session(bind=bind) as session:
+        return query(session)
+
+
+def run_kpi_queries(db: Session) -> dict:
+    bind = db.get_bind()
+    futures = {name: _query_pool.submit(_run_query, bind, query) for name, query in KPI_QUERIES.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
+def compute_dashboard_kpis(db: Session) -> dict:
+    results = run_kpi_queries(db)
+
+    total_auditeurs, auditeurs_occupees, total_affectations = results["effectifs"]
+    total_audits, audits_en_cours, audits_suspendu, audits_termines = results["audits"]
+    (total_prestataires, budget_total_alloue, realisation_total,
+     solde_total, prestataires_inactifs) = results["budget"]
+
+    taux_occupation = (auditeurs_occupees / total_auditeurs) * 100 if total_auditeurs > 0 else 0
+    taux_conso_budget = (realisation_total / budget_total_alloue) * 100 if budget_total_alloue > 0 else 0
+
+    return {
+        # === KPIs Auditeurs / Audits ===
+        "auditeurs_total": total_auditeurs,
+        "prestataires_total": total_prestataires,
+        "taux_occupation_auditeurs": round(taux_occupation, 2),
+        "audits_total": total_audits,
+        "audits_en_cours": int(audits_en_cours),
+        "audits_suspendu": int(audits_suspendu),
+        "audits_termines": int(audits_termines),
+        "affectations_total": total_affectations,
+
+        # === KPIs Prestataires ===
+        "budget_total_alloue": round(budget_total_alloue, 2),
+        "realisation_total": round(realisation_total, 2),
+        "solde_total": round(solde_total, 2),
+        "taux_conso_budget": round(taux_conso_budget, 2),
+        "prestataires_inactifs": int(prestataires_inactifs),
+
+        # === Données supplémentaires ===
+        "top_prestataires": [
+            {"nom": nom, "nb_affects": nb_affects}
+            for nom, nb_affects in results["top_prestataires"]
+        ],
+        "types_audit": [
+            {"type": t, "count": c} for t, c in results["types_audit"]
+        ],
+        "audits_par_prestataire": [
+            {"nom": nom, "nb_audits": nb_audits}
+            for nom, nb_audits in results["audits_par_prestataire"]
+        ],
+    }
+
+
+def compute_affect_prestataires(db: Session) -> list:
+    results = (
+        db.query(Prestataire.nom, func.count(Affectation.id).label("nb_affectations"))
+        .join(Affectation, Prestataire.id == Affectation.prestataire_id)
+        .group_by(Prestataire.nom)
+        .order_by(func.count(Affectation.id).desc())
+        .limit(5)
+        .all()
+    )
+    return [{"nom": nom, "affectations": nb} for nom, nb in results]
+
+
+def compute_prestataires_kpi(db: Session) -> list:
+    prestataires = db.query(
+        Prestataire.nom, Prestataire.budget_total, Prestataire.realisation, Prestataire.solde
+    ).all()
+
+    result = []
+    for p in prestataires:
+        budget_total = p.budget_total or 0
+        realisation = p.realisation or 0
+        solde = p.solde or 0
+
+        taux_conso = (realisation / budget_total * 100) if budget_total > 0 else 0
+
+        result.append({
+            "nom": p.nom,
+            "budget_total": round(budget_total, 2),
+            "realisation": round(realisation, 2),
+            "solde": round(solde, 2),
+            "taux_conso": round(taux_conso, 2),
+        })
+
+    return result
@@ -1,12 +1,13 @@
+import base64
 import json
 import os
-import shutil
 import uuid
 from datetime import date
 
 from fastapi import UploadFile, HTTPException
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional, Dict
 
 from backend.config.encryption import encrypt_password, decrypt_password
@@ -14,15 +15,33 @@ from backend.models.DemandeurContact import DemandeurContact
 from backend.models.demande_audit import Demande_Audit
 from werkzeug.utils import secure_filename
 
-from backend.services.email import send_email_with_pdf, send_email_alerte_demande, send_email_validation_demande, \
+from backend.services.upload_storage import save_upload, UPLOAD_KIND_DEMANDE
+from backend.services.pdf_render import submit_pdf, get_pdf_template, LOGO_URL, PDF_STATUS_PENDING, PDF_STATUS_READY, PDF_STATUS_FAILED
+from backend.services.email import encode_attachment, send_email_with_pdf, send_email_alerte_demande, send_email_validation_demande, \
     send_email_rejet_demande
+from database import engine
 from log_config import setup_logger
 
-from jinja2 import Environment, FileSystemLoader
-from weasyprint import HTML
-
 logger = setup_logger()
 
+DEMANDE_PAGE_DEFAULT_SIZE = int(os.getenv("DEMANDE_PAGE_DEFAULT_SIZE", "50"))
+DEMANDE_PAGE_MAX_SIZE = int(os.getenv("DEMANDE_PAGE_MAX_SIZE", "500"))
+
+# Projection allégée pour la grille des demandes : aucune colonne Text ni JSON
+DEMANDE_SUMMARY_COLUMNS = (
+    Demande_Audit.id,
+    Demande_Audit.etat,
+    Demande_Audit.date_creation,
+    Demande_Audit.updated_at,
+    Demande_Audit.demandeur_email,
+    Demande_Audit.nom_app,
+    Demande_Audit.type_app,
+    Demande_Audit.type_app_2,
+    Demande_Audit.date_previsionnelle,
+    Demande_Audit.fiche_demande_path,
+    Demande_Audit.pdf_status,
+)
+
 PDF_DIR = "fiches_demandes_audit"
 STATIC_DIR = "pictures"
 os.makedirs(PDF_DIR, exist_ok=True)
@@ -55,29 +74,25 @@ def save_uploaded_file(upload_file: UploadFile):
         # Renommer avec UUID pour éviter les collisions/injections
         new_filename = f"{uuid.uuid4()}{file_extension}"
         upload_folder = "fichiers_attaches_audit"
-        os.makedirs(upload_folder, exist_ok=True)
-        file_path = os.path.join(upload_folder, new_filename)
 
-        # Sauvegarde du fichier
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(upload_file.file, buffer)
+        # Sauvegarde du fichier (par blocs, taille plafonnée, empreinte SHA-256)
+        stored = save_upload(upload_file, upload_folder, new_filename, UPLOAD_KIND_DEMANDE)
 
-        logger.info("Fichier '%s' sauvegardé avec succès sous : %s", original_filename, file_path)
-        return file_path
+        logger.info("Fichier '%s' sauvegardé avec succès sous : %s (%d octets, sha256 %s)",
+                    original_filename, stored.path, stored.size, stored.sha256)
+        return stored.path
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error("Échec de l'enregistrement du fichier")
         return None
 
-def generate_audit_pdf(demande_audit) -> str:
-    pdf_path = os.path.join(PDF_DIR, f"fiche_demande_audit_{demande_audit.id}_{demande_audit.nom_app}_{demande_audit.date_creation}.pdf")
-
-    # Load the HTML template
-    env = Environment(loader=FileSystemLoader('templates'))
-    template = env.get_template('fiche_demande_audit_template.html')
+def render_audit_html(demande_audit) -> str:
 
     try:
-        template = env.get_template("fiche_demande_audit_template.html")
+        # Template compilé partagé (voir pdf_render)
+        template = get_pdf_template("fiche_demande_audit_template.html")
 
         # Prepare data
         fichiers_list = []
@@ -92,9 +107,6 @@ def generate_audit_pdf(demande_audit) -> str:
         if not fichiers_list:
             fichiers_list = ["Aucun"]
 
-        logo_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "pictures", "logo.png"))
-        logo_path_url = f"file:///{logo_path.replace(os.sep, '/')}"
-
         contacts = demande_audit.contacts if hasattr(demande_audit, "contacts") else []
 
         comptes_test = demande_audit.comptes_test if demande_audit.comptes_test else []
@@ -107,18 +119,78 @@ def generate_audit_pdf(demande_audit) -> str:
             fichiers=fichiers_list,
             fichiers_attaches_urls=getattr(demande_audit, "fichiers_attaches_urls", []),
             architecture_file_url=getattr(demande_audit, "architecture_file_url", ""),
-            logo_path=logo_path_url,
+            logo_path=LOGO_URL,
             contacts=contacts,
             comptes_test=comptes_test,
             architecture_filename=architecture_filename
         )
-
-        HTML(string=html_content).write_pdf(pdf_path)
-        return pdf_path
+        return html_content
 
     except Exception as e:
         raise HTTPException(status_code=500, detail="Échec lors de la génération du PDF")
 
+def generate_audit_pdf(demande_audit) -> str:
+    # Le HTML est rendu ici (accès ORM), le PDF dans le pool de rendu : le chemin et les
+    # emails sont traités par finalize_audit_pdf une fois le fichier écrit
+    pdf_path = os.path.join(PDF_DIR, f"fiche_demande_audit_{demande_audit.id}_{demande_audit.nom_app}_{demande_audit.date_creation}.pdf")
+    demande_id = demande_audit.id
+    try:
+        html_content = render_audit_html(demande_audit)
+        submit_pdf(html_content, pdf_path, lambda path, error: finalize_audit_pdf(demande_id, path, error))
+    except Exception as e:
+        # La demande est déjà enregistrée : fiche en échec plutôt qu'un statut "pending" définitif
+        logger.error("Échec de la préparation de la fiche PDF de la demande %d : %s", demande_id, e)
+        finalize_audit_pdf(demande_id, None, getattr(e, "detail", None) or str(e))
+    return pdf_path
+
+def finalize_audit_pdf(demande_id: int, pdf_path: Optional[str], error: Optional[str]):
+    with Session(engine) as db:
+        demande = db.get(Demande_Audit, demande_id)
+        if demande is None:
+            logger.warning("Demande d'audit %d introuvable à la fin du rendu PDF.", demande_id)
+            return
+
+        if error:
+            demande.pdf_status = PDF_STATUS_FAILED
+            db.commit()
+            return
+
+        demande.fiche_demande_path = pdf_path
+        demande.pdf_status = PDF_STATUS_READY
+        db.commit()
+        first_email = demande.contacts[0].email if demande.contacts else "default@email.com"
+
+    with open(pdf_path, "rb") as f:
+        pdf_data = f.read()
+
+    # PDF encodé une seule fois pour les deux emails
+    pdf_attachment = encode_attachment("fiche_demande_audit.pdf", pdf_data)
+
+    send_email_with_pdf(
+        to_email=first_email,
+        subject="Confirmation de la demande d'audit",
+        body="Votre demande d'audit a bien été enregistrée.",
+        content_type="html",
+        pdf_filename="fiche_demande_audit.pdf",
+        pdf_content=pdf_attachment,
+        template_name="default_template.html"
+    )
+
+    logger.info("Email de confirmation envoyee avec succes.")
+
+    send_email_alerte_demande(
+        subject="Alerte d'une nouvelle demande d'audit",
+        body="Nouvelle demande d'audit.",
+        content_type="html",
+        pdf_filename="fiche_demande_audit.pdf",
+        pdf_content=pdf_attachment,
+        template_name="alerte_template.html"
+    )
+
+    logger.info("Email d'alerte envoyee avec succes.")
+
+    logger.info("Demande d'audit finalisée. Fiche PDF générée à l'emplacement : %s", pdf_path)
+
 def create_demande_audit(
     contacts: List[Dict],
     demandeur_email: str,
@@ -230,48 +302,79 @@ def create_demande_audit(
 
     logger.info("Demande d'audit insérée en base avec succès. ID : %d", demande.id)
 
-    # Génération du PDF
-    pdf_path = generate_audit_pdf(demande)
-    demande.fiche_demande_path = pdf_path
+    # Génération du PDF en arrière-plan : la demande est renvoyée avec le statut "pending"
+    demande.pdf_status = PDF_STATUS_PENDING
     db.commit()
+    generate_audit_pdf(demande)
+    db.refresh(demande)
 
-    with open(pdf_path, "rb") as f:
-        pdf_data = f.read()
-
-    first_email = demande.contacts[0].email if demande.contacts else "default@email.com"
-
-    send_email_with_pdf(
-        to_email=first_email,
-        subject="Confirmation de la demande d'audit",
-        body="Votre demande d'audit a bien été enregistrée.",
-        content_type="html",
-        pdf_filename="fiche_demande_audit.pdf",
-        pdf_content=pdf_data,
-        template_name="default_template.html"
-    )
-
-    logger.info("Email de confirmation envoyee avec succes.")
-
-    send_email_alerte_demande(
-        subject="Alerte d'une nouvelle demande d'audit",
-        body="Nouvelle demande d'audit.",
-        content_type="html",
-        pdf_filename="fiche_demande_audit.pdf",
-        pdf_content=pdf_data,
-        template_name="alerte_template.html"
-    )
-
-    logger.info("Email d'alerte envoyee avec succes.")
-
-    logger.info("Demande d'audit finalisée. Fiche PDF générée à l'emplacement : %s", pdf_path)
+    logger.info("Demande d'audit enregistrée, génération de la fiche PDF en cours.")
 
     return demande
 
-def get_all_audits(db: Session) -> List[Demande_Audit]:
-    demande_audits = db.query(Demande_Audit).all()
+def apply_demande_filters(
+    query,
+    etat: Optional[str] = None,
+    demandeur_email: Optional[str] = None,
+    date_debut: Optional[date] = None,
+    date_fin: Optional[date] = None
+):
+    # Filtres sur les colonnes indexées uniquement
+    if etat:
+        query = query.filter(Demande_Audit.etat == etat)
+    if demandeur_email:
+        query = query.filter(Demande_Audit.demandeur_email == demandeur_email)
+    if date_debut:
+        query = query.filter(Demande_Audit.date_creation >= date_debut)
+    if date_fin:
+        query = query.filter(Demande_Audit.date_creation <= date_fin)
+    return query
+
+def demandes_query(db: Session, summary: bool = False):
+    if summary:
+        return db.query(*DEMANDE_SUMMARY_COLUMNS)
+    # Contacts chargés en une requête pour toute la page (au lieu d'une par demande)
+    return db.query(Demande_Audit).options(selectinload(Demande_Audit.contacts))
+
+def get_all_audits(db: Session, summary: bool = False, **filters) -> List[Demande_Audit]:
+    query = apply_demande_filters(demandes_query(db, summary), **filters)
+    demande_audits = query.order_by(Demande_Audit.date_creation.desc(), Demande_Audit.id.desc()).all()
     logger.info("Récupération de tous les audits. Total : %d", len(demande_audits))
     return demande_audits
 
+def encode_demande_cursor(demande) -> str:
+    return base64.urlsafe_b64encode(f"{demande.date_creation.isoformat()}|{demande.id}".encode()).decode()
+
+def decode_demande_cursor(cursor: str):
+    try:
+        date_part, id_part = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return date.fromisoformat(date_part), int(id_part)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide.")
+
+def get_demandes_page(
+    db: Session,
+    limit: int = DEMANDE_PAGE_DEFAULT_SIZE,
+    cursor: Optional[str] = None,
+    summary: bool = False,
+    **filters
+):
+    # Pagination par curseur sur (date_creation, id) décroissants, sans OFFSET
+    query = apply_demande_filters(demandes_query(db, summary), **filters)
+    if cursor:
+        last_date, last_id = decode_demande_cursor(cursor)
+        query = query.filter(or_(
+            Demande_Audit.date_creation < last_date,
+            and_(Demande_Audit.date_creation == last_date, Demande_Audit.id < last_id)
+        ))
+    demandes = query.order_by(Demande_Audit.date_creation.desc(), Demande_Audit.id.desc()).limit(limit + 1).all()
+
+    next_cursor = encode_demande_cursor(demandes[limit - 1]) if len(demandes) > limit else None
+    return demandes[:limit], next_cursor
+
+def count_demandes(db: Session, **filters) -> int:
+    return apply_demande_filters(db.query(func.count(Demande_Audit.id)), **filters).scalar() or 0
+
 
 def get_audit_by_id(demande_audit_id: int, db: Session) -> Optional[Demande_Audit]:
     demande_audit = db.query(Demande_Audit).filter(Demande_Audit.id == demande_audit_id).first()
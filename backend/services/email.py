@@ -1,14 +1,16 @@
-from datetime import datetime
+from functools import lru_cache
+import uuid
+from typing import NamedTuple, Optional, Union
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
+from email.mime.base import MIMEBase
 from email.mime.image import MIMEImage
+from email.utils import make_msgid
 from pathlib import Path
 from jinja2 import Environment, FileSystemLoader
-from sqlalchemy.orm import Session
-import smtplib
 
-from backend.models.email import Email
+from backend.services.email_outbox import send_via_outbox
 from settings import settings
 from log_config import setup_logger
 
@@ -18,47 +20,83 @@ logger = setup_logger()
 TEMPLATE_DIR = Path(__file__).parent.parent.parent / "templates/emails"
 LOGO_PATH = Path(__file__).parent.parent.parent / "pictures" / "logo.png"
 
-template_env = Environment(loader=FileSystemLoader(str(TEMPLATE_DIR)))
+LOGO_SRC = 'src="/pictures/logo.png"'
+LOGO_CID_SRC = 'src="cid:logo_cam"'
 
+# Domaine des Message-ID calculé une fois : sans domaine, make_msgid appelle socket.getfqdn()
+# (résolution DNS inverse) à chaque message
+MESSAGE_ID_DOMAIN = settings.SMTP_USER.rpartition("@")[2] if settings.SMTP_USER and "@" in settings.SMTP_USER else "localhost"
 
-def log_email_to_db(
-    subject: str,
-    body: str,
-    to_email: str,
-    sender: str,
-    status: str,
-    error_message: str = None
-):
-    email_record = Email(
-        subject=subject,
-        message=body,
-        recipient=to_email,
-        sender=sender,
-        status=status,
-        sent_at=datetime.utcnow() if status == 'sent' else None,
-        error_message=error_message
-    )
+
+class LogoCidLoader(FileSystemLoader):
+    # Réécriture du lien du logo vers sa pièce inline (cid:) faite une seule fois,
+    # au chargement du template, au lieu d'un replace sur chaque HTML rendu
+    def get_source(self, environment, template):
+        source, filename, uptodate = super().get_source(environment, template)
+        return source.replace(LOGO_SRC, LOGO_CID_SRC), filename, uptodate
+
+
+# Templates compilés gardés en cache (auto_reload désactivé : pas de stat disque à chaque envoi)
+template_env = Environment(loader=LogoCidLoader(str(TEMPLATE_DIR)), auto_reload=False)
+
+
+class EncodedAttachment(NamedTuple):
+    # Pièce jointe déjà encodée en base64, réutilisable pour plusieurs messages
+    filename: str
+    payload: str
+
+
+def encode_attachment(filename: str, content: bytes) -> EncodedAttachment:
+    return EncodedAttachment(filename, MIMEApplication(content, Name=filename).get_payload())
+
+
+def encoded_part(maintype: str, subtype: str, payload: str, **params) -> MIMEBase:
+    part = MIMEBase(maintype, subtype, **params)
+    part.set_payload(payload)
+    part['Content-Transfer-Encoding'] = 'base64'
+    return part
+
+
+def new_boundary() -> str:
+    # Frontière aléatoire fixée à la construction : évite au générateur de rechercher
+    # une frontière absente du texte en parcourant tout le message (PDF compris)
+    return f"==============={uuid.uuid4().hex}=="
+
+
+@lru_cache(maxsize=1)
+def get_logo_payload() -> Optional[str]:
+    # Logo lu et encodé une seule fois par processus
+    try:
+        with open(LOGO_PATH, "rb") as img_file:
+            return MIMEImage(img_file.read()).get_payload()
+    except Exception as e:
+        logger.warning(f"Impossible de charger le logo: {e}", exc_info=True)
+        return None
 
 
 def render_html_email(template_name: str, context: dict) -> str:
     try:
         template = template_env.get_template(template_name)
-        html_content = template.render(context)
-        return html_content.replace('src="/pictures/logo.png"', 'src="cid:logo_cam"')
+        return template.render(context)
     except Exception as e:
         logger.error(f"Erreur de rendu du template: {e}", exc_info=True)
         return context["body"].replace('\n', '<br>')
 
 
 def attach_logo(msg: MIMEMultipart):
-    try:
-        with open(LOGO_PATH, "rb") as img_file:
-            logo = MIMEImage(img_file.read())
-            logo.add_header('Content-ID', '<logo_cam>')
-            logo.add_header('Content-Disposition', 'inline', filename="logo.png")
-            msg.attach(logo)
-    except Exception as e:
-        logger.warning(f"Impossible d'attacher le logo: {e}", exc_info=True)
+    payload = get_logo_payload()
+    if payload is None:
+        return
+    logo = encoded_part('image', 'png', payload)
+    logo.add_header('Content-ID', '<logo_cam>')
+    logo.add_header('Content-Disposition', 'inline', filename="logo.png")
+    msg.attach(logo)
+
+
+def attach_pdf(msg: MIMEMultipart, attachment: EncodedAttachment):
+    pdf = encoded_part('application', 'octet-stream', attachment.payload, Name=attachment.filename)
+    pdf['Content-Disposition'] = f'attachment; filename="{attachment.filename}"'
+    msg.attach(pdf)
 
 
 def build_email(
@@ -67,27 +105,29 @@ def build_email(
     body: str,
     template_name: str,
     pdf_filename: str = None,
-    pdf_content: bytes = None
+    pdf_content: Union[bytes, EncodedAttachment] = None
 ) -> MIMEMultipart:
-    msg = MIMEMultipart('mixed')
+    msg = MIMEMultipart('mixed', boundary=new_boundary())
     msg['From'] = settings.SMTP_USER
     msg['To'] = to_email
     msg['Subject'] = subject
+    msg['Message-ID'] = make_msgid(domain=MESSAGE_ID_DOMAIN)
 
     context = {"subject": subject, "body": body.replace('\n', '<br>')}
     html = render_html_email(template_name, context)
 
-    alt_part = MIMEMultipart('alternative')
+    alt_part = MIMEMultipart('alternative', boundary=new_boundary())
     alt_part.attach(MIMEText(body, 'plain'))
     alt_part.attach(MIMEText(html, 'html'))
     msg.attach(alt_part)
 
     attach_logo(msg)
 
-    if pdf_content and pdf_filename:
-        pdf = MIMEApplication(pdf_content, Name=pdf_filename)
-        pdf['Content-Disposition'] = f'attachment; filename="{pdf_filename}"'
-        msg.attach(pdf)
+    # pdf_content peut être déjà encodé (encode_attachment) pour un envoi à plusieurs destinataires
+    if isinstance(pdf_content, EncodedAttachment):
+        attach_pdf(msg, pdf_content)
+    elif pdf_content and pdf_filename:
+        attach_pdf(msg, encode_attachment(pdf_filename, pdf_content))
 
     return msg
 
@@ -98,22 +138,12 @@ def send_email(
     body: str,
     template_name: str,
     pdf_filename: str = None,
-    pdf_content: bytes = None
+    pdf_content: Union[bytes, EncodedAttachment] = None
 ):
-    try:
-        msg = build_email(to_email, subject, body, template_name, pdf_filename, pdf_content)
-
-        with smtplib.SMTP(settings.SMTP_SERVER, settings.SMTP_PORT) as server:
-            server.starttls()
-            server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
-            server.send_message(msg)
-
-        log_email_to_db(subject, body, to_email, settings.SMTP_USER, "sent")
-
-    except Exception as e:
-        logger.error(f"Erreur d'envoi d'email: {e}", exc_info=True)
-        log_email_to_db(subject, body, to_email, settings.SMTP_USER, "failed", str(e))
-        raise
+    # Le message est construit et sérialisé ici, enregistré dans l'outbox puis mis en file :
+    # l'envoi SMTP (connexion réutilisée, nouvelles tentatives) se fait hors de la requête
+    msg = build_email(to_email, subject, body, template_name, pdf_filename, pdf_content)
+    send_via_outbox(msg['Message-ID'], subject, body, to_email, settings.SMTP_USER, msg.as_bytes())
 
 
 # ==== Fonctions spécifiques =====
@@ -124,7 +154,7 @@ def send_email_with_pdf(
     body: str,
     content_type: str,
     pdf_filename: str,
-    pdf_content: bytes,
+    pdf_content: Union[bytes, EncodedAttachment],
     template_name: str = "default_template.html"
 ):
     send_email(to_email, subject, body, template_name, pdf_filename, pdf_content)
@@ -135,7 +165,7 @@ def send_email_alerte_demande(
     body: str,
     content_type: str,
     pdf_filename: str,
-    pdf_content: bytes,
+    pdf_content: Union[bytes, EncodedAttachment],
     template_name: str = "alerte_template.html"
 ):
     send_email(settings.SMTP_RECEIVER_USER, subject, body, template_name, pdf_filename, pdf_content)
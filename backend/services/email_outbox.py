@@ -0,0 +1,211 @@
+import base64
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Optional, List
+
+from fastapi import HTTPException
+from sqlalchemy import update, bindparam, or_, and_, case, null
+from sqlalchemy.orm import Session
+
+from backend.models.email import Email
+from backend.services.email_queue import enqueue_message
+from database import engine
+from log_config import setup_logger
+
+logger = setup_logger()
+
+STATUS_QUEUED = "queued"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+
+# Écritures de l'outbox regroupées par un thread unique : insertions en executemany,
+# puis mises à jour de statut en executemany, toutes les FLUSH_INTERVAL s ou BATCH_SIZE opérations
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv("EMAIL_OUTBOX_BATCH_SIZE", "100"))
+EMAIL_OUTBOX_FLUSH_INTERVAL = float(os.getenv("EMAIL_OUTBOX_FLUSH_INTERVAL", "0.5"))
+EMAIL_OUTBOX_PAGE_MAX_SIZE = 200
+# Messages renvoyés par lot (MIME complet en mémoire, pièces jointes comprises)
+EMAIL_REPLAY_BATCH_SIZE = int(os.getenv("EMAIL_REPLAY_BATCH_SIZE", "10"))
+
+_ops = queue.Queue()
+_writer_thread: Optional[threading.Thread] = None
+_start_lock = threading.Lock()
+
+_status_update = (
+    update(Email.__table__)
+    .where(Email.__table__.c.message_id == bindparam("b_message_id"))
+    .values(
+        status=bindparam("b_status"),
+        attempts=Email.__table__.c.attempts + bindparam("b_attempts"),
+        latency_ms=bindparam("b_latency_ms"),
+        sent_at=bindparam("b_sent_at"),
+        error_message=bindparam("b_error_message"),
+        # MIME conservé uniquement tant que le message n'est pas envoyé (file, échec, renvoi) :
+        # pas de PDF en base64 gardé dans chaque ligne de l'historique
+        mime_payload=case(
+            (bindparam("b_status") == STATUS_SENT, null()),
+            else_=Email.__table__.c.mime_payload
+        ),
+    )
+)
+
+
+def _flush(inserts: List[dict], updates: List[dict]):
+    with Session(engine) as db:
+        if inserts:
+            db.bulk_insert_mappings(Email, inserts)
+        if updates:
+            db.execute(_status_update, updates)
+        db.commit()
+
+
+def _writer_loop():
+    while True:
+        inserts, updates = [], []
+        deadline = None
+        while len(inserts) + len(updates) < EMAIL_OUTBOX_BATCH_SIZE:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                kind, data = _ops.get(timeout=timeout)
+            except queue.Empty:
+                break
+            (inserts if kind == "insert" else updates).append(data)
+            if deadline is None:
+                deadline = time.monotonic() + EMAIL_OUTBOX_FLUSH_INTERVAL
+
+        try:
+            _flush(inserts, updates)
+        except Exception as e:
+            logger.error(f"Erreur d'écriture de l'outbox email ({len(inserts)} insertion(s), "
+                         f"{len(updates)} mise(s) à jour) : {e}", exc_info=True)
+        finally:
+            for _ in range(len(inserts) + len(updates)):
+                _ops.task_done()
+
+
+def _ensure_started():
+    global _writer_thread
+    with _start_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, name="email-outbox-writer", daemon=True)
+            _writer_thread.start()
+
+
+def record_queued(message_id: str, subject: str, body: str, to_email: str, sender: str, payload: bytes):
+    _ensure_started()
+    _ops.put(("insert", {
+        "message_id": message_id,
+        "subject": subject[:100] if subject else subject,
+        "message": body,
+        "recipient": to_email,
+        "sender": sender,
+        "status": STATUS_QUEUED,
+        "attempts": 0,
+        "created_at": datetime.utcnow(),
+        "mime_payload": payload,
+    }))
+
+
+def status_callback(message_id: str):
+    # Callback de fin d'envoi : statut, tentatives et latence mis à jour par lot
+    def on_done(success: bool, error: Optional[str], attempts: int, latency: float):
+        _ensure_started()
+        _ops.put(("update", {
+            "b_message_id": message_id,
+            "b_status": STATUS_SENT if success else STATUS_FAILED,
+            "b_attempts": attempts,
+            "b_latency_ms": round(latency * 1000, 1),
+            # sent_at réservé aux envois réussis : tri et curseur de list_outbox
+            "b_sent_at": datetime.utcnow() if success else None,
+            "b_error_message": error,
+        }))
+    return on_done
+
+
+def send_via_outbox(message_id: str, subject: str, body: str, to_email: str, sender: str, payload: bytes):
+    record_queued(message_id, subject, body, to_email, sender, payload)
+    enqueue_message(payload, status_callback(message_id), envelope=(sender, [to_email]))
+
+
+def wait_for_outbox(timeout: float) -> bool:
+    deadline = time.monotonic() + timeout
+    while _ops.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not _ops.unfinished_tasks
+
+
+def encode_email_cursor(email: Email) -> str:
+    sent_at = email.sent_at.isoformat() if email.sent_at else ""
+    return base64.urlsafe_b64encode(f"{sent_at}|{email.id}".encode()).decode()
+
+
+def decode_email_cursor(cursor: str):
+    try:
+        sent_at, email_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return (datetime.fromisoformat(sent_at) if sent_at else None), int(email_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur invalide.")
+
+
+def list_outbox(db: Session, status: Optional[str], limit: int, cursor: Optional[str] = None):
+    # Parcours par (sent_at desc, id desc) sur l'index (status, sent_at, id) ;
+    # les messages non envoyés (en file ou en échec, sent_at NULL) viennent en dernier
+    query = db.query(
+        Email.id, Email.message_id, Email.subject, Email.recipient, Email.sender, Email.status,
+        Email.attempts, Email.latency_ms, Email.created_at, Email.sent_at, Email.error_message
+    )
+    if status:
+        query = query.filter(Email.status == status)
+
+    if cursor:
+        last_sent_at, last_id = decode_email_cursor(cursor)
+        if last_sent_at is None:
+            query = query.filter(Email.sent_at.is_(None), Email.id < last_id)
+        else:
+            query = query.filter(or_(
+                Email.sent_at.is_(None),
+                Email.sent_at < last_sent_at,
+                and_(Email.sent_at == last_sent_at, Email.id < last_id)
+            ))
+
+    rows = query.order_by(Email.sent_at.desc(), Email.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_email_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def replay_emails(db: Session, ids: Optional[List[int]] = None, status: str = STATUS_FAILED) -> int:
+    # Renvoi en masse à partir du MIME stocké : ni template, ni logo, ni PDF à reconstruire
+    query = db.query(Email.id, Email.message_id, Email.sender, Email.recipient, Email.mime_payload) \
+        .filter(Email.mime_payload.isnot(None))
+    query = query.filter(Email.id.in_(ids)) if ids else query.filter(Email.status == status)
+
+    replayed = 0
+    last_id = 0
+    while True:
+        batch = query.filter(Email.id > last_id).order_by(Email.id).limit(EMAIL_REPLAY_BATCH_SIZE).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        db.query(Email).filter(Email.id.in_([row.id for row in batch])).update(
+            {Email.status: STATUS_QUEUED, Email.sent_at: None, Email.error_message: None}, synchronize_session=False
+        )
+        db.commit()
+
+        for row in batch:
+            enqueue_message(row.mime_payload, status_callback(row.message_id), envelope=(row.sender, [row.recipient]))
+        replayed += len(batch)
+
+    logger.info(f"{replayed} email(s) remis en file d'envoi.")
+    return replayed
+
+
+def purge_sent_payloads(db: Session) -> int:
+    # Reprise des lignes envoyées avant la purge à l'envoi (python -m backend.services.schema_upgrade)
+    purged = db.query(Email).filter(Email.status == STATUS_SENT, Email.mime_payload.isnot(None)).update(
+        {Email.mime_payload: None}, synchronize_session=False
+    )
+    db.commit()
+    return purged
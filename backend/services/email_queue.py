@@ -0,0 +1,176 @@
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.message import Message
+from typing import Optional, Callable, Union, Tuple, List
+
+from settings import settings
+from log_config import setup_logger
+
+logger = setup_logger()
+
+# File d'envoi en mémoire : les requêtes ne font que déposer le message, des threads
+# dédiés l'envoient sur des connexions SMTP authentifiées et réutilisées
+EMAIL_QUEUE_SIZE = int(os.getenv("EMAIL_QUEUE_SIZE", "500"))
+EMAIL_WORKERS = int(os.getenv("EMAIL_WORKERS", "2"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "4"))
+EMAIL_RETRY_BACKOFF = float(os.getenv("EMAIL_RETRY_BACKOFF", "2"))
+EMAIL_ENQUEUE_TIMEOUT = float(os.getenv("EMAIL_ENQUEUE_TIMEOUT", "2"))
+
+# Connexion fermée après SMTP_IDLE_TIMEOUT s d'inactivité, vérifiée par NOOP au-delà de SMTP_NOOP_AFTER s
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+SMTP_NOOP_AFTER = float(os.getenv("SMTP_NOOP_AFTER", "15"))
+# Désactiver STARTTLS (et laisser SMTP_PASSWORD vide) pour un serveur SMTP local de débogage
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+
+# on_done(succes, erreur, tentatives, latence_en_secondes)
+DoneCallback = Callable[[bool, Optional[str], int, float], None]
+# Message MIME, ou message déjà sérialisé accompagné de son enveloppe (expéditeur, destinataires)
+Payload = Union[Message, bytes]
+Envelope = Optional[Tuple[str, List[str]]]
+
+_queue = queue.Queue(maxsize=EMAIL_QUEUE_SIZE)
+_workers = []
+_start_lock = threading.Lock()
+
+
+class SmtpConnection:
+    def __init__(self):
+        self.server: Optional[smtplib.SMTP] = None
+        self.last_used = 0.0
+
+    def _connect(self):
+        server = smtplib.SMTP(settings.SMTP_SERVER, settings.SMTP_PORT, timeout=SMTP_TIMEOUT)
+        try:
+            if SMTP_STARTTLS:
+                server.starttls()
+            if settings.SMTP_PASSWORD:
+                server.login(settings.SMTP_USER, settings.SMTP_PASSWORD)
+        except Exception:
+            server.close()
+            raise
+        self.server = server
+
+    def _is_alive(self) -> bool:
+        try:
+            return self.server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def send(self, msg: Payload, envelope: Envelope = None):
+        idle = time.monotonic() - self.last_used
+        if self.server is not None and (idle > SMTP_IDLE_TIMEOUT or (idle > SMTP_NOOP_AFTER and not self._is_alive())):
+            self.close()
+        if self.server is None:
+            self._connect()
+
+        try:
+            if isinstance(msg, bytes):
+                self.server.sendmail(envelope[0], envelope[1], msg)
+            else:
+                self.server.send_message(msg)
+        except Exception:
+            self.close()
+            raise
+        self.last_used = time.monotonic()
+
+    def close_if_idle(self):
+        if self.server is not None and time.monotonic() - self.last_used > SMTP_IDLE_TIMEOUT:
+            self.close()
+
+    def close(self):
+        if self.server is None:
+            return
+        try:
+            self.server.quit()
+        except Exception:
+            self.server.close()
+        self.server = None
+
+
+def is_permanent_error(error: Exception) -> bool:
+    # Refus définitifs (5xx, destinataires refusés) : inutile de réessayer
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 500 <= error.smtp_code < 600
+    return False
+
+
+def deliver(connection: SmtpConnection, msg: Payload, on_done: Optional[DoneCallback] = None,
+            envelope: Envelope = None):
+    started = time.monotonic()
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            connection.send(msg, envelope)
+            error = None
+            break
+        except Exception as e:
+            if is_permanent_error(e) or attempt >= EMAIL_MAX_ATTEMPTS:
+                logger.error(f"Erreur d'envoi d'email ({attempt} tentative(s)) : {e}", exc_info=True)
+                error = str(e)
+                break
+            delay = EMAIL_RETRY_BACKOFF * 2 ** (attempt - 1)
+            logger.warning(f"Échec d'envoi d'email, nouvelle tentative dans {delay:.0f} s : {e}")
+            time.sleep(delay)
+
+    if on_done:
+        try:
+            on_done(error is None, error, attempt, time.monotonic() - started)
+        except Exception as e:
+            logger.error(f"Erreur dans le suivi d'envoi d'email : {e}", exc_info=True)
+
+
+def _worker_loop():
+    connection = SmtpConnection()
+    while True:
+        try:
+            msg, envelope, on_done = _queue.get(timeout=SMTP_IDLE_TIMEOUT)
+        except queue.Empty:
+            connection.close_if_idle()
+            continue
+        try:
+            deliver(connection, msg, on_done, envelope)
+        finally:
+            _queue.task_done()
+
+
+def _ensure_started():
+    with _start_lock:
+        _workers[:] = [worker for worker in _workers if worker.is_alive()]
+        for i in range(len(_workers), EMAIL_WORKERS):
+            worker = threading.Thread(target=_worker_loop, name=f"email-sender-{i}", daemon=True)
+            worker.start()
+            _workers.append(worker)
+
+
+def enqueue_message(msg: Payload, on_done: Optional[DoneCallback] = None, envelope: Envelope = None) -> bool:
+    _ensure_started()
+    try:
+        _queue.put((msg, envelope, on_done), timeout=EMAIL_ENQUEUE_TIMEOUT)
+        return True
+    except queue.Full:
+        # File saturée : message refusé plutôt qu'envoyé (avec ses tentatives et délais) dans
+        # la requête ; l'outbox le passe en échec et il reste disponible pour replay_emails
+        logger.error("File d'envoi d'emails pleine, message refusé.")
+        if on_done:
+            try:
+                on_done(False, "File d'envoi d'emails pleine", 0, 0.0)
+            except Exception as e:
+                logger.error(f"Erreur dans le suivi d'envoi d'email : {e}", exc_info=True)
+        return False
+
+
+def wait_for_email_queue(timeout: float) -> bool:
+    # Attente (bornée) de l'envoi des messages en file, à l'arrêt de l'application
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.05)
+    return not _queue.unfinished_tasks
@@ -0,0 +1,88 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from sqlalchemy.orm import Session
+
+from backend.models.demande_audit import Demande_Audit
+from backend.services.blob_store import file_sha256
+
+# Dossiers servis par /fichiers et permissions donnant accès à chacun (l'une suffit)
+SERVED_ROOTS = {
+    "fichiers_attaches_audit": ("demandes_creation", "demandes_validation"),
+    "fiches_demandes_audit": ("demandes_creation", "demandes_validation"),
+    "fichiers_affectations": ("affectations",),
+    "commentaires_audit": ("audits",),
+    "prestataire": ("prestataires",),
+}
+
+# Pièces d'une demande : sans la permission de validation, seul le demandeur y a accès
+DEMANDE_ROOTS = {"fichiers_attaches_audit", "fiches_demandes_audit"}
+DEMANDE_ALL_PERMISSION = "demandes_validation"
+
+FILE_ETAG_CACHE_SIZE = int(os.getenv("FILE_ETAG_CACHE_SIZE", "4096"))
+FILE_IMMUTABLE_MAX_AGE = int(os.getenv("FILE_IMMUTABLE_MAX_AGE", str(365 * 24 * 3600)))
+
+# Fichiers nommés par uuid à l'enregistrement (pièces des demandes et des audits) : jamais réécrits
+UUID_FILENAME = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}", re.IGNORECASE)
+
+_etags = OrderedDict()
+_etags_lock = threading.Lock()
+
+
+def _normalize(stored_path: str) -> str:
+    return stored_path.replace("\\", "/").lstrip("/")
+
+
+def is_demande_file_owner(db: Session, file_path: str, email) -> bool:
+    # Fiche PDF, schéma d'architecture ou pièce jointe de l'une des demandes de l'utilisateur
+    if not email:
+        return False
+    target = _normalize(file_path)
+    demandes = db.query(
+        Demande_Audit.fiche_demande_path,
+        Demande_Audit.architecture_file_path,
+        Demande_Audit.fichiers_attaches
+    ).filter(Demande_Audit.demandeur_email == email).all()
+    for fiche_path, architecture_path, fichiers_attaches in demandes:
+        paths = [fiche_path, architecture_path]
+        if isinstance(fichiers_attaches, list):
+            paths.extend(fichiers_attaches)
+        elif isinstance(fichiers_attaches, str):
+            paths.append(fichiers_attaches)
+        if any(isinstance(path, str) and _normalize(path) == target for path in paths):
+            return True
+    return False
+
+
+def content_etag(path: str, stat: os.stat_result) -> str:
+    # ETag fort = empreinte SHA-256 du contenu, calculée une fois par version du fichier
+    # (inode, taille, date) ; les liens vers un même blob partagent la même entrée
+    key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+    with _etags_lock:
+        etag = _etags.get(key)
+        if etag is not None:
+            _etags.move_to_end(key)
+            return etag
+
+    etag = f'"{file_sha256(path)}"'
+    with _etags_lock:
+        _etags[key] = etag
+        while len(_etags) > FILE_ETAG_CACHE_SIZE:
+            _etags.popitem(last=False)
+    return etag
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # Comparaison faible (If-None-Match) : le préfixe W/ est ignoré
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def cache_control(path: str) -> str:
+    if UUID_FILENAME.match(os.path.basename(path)):
+        return f"private, max-age={FILE_IMMUTABLE_MAX_AGE}, immutable"
+    # Fiches PDF régénérées et documents prestataire (nom d'origine) : revalidation par ETag
+    return "private, no-cache"
@@ -0,0 +1,74 @@
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable
+
+from log_config import setup_logger
+
+logger = setup_logger()
+
+# Instantanés des payloads du tableau de bord, servis tels quels tant qu'aucune écriture
+# n'a touché leurs tables sources et qu'ils ont moins de DASHBOARD_STALENESS_BUDGET secondes
+# (borne la fraîcheur pour les écritures hors API ou faites par un autre worker)
+DASHBOARD_STALENESS_BUDGET = float(os.getenv("DASHBOARD_STALENESS_BUDGET", "300"))
+
+SNAPSHOT_SOURCES = {
+    "kpis": ("audits", "affectations", "auditeurs", "prestataires"),
+    "affect_prestataires": ("affectations", "prestataires"),
+    "prestataires_kpi": ("prestataires",),
+}
+
+_tag_versions = {}
+_snapshots = {}
+_locks = {name: threading.Lock() for name in SNAPSHOT_SOURCES}
+_versions_lock = threading.Lock()
+
+
+def invalidate_kpis(*tables: str):
+    # Appelé par les chemins d'écriture après commit : les instantanés concernés
+    # seront recalculés à la prochaine lecture
+    with _versions_lock:
+        for table in tables:
+            _tag_versions[table] = _tag_versions.get(table, 0) + 1
+
+
+def _source_versions(name: str) -> tuple:
+    with _versions_lock:
+        return tuple(_tag_versions.get(table, 0) for table in SNAPSHOT_SOURCES[name])
+
+
+def _is_fresh(snapshot, versions: tuple) -> bool:
+    return (
+        snapshot is not None
+        and snapshot["versions"] == versions
+        and time.monotonic() - snapshot["computed_at"] < DASHBOARD_STALENESS_BUDGET
+    )
+
+
+def get_snapshot(name: str, compute: Callable[[], object]) -> dict:
+    snapshot = _snapshots.get(name)
+    if _is_fresh(snapshot, _source_versions(name)):
+        return snapshot
+
+    with _locks[name]:
+        # Versions relevées avant le calcul : une écriture concurrente invalidera le résultat
+        versions = _source_versions(name)
+        snapshot = _snapshots.get(name)
+        if _is_fresh(snapshot, versions):
+            return snapshot
+
+        started = time.monotonic()
+        snapshot = {
+            "payload": compute(),
+            "versions": versions,
+            "computed_at": time.monotonic(),
+            "generated_at": datetime.utcnow(),
+        }
+        _snapshots[name] = snapshot
+        logger.debug(f"Instantané KPI '{name}' recalculé en {(time.monotonic() - started) * 1000:.1f} ms")
+        return snapshot
+
+
+def clear_snapshots():
+    _snapshots.clear()
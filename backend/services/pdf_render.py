@@ -0,0 +1,245 @@
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from typing import Callable, Optional, NamedTuple, List
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, Template
+from weasyprint import HTML, CSS
+from weasyprint.text.fonts import FontConfiguration
+from weasyprint.urls import URLFetcher, URLFetcherResponse
+
+from log_config import setup_logger
+
+logger = setup_logger()
+
+# Rendu WeasyPrint (CPU, de quelques centaines de ms à plusieurs secondes) déporté dans un
+# pool de processus : la requête enregistre l'objet et répond avec un statut "pending",
+# le callback de fin de rendu renseigne le chemin du PDF
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", "2"))
+# Seuil d'alerte (logs, métrique "saturated") sur le nombre de rendus en cours
+PDF_RENDER_QUEUE_SIZE = int(os.getenv("PDF_RENDER_QUEUE_SIZE", "50"))
+
+PDF_TEMPLATE_DIR = os.getenv("PDF_TEMPLATE_DIR", "templates")
+PDF_TEMPLATE_CACHE_DIR = os.getenv("PDF_TEMPLATE_CACHE_DIR", os.path.join(tempfile.gettempdir(), "audit_pdf_templates"))
+# Feuille de style commune aux fiches, chargée une fois par processus si elle existe
+PDF_STYLESHEET = os.getenv("PDF_STYLESHEET", os.path.join(PDF_TEMPLATE_DIR, "pdf.css"))
+PDF_IMAGE_CACHE_SIZE = int(os.getenv("PDF_IMAGE_CACHE_SIZE", "256"))
+
+LOGO_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "pictures", "logo.png"))
+LOGO_URL = f"file:///{LOGO_PATH.replace(os.sep, '/')}"
+
+PDF_STATUS_PENDING = "pending"
+PDF_STATUS_READY = "ready"
+PDF_STATUS_FAILED = "failed"
+
+# on_done(chemin_du_pdf, erreur) : chemin à None et message d'erreur en cas d'échec
+DoneCallback = Callable[[Optional[str], Optional[str]], None]
+
+os.makedirs(PDF_TEMPLATE_CACHE_DIR, exist_ok=True)
+
+# Templates des fiches compilés une fois par processus (bytecode aussi conservé sur disque
+# pour les redémarrages) ; auto_reload désactivé : une modification demande un redémarrage
+pdf_template_env = Environment(
+    loader=FileSystemLoader(PDF_TEMPLATE_DIR),
+    bytecode_cache=FileSystemBytecodeCache(PDF_TEMPLATE_CACHE_DIR),
+    auto_reload=False
+)
+
+_pool: Optional[ProcessPoolExecutor] = None
+# Les callbacks (base, emails) tournent hors du thread de gestion du pool de processus
+_callback_pool: Optional[ThreadPoolExecutor] = None
+_start_lock = threading.Lock()
+
+_state = threading.Condition()
+_metrics = {
+    "in_flight": 0,
+    "submitted": 0,
+    "completed": 0,
+    "failed": 0,
+    "saturated": 0,
+    "render_seconds": 0.0,
+}
+
+
+def get_pdf_template(name: str) -> Template:
+    return pdf_template_env.get_template(name)
+
+
+@lru_cache(maxsize=1)
+def get_logo_bytes() -> bytes:
+    with open(LOGO_PATH, "rb") as logo_file:
+        return logo_file.read()
+
+
+class InMemoryUrlFetcher(URLFetcher):
+    # Logo servi depuis la mémoire, les autres URLs passent par le fetcher par défaut
+    def fetch(self, url, headers=None):
+        if url == LOGO_URL:
+            return URLFetcherResponse(url, get_logo_bytes(), {"Content-Type": "image/png"})
+        return super().fetch(url, headers)
+
+
+class RenderContext(NamedTuple):
+    font_config: FontConfiguration
+    stylesheets: List[CSS]
+    url_fetcher: InMemoryUrlFetcher
+    image_cache: dict
+
+
+_render_context: Optional[RenderContext] = None
+
+
+def get_render_context() -> RenderContext:
+    # Contexte WeasyPrint propre à chaque processus (polices, CSS, logo, images décodées),
+    # créé au démarrage des processus du pool puis réutilisé pour chaque document
+    global _render_context
+    if _render_context is None:
+        font_config = FontConfiguration()
+        stylesheets = []
+        if os.path.exists(PDF_STYLESHEET):
+            stylesheets.append(CSS(filename=PDF_STYLESHEET, font_config=font_config))
+        _render_context = RenderContext(font_config, stylesheets, InMemoryUrlFetcher(), {})
+    return _render_context
+
+
+def render_pdf_file(html_content: str, pdf_path: str) -> float:
+    # Exécuté dans un processus du pool : seuls le HTML et le chemin y sont transmis
+    started = time.perf_counter()
+    context = get_render_context()
+    if len(context.image_cache) > PDF_IMAGE_CACHE_SIZE:
+        context.image_cache.clear()
+    HTML(string=html_content, url_fetcher=context.url_fetcher).write_pdf(
+        pdf_path,
+        font_config=context.font_config,
+        stylesheets=context.stylesheets,
+        cache=context.image_cache
+    )
+    return time.perf_counter() - started
+
+
+def _ensure_started() -> ProcessPoolExecutor:
+    global _pool, _callback_pool
+    with _start_lock:
+        if _pool is None:
+            # spawn : le processus parent a déjà des threads (callbacks, emails, outbox), un fork
+            # pourrait copier un verrou détenu par l'un d'eux
+            _pool = ProcessPoolExecutor(
+                max_workers=PDF_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=get_render_context
+            )
+        if _callback_pool is None:
+            _callback_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf-render-callback")
+        return _pool
+
+
+def _reset_pool():
+    # Un processus mort rend le pool inutilisable : il sera recréé à la prochaine soumission
+    global _pool
+    with _start_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False)
+        _pool = None
+
+
+def _finish(pdf_path: str, duration: Optional[float], error: Optional[str], on_done: DoneCallback):
+    with _state:
+        _metrics["in_flight"] -= 1
+        if error is None:
+            _metrics["completed"] += 1
+            _metrics["render_seconds"] += duration
+        else:
+            _metrics["failed"] += 1
+        _state.notify_all()
+
+    if error is None:
+        logger.info(f"PDF généré avec succès : {pdf_path} ({duration * 1000:.0f} ms)")
+    else:
+        logger.error(f"Échec lors de la génération du PDF {pdf_path} : {error}")
+
+    try:
+        on_done(pdf_path if error is None else None, error)
+    except Exception as e:
+        logger.error(f"Erreur dans le callback de fin de rendu PDF ({pdf_path}) : {e}", exc_info=True)
+
+
+def _complete(future, pdf_path: str, on_done: DoneCallback):
+    try:
+        duration = future.result()
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            _reset_pool()
+        _finish(pdf_path, None, str(e) or e.__class__.__name__, on_done)
+        return
+    _finish(pdf_path, duration, None, on_done)
+
+
+def submit_pdf(html_content: str, pdf_path: str, on_done: DoneCallback):
+    pool = _ensure_started()
+
+    with _state:
+        saturated = _metrics["in_flight"] >= PDF_RENDER_QUEUE_SIZE
+        _metrics["in_flight"] += 1
+        _metrics["submitted"] += 1
+        if saturated:
+            _metrics["saturated"] += 1
+
+    if saturated:
+        # File saturée : le rendu attend son tour dans le pool, jamais dans la requête
+        # (rendu, enregistrement et emails resteraient sinon à la charge de l'appelant)
+        logger.warning(f"File de rendu PDF saturée ({PDF_RENDER_QUEUE_SIZE} rendus en cours), rendu mis en attente.")
+
+    try:
+        try:
+            future = pool.submit(render_pdf_file, html_content, pdf_path)
+        except BrokenProcessPool:
+            _reset_pool()
+            future = _ensure_started().submit(render_pdf_file, html_content, pdf_path)
+    except Exception as e:
+        # Pool arrêté ou inutilisable : la place en file est libérée et l'objet passe en échec
+        # plutôt que de rester "pending"
+        _finish(pdf_path, None, f"Soumission au pool impossible : {e}", on_done)
+        return
+    future.add_done_callback(lambda f: _callback_pool.submit(_complete, f, pdf_path, on_done))
+
+
+def get_pdf_render_metrics() -> dict:
+    with _state:
+        completed = _metrics["completed"]
+        return {
+            "workers": PDF_RENDER_WORKERS,
+            "queue_size": PDF_RENDER_QUEUE_SIZE,
+            "queue_depth": _metrics["in_flight"],
+            "submitted": _metrics["submitted"],
+            "completed": completed,
+            "failed": _metrics["failed"],
+            "saturated": _metrics["saturated"],
+            "avg_render_ms": round(_metrics["render_seconds"] * 1000 / completed, 1) if completed else None,
+        }
+
+
+def wait_for_pdf_renders(timeout: float) -> bool:
+    # Attente (bornée) des rendus en cours et de leurs callbacks, à l'arrêt de l'application
+    deadline = time.monotonic() + timeout
+    with _state:
+        while _metrics["in_flight"] and time.monotonic() < deadline:
+            _state.wait(deadline - time.monotonic())
+        return not _metrics["in_flight"]
+
+
+def shutdown_pdf_renders():
+    # Arrêt de l'application, après wait_for_pdf_renders : les rendus encore en file sont
+    # annulés (leur objet passe en échec via le callback), puis processus et thread libérés
+    global _pool, _callback_pool
+    with _start_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True, cancel_futures=True)
+            _pool = None
+        if _callback_pool is not None:
+            _callback_pool.shutdown(wait=True)
+            _callback_pool = None
@@ -1,22 +1,32 @@
+import base64
+import hashlib
 import os
+import re
+import threading
+import time
 from copy import copy
 from datetime import datetime, date
 from io import BytesIO
+from tempfile import SpooledTemporaryFile
 from typing import Optional, List
 
 import numpy as np
 import pandas as pd
 from bs4 import BeautifulSoup
-from fastapi import HTTPException, UploadFile
+from fastapi import HTTPException
 from openpyxl.styles import PatternFill
-from sqlalchemy import extract, func
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import extract, func, false, or_, and_
+from sqlalchemy.orm import Session, joinedload, selectinload
 from backend.models.plan import Plan
 from backend.models.vulnerability import Vulnerability
 from backend.schemas.plan import PlanUpdate, VulnerabilitySummary, PlanResponse
+from backend.services.plan_search import index_plans, index_plan
+from backend.services.kpi_snapshot import invalidate_kpis
+from backend.services.rollup import record_plans_realises
 
-from collections import defaultdict, Counter
+from collections import defaultdict, Counter, OrderedDict
 from openpyxl import load_workbook, Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.utils.dataframe import dataframe_to_rows
 
 from openpyxl.drawing.image import Image as XLImage
@@ -28,114 +38,227 @@ from log_config import setup_logger
 
 logger = setup_logger()
 
-def generate_plan_ref(session: Session, date_realisation: date) -> str:
-    year = date_realisation.year
-    total_existing = session.query(func.count()).filter(
-        func.extract('year', Plan.date_realisation) == year
-    ).scalar() or 0
+IMPORT_CHUNK_SIZE = 500
 
-    letter_index = total_existing // 99
+def format_plan_ref(year: int, index: int) -> str:
+    # index = nombre de plans déjà existants pour l'année
+    letter_index = index // 99
     if letter_index >= 26:
         raise ValueError("Trop de plans pour l'année !")
 
     letter = chr(ord('A') + letter_index)
-    number = (total_existing % 99) + 1
+    number = (index % 99) + 1
     return f"{year}_{letter}_{number:02d}"
 
-async def process_uploaded_plan(file: UploadFile, db: Session):
-    if not file.filename.endswith((".xls", ".xlsx")):
-        raise HTTPException(status_code=400, detail="Format de fichier non supporté.")
+def generate_plan_ref(session: Session, date_realisation: date) -> str:
+    year = date_realisation.year
+    total_existing = session.query(func.count(Plan.id)).filter(
+        *date_period_conditions(Plan.date_realisation, year, None)
+    ).scalar() or 0
 
-    try:
-        contents = await file.read()
-        df = pd.read_excel(BytesIO(contents))
-        df.replace({np.nan: None}, inplace=True)
-
-        required_columns = {
-            "ref", "application", "type_application", "type_audit",
-            "date_realisation", "date_cloture", "date_rapport",
-            "nb_vulnerabilites", "niveau_securite", "commentaire_dcsg",
-            "commentaire_cp", "taux_remediation",
-            "titre", "criticite", "pourcentage_remediation", "statut_remediation", "actions"
-        }
-
-        if not required_columns.issubset(df.columns):
-            raise HTTPException(status_code=400, detail=f"Colonnes manquantes : {required_columns - set(df.columns)}")
-
-        # Nettoyage
-        df = df.dropna(subset=['ref', 'date_realisation'])
-
-        grouped = defaultdict(list)
-        for index, row in df.iterrows():
-            grouped[row["ref"]].append(row.to_dict())
-
-        for ref, rows in grouped.items():
-            first_row = rows[0]
-            try:
-                date_realisation = pd.to_datetime(first_row["date_realisation"], dayfirst=True, errors="coerce")
-                if pd.isnull(date_realisation):
-                    raise ValueError("Date de réalisation invalide.")
-
-                plan_ref = generate_plan_ref(db, date_realisation)
-
-                plan = Plan(
-                    ref=plan_ref,
-                    application=first_row["application"],
-                    type_application=first_row["type_application"],
-                    type_audit=first_row["type_audit"],
-                    date_realisation=date_realisation,
-                    date_cloture=pd.to_datetime(first_row.get("date_cloture")) if first_row.get("date_cloture") else None,
-                    date_rapport=pd.to_datetime(first_row.get("date_rapport")) if first_row.get("date_rapport") else None,
-                    niveau_securite=first_row.get("niveau_securite"),
-                    taux_remediation=first_row.get("taux_remediation"),
-                    commentaire_dcsg=first_row.get("commentaire_dcsg"),
-                    commentaire_cp=first_row.get("commentaire_cp")
-                )
+    return format_plan_ref(year, total_existing)
 
-                db.add(plan)
-                db.flush()
-                db.refresh(plan)
-
-                for row in rows:
-                    vuln = Vulnerability(
-                        plan_id=plan.id,
-                        titre=row.get("titre"),
-                        criticite=row.get("criticite"),
-                        pourcentage_remediation=row.get("pourcentage_remediation"),
-                        statut_remediation=row.get("statut_remediation"),
-                        actions=row.get("actions")
-                    )
-                    db.add(vuln)
-
-                db.flush()
-                vulnerabilites = db.query(Vulnerability).filter_by(plan_id=plan.id).all()
-                summary = compute_vulnerability_summary(vulnerabilites)
-                plan.nb_vulnerabilites = VulnerabilitySummary(**compute_vulnerability_summary(vulnerabilites)).dict()
-                plan.taux_remediation = compute_taux_remediation(vulnerabilites)
-
-                db.commit()
+def count_plans_by_year(session: Session, years) -> dict:
+    # Une seule requête pour toutes les années de l'import (réservation des blocs de refs)
+    years = list(years)
+    if not years:
+        return {}
 
-            except Exception as e:
-                logger.error(f"Erreur insertion vulnérabilité pour ref {ref} : {e}")
-                db.rollback()
+    year_column = func.extract('year', Plan.date_realisation)
+    counts = (
+        session.query(year_column, func.count(Plan.id))
+        .filter(Plan.date_realisation >= date(min(years), 1, 1), Plan.date_realisation < date(max(years) + 1, 1, 1))
+        .group_by(year_column)
+        .all()
+    )
+    existing = {int(year): count for year, count in counts}
+    return {year: existing.get(year, 0) for year in years}
+
+def parse_optional_date(value):
+    return pd.to_datetime(value).date() if value else None
+
+def build_plan_mappings(df: pd.DataFrame):
+    # Première ligne de chaque ref = données du plan, toutes les lignes = vulnérabilités
+    first_rows = df.drop_duplicates(subset="ref", keep="first")
+    sizes = df.groupby("ref", sort=False).size()
+
+    criticite_counts = pd.crosstab(df["ref"], df["criticite"])
+    pourcentages = pd.to_numeric(df["pourcentage_remediation"], errors="coerce")
+    invalid_pourcentages = df["pourcentage_remediation"].notna() & pourcentages.isna()
+    refs_invalides = set(df.loc[invalid_pourcentages, "ref"])
+    taux = pourcentages.groupby(df["ref"], sort=False).mean()
+
+    def count_criticite(ref, criticite):
+        if criticite not in criticite_counts.columns or ref not in criticite_counts.index:
+            return 0
+        return int(criticite_counts.at[ref, criticite])
+
+    plans = []
+    errors = []
+    for first_row in first_rows.to_dict("records"):
+        ref = first_row["ref"]
+        try:
+            date_realisation = pd.to_datetime(first_row["date_realisation"], dayfirst=True, errors="coerce")
+            if pd.isnull(date_realisation):
+                raise ValueError("Date de réalisation invalide.")
+            if ref in refs_invalides:
+                raise ValueError("Pourcentage de remédiation invalide.")
+
+            taux_remediation = taux.get(ref)
+            plans.append({
+                "source_ref": ref,
+                "application": first_row["application"],
+                "type_application": first_row["type_application"],
+                "type_audit": first_row["type_audit"],
+                "date_realisation": date_realisation.date(),
+                "date_cloture": parse_optional_date(first_row.get("date_cloture")),
+                "date_rapport": parse_optional_date(first_row.get("date_rapport")),
+                "niveau_securite": first_row.get("niveau_securite"),
+                "commentaire_dcsg": first_row.get("commentaire_dcsg"),
+                "commentaire_cp": first_row.get("commentaire_cp"),
+                "nb_vulnerabilites": VulnerabilitySummary(
+                    critique=count_criticite(ref, "critique"),
+                    majeure=count_criticite(ref, "majeure"),
+                    moderee=count_criticite(ref, "moderee"),
+                    mineure=count_criticite(ref, "mineure"),
+                    total=int(sizes[ref])
+                ).dict(),
+                "taux_remediation": 0.0 if pd.isnull(taux_remediation) else round(float(taux_remediation), 2),
+            })
+        except Exception as e:
+            logger.error(f"Erreur de validation pour ref {ref} : {e}")
+            errors.append({"ref": str(ref), "erreur": str(e)})
 
-        logger.info("Plans et vulnérabilités insérés avec succès.")
-        return {"message": "Importation réussie"}
+    vuln_columns = ["titre", "criticite", "pourcentage_remediation", "statut_remediation", "actions"]
+    vulnerabilites = defaultdict(list)
+    for ref, vuln in zip(df["ref"], df[vuln_columns].to_dict("records")):
+        vulnerabilites[ref].append(vuln)
 
-    except Exception as e:
-        error_message = str(e.orig) if hasattr(e, 'orig') else str(e)
-        logger.error(f"Erreur lors du traitement du fichier : {error_message}")
-        raise HTTPException(status_code=500, detail="Erreur de traitement du fichier.")
+    return plans, vulnerabilites, errors
 
-def export_plans_to_excel(
-    db: Session,
+def insert_plans_chunk(db: Session, plans: List[dict], vulnerabilites: dict, next_index: dict):
+    # Insertion groupée : plans puis vulnérabilités en executemany, un seul commit par lot
+    plan_mappings = []
+    for plan in plans:
+        year = plan["date_realisation"].year
+        plan_ref = format_plan_ref(year, next_index[year])
+        next_index[year] += 1
+        plan_mappings.append({
+            "ref": plan_ref,
+            **{key: value for key, value in plan.items() if key != "source_ref"}
+        })
+
+    db.bulk_insert_mappings(Plan, plan_mappings)
+
+    refs = [mapping["ref"] for mapping in plan_mappings]
+    ids_by_ref = dict(db.query(Plan.ref, Plan.id).filter(Plan.ref.in_(refs)).all())
+
+    vuln_mappings = [
+        {"plan_id": ids_by_ref[mapping["ref"]], **vuln}
+        for plan, mapping in zip(plans, plan_mappings)
+        for vuln in vulnerabilites[plan["source_ref"]]
+    ]
+    if vuln_mappings:
+        db.bulk_insert_mappings(Vulnerability, vuln_mappings)
+
+    index_plans(db, [
+        (ids_by_ref[mapping["ref"]], mapping["ref"], mapping.get("application"))
+        for mapping in plan_mappings
+    ])
+    record_plans_realises(db, [mapping["date_realisation"] for mapping in plan_mappings])
+
+    db.commit()
+
+PLAN_REQUIRED_COLUMNS = {
+    "ref", "application", "type_application", "type_audit",
+    "date_realisation", "date_cloture", "date_rapport",
+    "nb_vulnerabilites", "niveau_securite", "commentaire_dcsg",
+    "commentaire_cp", "taux_remediation",
+    "titre", "criticite", "pourcentage_remediation", "statut_remediation", "actions"
+}
+
+def parse_plan_workbook(contents: bytes):
+    # Partie CPU de l'import (lecture pandas), exécutable dans un processus séparé
+    df = pd.read_excel(BytesIO(contents))
+    df.replace({np.nan: None}, inplace=True)
+
+    if not PLAN_REQUIRED_COLUMNS.issubset(df.columns):
+        raise ValueError(f"Colonnes manquantes : {PLAN_REQUIRED_COLUMNS - set(df.columns)}")
+
+    # Nettoyage
+    df = df.dropna(subset=['ref', 'date_realisation'])
+
+    plans, vulnerabilites, errors = build_plan_mappings(df)
+    return len(df), plans, vulnerabilites, errors
+
+def insert_plans(db: Session, plans: List[dict], vulnerabilites: dict, errors: List[dict], on_progress=None) -> int:
+    # Réservation des refs : un compteur par année, initialisé par une seule requête
+    next_index = count_plans_by_year(db, {plan["date_realisation"].year for plan in plans})
+
+    inserted = 0
+    for start in range(0, len(plans), IMPORT_CHUNK_SIZE):
+        chunk = plans[start:start + IMPORT_CHUNK_SIZE]
+        chunk_index = dict(next_index)
+        try:
+            insert_plans_chunk(db, chunk, vulnerabilites, next_index)
+            inserted += len(chunk)
+            if on_progress:
+                on_progress(inserted)
+            continue
+        except Exception as e:
+            logger.warning(f"Échec de l'insertion groupée, reprise plan par plan : {e}")
+            db.rollback()
+            next_index.clear()
+            next_index.update(chunk_index)
+
+        # Reprise plan par plan pour isoler les refs en erreur
+        for plan in chunk:
+            year = plan["date_realisation"].year
+            index_before = next_index[year]
+            try:
+                insert_plans_chunk(db, [plan], vulnerabilites, next_index)
+                inserted += 1
+            except Exception as e:
+                db.rollback()
+                next_index[year] = index_before
+                error_message = str(e.orig) if hasattr(e, 'orig') else str(e)
+                logger.error(f"Erreur insertion vulnérabilité pour ref {plan['source_ref']} : {error_message}")
+                errors.append({"ref": str(plan["source_ref"]), "erreur": error_message})
+        if on_progress:
+            on_progress(inserted)
+
+    if inserted:
+        invalidate_plan_count_cache()
+        invalidate_kpis("plans")
+    logger.info(f"{inserted} plan(s) et vulnérabilités insérés, {len(errors)} ref(s) en erreur.")
+    return inserted
+
+def date_period_conditions(column, year: Optional[int], month: Optional[int]) -> list:
+    # Intervalles semi-ouverts [début, fin) plutôt que extract() : le prédicat reste indexable
+    if year and month:
+        if not 1 <= month <= 12:
+            return [false()]
+        start = date(year, month, 1)
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        return [column >= start, column < end]
+    if year:
+        return [column >= date(year, 1, 1), column < date(year + 1, 1, 1)]
+    if month:
+        # Mois sans année : pas d'intervalle unique possible
+        return [extract('month', column) == month]
+    return []
+
+def apply_plan_filters(
+    query,
     ref: Optional[str] = None,
     application: Optional[str] = None,
     type_audit: Optional[str] = None,
     niveau_securite: Optional[str] = None,
+    # Filtres exacts
     date_realisation: Optional[str] = None,
     date_cloture: Optional[str] = None,
     date_rapport: Optional[str] = None,
+    # Filtres par année/mois
     realisation_year: Optional[int] = None,
     realisation_month: Optional[int] = None,
     cloture_year: Optional[int] = None,
@@ -143,9 +266,7 @@ def export_plans_to_excel(
     rapport_year: Optional[int] = None,
     rapport_month: Optional[int] = None,
 ):
-    query = db.query(Plan).options(joinedload(Plan.vulnerabilites))
-
-    # Filtres
+    # Filtres textuels
     if ref:
         query = query.filter(Plan.ref.ilike(f"%{ref}%"))
     if application:
@@ -154,160 +275,260 @@ def export_plans_to_excel(
         query = query.filter(Plan.type_audit == type_audit)
     if niveau_securite:
         query = query.filter(Plan.niveau_securite == niveau_securite)
+
+    # Filtres exacts sur les dates
     if date_realisation:
         query = query.filter(Plan.date_realisation == date_realisation)
     if date_cloture:
         query = query.filter(Plan.date_cloture == date_cloture)
     if date_rapport:
         query = query.filter(Plan.date_rapport == date_rapport)
-    if realisation_year:
-        query = query.filter(extract('year', Plan.date_realisation) == realisation_year)
-    if realisation_month:
-        query = query.filter(extract('month', Plan.date_realisation) == realisation_month)
-    if cloture_year:
-        query = query.filter(extract('year', Plan.date_cloture) == cloture_year)
-    if cloture_month:
-        query = query.filter(extract('month', Plan.date_cloture) == cloture_month)
-    if rapport_year:
-        query = query.filter(extract('year', Plan.date_rapport) == rapport_year)
-    if rapport_month:
-        query = query.filter(extract('month', Plan.date_rapport) == rapport_month)
-
-    plans = query.all()
-    if not plans:
-        return None
 
-    # Construction des données
-    combined_data = []
-    for plan in plans:
-        if plan.vulnerabilites:
-            for vuln in plan.vulnerabilites:
-                combined_data.append({
-                    "Réf": plan.ref,
-                    "Application/Solution": plan.application,
-                    "Type d'application": plan.type_application,
-                    "Type d'audit": plan.type_audit,
-                    "Date de realisation de la mission": plan.date_realisation,
-                    "Date de cloture de la mission": plan.date_cloture,
-                    "Date de communication du rapport": plan.date_rapport,
-                    "Niveau de securité": plan.niveau_securite,
-                    "Nombre de vulnérabilités": format_vulnerabilites(plan.nb_vulnerabilites),
-                    "Commentaire DCSG": clean_html(plan.commentaire_dcsg),
-                    "Commentaire CP": clean_html(plan.commentaire_cp),
-                    "Titre vulnérabilité": vuln.titre,
-                    "Criticité": vuln.criticite,
-                    "Pourcentage de remédiation": vuln.pourcentage_remediation,
-                    "Statut de remédiation": vuln.statut_remediation,
-                    "Actions": vuln.actions
-                })
-        else:
-            combined_data.append({
-                "Réf": plan.ref,
-                "Application/Solution": plan.application,
-                "Type d'application": plan.type_application,
-                "Type d'audit": plan.type_audit,
-                "Date de realisation de la mission": plan.date_realisation,
-                "Date de cloture de la mission": plan.date_cloture,
-                "Date de communication du rapport": plan.date_rapport,
-                "Niveau de securité": plan.niveau_securite,
-                "Nombre de vulnérabilités": plan.nb_vulnerabilites,
-                "Commentaire DCSG": plan.commentaire_dcsg,
-                "Commentaire CP": plan.commentaire_cp,
-                "Titre vulnérabilité": "",
-                "Criticité": "",
-                "Pourcentage de remédiation": "",
-                "Statut de remédiation": "",
-                "Actions": ""
-            })
+    # Filtres par année/mois
+    conditions = (
+        date_period_conditions(Plan.date_realisation, realisation_year, realisation_month)
+        + date_period_conditions(Plan.date_cloture, cloture_year, cloture_month)
+        + date_period_conditions(Plan.date_rapport, rapport_year, rapport_month)
+    )
+    if conditions:
+        query = query.filter(*conditions)
+
+    return query
+
+PLAN_PAGE_DEFAULT_SIZE = int(os.getenv("PLAN_PAGE_DEFAULT_SIZE", "50"))
+PLAN_PAGE_MAX_SIZE = int(os.getenv("PLAN_PAGE_MAX_SIZE", "500"))
+PLAN_COUNT_CACHE_TTL = float(os.getenv("PLAN_COUNT_CACHE_TTL", "30"))
+
+_plan_count_cache = {}
+_plan_count_lock = threading.Lock()
 
-    # Chemin vers le modèle de la page de garde
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    cover_path = os.path.join(current_dir, '..', '..', 'Page_de_garde.xlsx')
+EXPORT_BATCH_SIZE = 1000
+EXPORT_STREAM_CHUNK_SIZE = 64 * 1024
+EXPORT_SPOOL_MAX_SIZE = 10 * 1024 * 1024
 
+PLAN_EXPORT_HEADERS = [
+    "Réf", "Application/Solution", "Type d'application", "Type d'audit",
+    "Date de realisation de la mission", "Date de cloture de la mission", "Date de communication du rapport",
+    "Niveau de securité", "Nombre de vulnérabilités", "Commentaire DCSG", "Commentaire CP",
+    "Titre vulnérabilité", "Criticité", "Pourcentage de remédiation", "Statut de remédiation", "Actions"
+]
+
+CRITICITE_COLOR_MAP = {
+    "mineure": PatternFill(start_color="A9D08E", end_color="A9D08E", fill_type="solid"),
+    "moderee": PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid"),
+    "majeure": PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid"),
+    "critique": PatternFill(start_color="C00000", end_color="C00000", fill_type="solid"),
+}
+
+EXPORT_ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+COVER_PATH = os.path.join(EXPORT_ASSETS_DIR, 'Page_de_garde.xlsx')
+COVER_LOGO_PATH = os.path.join(EXPORT_ASSETS_DIR, 'pictures', 'logo.png')
+
+# Page de garde préparée une seule fois, reconstruite seulement si le modèle ou le logo change
+_cover_cache = {"key": None, "cover": None}
+_cover_lock = threading.Lock()
+
+def _file_mtime(path: str) -> Optional[float]:
+    return os.path.getmtime(path) if os.path.exists(path) else None
+
+def build_cover_template() -> dict:
     # Charger la page de garde existante
-    cover_wb = load_workbook(cover_path)
+    cover_wb = load_workbook(COVER_PATH)
     cover_ws = cover_wb.active
 
-    # Nouveau fichier final
-    final_wb = Workbook()
-    final_wb.remove(final_wb.active)
+    # Valeurs et styles copiés une fois pour toutes (objets de style réutilisés à chaque export)
+    rows = []
+    for row in cover_ws.iter_rows():
+        cells = []
+        for cell in row:
+            style = None
+            if cell.has_style:
+                style = (
+                    copy(cell.font), copy(cell.border), copy(cell.fill),
+                    copy(cell.number_format), copy(cell.protection), copy(cell.alignment)
+                )
+            cells.append((cell.value, style))
+        rows.append(cells)
 
-    CRITICITE_COLOR_MAP = {
-        "mineure": PatternFill(start_color="A9D08E", end_color="A9D08E", fill_type="solid"),
-        "moderee": PatternFill(start_color="FFFF00", end_color="FFFF00", fill_type="solid"),
-        "majeure": PatternFill(start_color="FFC000", end_color="FFC000", fill_type="solid"),
-        "critique": PatternFill(start_color="C00000", end_color="C00000", fill_type="solid"),
+    logo = None
+    if os.path.exists(COVER_LOGO_PATH):
+        with open(COVER_LOGO_PATH, "rb") as f:
+            logo = f.read()
+
+    return {
+        "rows": rows,
+        "widths": {col_letter: dim.width for col_letter, dim in cover_ws.column_dimensions.items()},
+        "merges": [str(merged_cell) for merged_cell in cover_ws.merged_cells.ranges],
+        "logo": logo,
     }
 
-    # Copier chaque cellule avec son style
+def get_cover_template() -> dict:
+    key = (_file_mtime(COVER_PATH), _file_mtime(COVER_LOGO_PATH))
+    with _cover_lock:
+        if _cover_cache["key"] != key:
+            logger.info("Préparation de la page de garde des exports de plans")
+            _cover_cache["cover"] = build_cover_template()
+            _cover_cache["key"] = key
+        return _cover_cache["cover"]
+
+def write_cover_sheet(final_wb: Workbook):
+    cover = get_cover_template()
     new_cover_ws = final_wb.create_sheet("Page de garde")
-    for row in cover_ws.iter_rows():
-        for cell in row:
-            new_cell = new_cover_ws.cell(row=cell.row, column=cell.column, value=cell.value)
-            if cell.has_style:
-                new_cell.font = copy(cell.font)
-                new_cell.border = copy(cell.border)
-                new_cell.fill = copy(cell.fill)
-                new_cell.number_format = copy(cell.number_format)
-                new_cell.protection = copy(cell.protection)
-                new_cell.alignment = copy(cell.alignment)
 
-    # Gérer la largeur des colonnes
-    for col_letter, dim in cover_ws.column_dimensions.items():
-        new_cover_ws.column_dimensions[col_letter].width = dim.width
+    # Gérer la largeur des colonnes (à définir avant l'écriture des lignes en mode write-only)
+    for col_letter, width in cover["widths"].items():
+        new_cover_ws.column_dimensions[col_letter].width = width
+
+    # Recopier chaque cellule avec son style pré-calculé, ligne par ligne
+    for row in cover["rows"]:
+        new_row = []
+        for value, style in row:
+            new_cell = WriteOnlyCell(new_cover_ws, value=value)
+            if style:
+                (new_cell.font, new_cell.border, new_cell.fill,
+                 new_cell.number_format, new_cell.protection, new_cell.alignment) = style
+            new_row.append(new_cell)
+        new_cover_ws.append(new_row)
 
     # Gérer les fusions
-    for merged_cell in cover_ws.merged_cells.ranges:
-        new_cover_ws.merge_cells(str(merged_cell))
+    for merged_cell in cover["merges"]:
+        new_cover_ws.merged_cells.add(merged_cell)
 
     # Ajouter une image à la page de garde (entre C18 et F24)
-    image_path = os.path.join(current_dir, '..', '..', 'pictures', 'logo.png')
-    if os.path.exists(image_path):
-        img = XLImage(image_path)
+    if cover["logo"]:
+        img = XLImage(BytesIO(cover["logo"]))
 
         img.width = 64 * 4  # ≈ 256 pixels
         img.height = 20 * 7  # ≈ 140 pixels
 
         new_cover_ws.add_image(img, 'C18')  # Position d’ancrage
 
+def iter_batches(rows, size: int):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def write_plan_export_row(plans_ws, row, comment_dcsg: str, comment_cp: str):
+    (_, plan_ref, plan_application, plan_type_application, plan_type_audit,
+     plan_date_realisation, plan_date_cloture, plan_date_rapport,
+     plan_niveau_securite, plan_nb_vulnerabilites, _, _,
+     titre, criticite, pourcentage_remediation, statut_remediation, actions) = row
+
+    # Appliquer le style de couleur selon la criticité au moment de l'écriture
+    criticite_cell = WriteOnlyCell(plans_ws, value=criticite if criticite is not None else "")
+    criticite_value = str(criticite).strip().lower() if criticite else ""
+    if criticite_value in CRITICITE_COLOR_MAP:
+        criticite_cell.fill = CRITICITE_COLOR_MAP[criticite_value]
+
+    plans_ws.append([
+        plan_ref,
+        plan_application,
+        plan_type_application,
+        plan_type_audit,
+        plan_date_realisation,
+        plan_date_cloture,
+        plan_date_rapport,
+        plan_niveau_securite,
+        format_vulnerabilites(plan_nb_vulnerabilites),
+        comment_dcsg,
+        comment_cp,
+        titre if titre is not None else "",
+        criticite_cell,
+        pourcentage_remediation if pourcentage_remediation is not None else "",
+        statut_remediation if statut_remediation is not None else "",
+        actions if actions is not None else ""
+    ])
+
+def export_plans_to_excel(
+    db: Session,
+    ref: Optional[str] = None,
+    application: Optional[str] = None,
+    type_audit: Optional[str] = None,
+    niveau_securite: Optional[str] = None,
+    date_realisation: Optional[str] = None,
+    date_cloture: Optional[str] = None,
+    date_rapport: Optional[str] = None,
+    realisation_year: Optional[int] = None,
+    realisation_month: Optional[int] = None,
+    cloture_year: Optional[int] = None,
+    cloture_month: Optional[int] = None,
+    rapport_year: Optional[int] = None,
+    rapport_month: Optional[int] = None,
+):
+    # Une ligne par vulnérabilité (ou par plan sans vulnérabilité), lue par lots
+    query = (
+        db.query(
+            Plan.id, Plan.ref, Plan.application, Plan.type_application, Plan.type_audit,
+            Plan.date_realisation, Plan.date_cloture, Plan.date_rapport,
+            Plan.niveau_securite, Plan.nb_vulnerabilites, Plan.commentaire_dcsg, Plan.commentaire_cp,
+            Vulnerability.titre, Vulnerability.criticite, Vulnerability.pourcentage_remediation,
+            Vulnerability.statut_remediation, Vulnerability.actions
+        )
+        .outerjoin(Vulnerability, Vulnerability.plan_id == Plan.id)
+    )
+
+    query = apply_plan_filters(
+        query, ref, application, type_audit, niveau_securite, date_realisation, date_cloture, date_rapport,
+        realisation_year, realisation_month, cloture_year, cloture_month, rapport_year, rapport_month
+    )
+
+    rows = query.order_by(Plan.id, Vulnerability.id).yield_per(EXPORT_BATCH_SIZE)
+
+    # Nouveau fichier final, en mode écriture seule (les lignes ne restent pas en mémoire)
+    final_wb = Workbook(write_only=True)
+    write_cover_sheet(final_wb)
+
     # Ajouter les données "Plans"
     plans_ws = final_wb.create_sheet("Plans")
-    df = pd.DataFrame(combined_data)
-
-    for r in dataframe_to_rows(df, index=False, header=True):
-        plans_ws.append(r)
 
     # Appliquer une mise en forme à la première ligne (en-tête)
     header_fill = PatternFill(start_color="70AD47", end_color="70AD47", fill_type="solid")
     header_font = Font(bold=True)
     header_alignment = Alignment(horizontal="center", vertical="center", wrap_text=True)
 
-    for cell in plans_ws[1]:  # Ligne 1 = en-tête
+    header_row = []
+    for header in PLAN_EXPORT_HEADERS:
+        cell = WriteOnlyCell(plans_ws, value=header)
         cell.fill = header_fill
         cell.font = header_font
         cell.alignment = header_alignment
+        header_row.append(cell)
+    plans_ws.append(header_row)
 
-    # Appliquer le style de couleur selon la criticité
-    criticite_column_index = None
-    for idx, cell in enumerate(plans_ws[1], start=1):
-        if cell.value == "Criticité":
-            criticite_column_index = idx
-            break
+    nb_rows = 0
+    for batch in iter_batches(rows, EXPORT_BATCH_SIZE):
+        # Colonnes de commentaires nettoyées en un lot par paquet de lignes
+        comments_dcsg = clean_html_column([row.id for row in batch], [row.commentaire_dcsg for row in batch])
+        comments_cp = clean_html_column([row.id for row in batch], [row.commentaire_cp for row in batch])
+
+        for row, comment_dcsg, comment_cp in zip(batch, comments_dcsg, comments_cp):
+            nb_rows += 1
+            write_plan_export_row(plans_ws, row, comment_dcsg, comment_cp)
+
+    if not nb_rows:
+        return None
 
-    if criticite_column_index:
-        for row in plans_ws.iter_rows(min_row=2, min_col=criticite_column_index, max_col=criticite_column_index):
-            for cell in row:
-                criticite_value = str(cell.value).strip().lower() if cell.value else ""
-                if criticite_value in CRITICITE_COLOR_MAP:
-                    cell.fill = CRITICITE_COLOR_MAP[criticite_value]
+    # Le classeur est écrit dans un fichier temporaire (en mémoire tant qu'il reste petit)
+    stream = SpooledTemporaryFile(max_size=EXPORT_SPOOL_MAX_SIZE)
+    final_wb.save(stream)
+    stream.seek(0)
 
-    # Sauvegarde
-    EXPORT_DIR = os.path.join(current_dir, '..', '..', 'exports_plan')
-    os.makedirs(EXPORT_DIR, exist_ok=True)
-    file_path = os.path.join(EXPORT_DIR, f"plans_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
-    final_wb.save(file_path)
+    return stream
 
-    return file_path
+def iter_export_file(stream, chunk_size: int = EXPORT_STREAM_CHUNK_SIZE):
+    try:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        stream.close()
 
 def get_filtered_plans(
     db: Session,
@@ -326,44 +547,82 @@ def get_filtered_plans(
     cloture_month: Optional[int] = None,
     rapport_year: Optional[int] = None,
     rapport_month: Optional[int] = None,
+    include_vulnerabilities: bool = True,
 ):
-    query = db.query(Plan).options(joinedload(Plan.vulnerabilites))
-
-    # Filtres textuels
-    if ref:
-        query = query.filter(Plan.ref.ilike(f"%{ref}%"))
-    if application:
-        query = query.filter(Plan.application.ilike(f"%{application}%"))
-    if type_audit:
-        query = query.filter(Plan.type_audit == type_audit)
-    if niveau_securite:
-        query = query.filter(Plan.niveau_securite == niveau_securite)
-
-    # Filtres exacts sur les dates
-    if date_realisation:
-        query = query.filter(Plan.date_realisation == date_realisation)
-    if date_cloture:
-        query = query.filter(Plan.date_cloture == date_cloture)
-    if date_rapport:
-        query = query.filter(Plan.date_rapport == date_rapport)
+    query = db.query(Plan)
+    if include_vulnerabilities:
+        query = query.options(joinedload(Plan.vulnerabilites))
+    query = apply_plan_filters(
+        query, ref, application, type_audit, niveau_securite, date_realisation, date_cloture, date_rapport,
+        realisation_year, realisation_month, cloture_year, cloture_month, rapport_year, rapport_month
+    )
 
-    # Filtres par année/mois
-    if realisation_year:
-        query = query.filter(extract('year', Plan.date_realisation) == realisation_year)
-    if realisation_month:
-        query = query.filter(extract('month', Plan.date_realisation) == realisation_month)
+    return query.all()
 
-    if cloture_year:
-        query = query.filter(extract('year', Plan.date_cloture) == cloture_year)
-    if cloture_month:
-        query = query.filter(extract('month', Plan.date_cloture) == cloture_month)
+def encode_plan_cursor(plan: Plan) -> str:
+    date_part = plan.date_realisation.isoformat() if plan.date_realisation else ""
+    return base64.urlsafe_b64encode(f"{date_part}|{plan.id}".encode()).decode()
 
-    if rapport_year:
-        query = query.filter(extract('year', Plan.date_rapport) == rapport_year)
-    if rapport_month:
-        query = query.filter(extract('month', Plan.date_rapport) == rapport_month)
+def decode_plan_cursor(cursor: str):
+    try:
+        date_part, id_part = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return (date.fromisoformat(date_part) if date_part else None), int(id_part)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Curseur de pagination invalide.")
 
-    return query.all()
+def get_plans_page(
+    db: Session,
+    limit: int = PLAN_PAGE_DEFAULT_SIZE,
+    cursor: Optional[str] = None,
+    include_vulnerabilities: bool = True,
+    **filters
+):
+    # Pagination par curseur sur (date_realisation, id) décroissants, les plans sans date en dernier.
+    # Chaque section est lue via l'index (date_realisation, id), sans OFFSET.
+    last_date, last_id = decode_plan_cursor(cursor) if cursor else (None, None)
+
+    def base_query():
+        query = db.query(Plan)
+        if include_vulnerabilities:
+            query = query.options(selectinload(Plan.vulnerabilites))
+        return apply_plan_filters(query, **filters)
+
+    plans = []
+    if cursor is None or last_date is not None:
+        query = base_query().filter(Plan.date_realisation.isnot(None))
+        if last_date is not None:
+            query = query.filter(or_(
+                Plan.date_realisation < last_date,
+                and_(Plan.date_realisation == last_date, Plan.id < last_id)
+            ))
+        plans = query.order_by(Plan.date_realisation.desc(), Plan.id.desc()).limit(limit + 1).all()
+
+    if len(plans) <= limit:
+        query = base_query().filter(Plan.date_realisation.is_(None))
+        if last_date is None and last_id is not None:
+            query = query.filter(Plan.id < last_id)
+        plans += query.order_by(Plan.id.desc()).limit(limit + 1 - len(plans)).all()
+
+    next_cursor = encode_plan_cursor(plans[limit - 1]) if len(plans) > limit else None
+    return plans[:limit], next_cursor
+
+def count_filtered_plans(db: Session, **filters) -> int:
+    # Total mis en cache quelques secondes par combinaison de filtres
+    key = tuple(sorted((name, value) for name, value in filters.items() if value is not None))
+    now = time.monotonic()
+    with _plan_count_lock:
+        cached = _plan_count_cache.get(key)
+        if cached and now - cached[1] < PLAN_COUNT_CACHE_TTL:
+            return cached[0]
+
+    total = apply_plan_filters(db.query(func.count(Plan.id)), **filters).scalar() or 0
+    with _plan_count_lock:
+        _plan_count_cache[key] = (total, now)
+    return total
+
+def invalidate_plan_count_cache():
+    with _plan_count_lock:
+        _plan_count_cache.clear()
 
 def update_plan(db: Session, plan_id: int, updated_data: PlanUpdate, vulnerabilites=None):
     plan = db.query(Plan).filter(Plan.id == plan_id).first()
@@ -375,6 +634,10 @@ def update_plan(db: Session, plan_id: int, updated_data: PlanUpdate, vulnerabili
         update_fields = updated_data.dict(exclude_unset=True)
         vulnerabilites_data = update_fields.pop("vulnerabilites", None)
 
+        if "date_realisation" in update_fields and update_fields["date_realisation"] != plan.date_realisation:
+            record_plans_realises(db, [plan.date_realisation], sign=-1)
+            record_plans_realises(db, [update_fields["date_realisation"]])
+
         # Mise à jour des champs du plan
         for key, value in update_fields.items():
             setattr(plan, key, value)
@@ -398,8 +661,13 @@ def update_plan(db: Session, plan_id: int, updated_data: PlanUpdate, vulnerabili
             plan.nb_vulnerabilites = dict(summary)
             plan.taux_remediation = compute_taux_remediation(new_vulns)
 
+        if "ref" in update_fields or "application" in update_fields:
+            index_plan(db, plan)
+
         db.commit()
         db.refresh(plan)
+        invalidate_plan_count_cache()
+        invalidate_kpis("plans")
 
         logger.info(f"Plan {plan_id} et vulnérabilités mis à jour avec succès.")
         return plan
@@ -410,7 +678,7 @@ def update_plan(db: Session, plan_id: int, updated_data: PlanUpdate, vulnerabili
         logger.error(f"Erreur lors de la mise à jour du plan : {error_message}")
         raise HTTPException(status_code=500, detail="Erreur lors de la mise à jour du plan.")
 
-def serialize_plan(plan: Plan) -> PlanResponse:
+def serialize_plan(plan: Plan, include_vulnerabilities: bool = True) -> PlanResponse:
     return PlanResponse(
         id=plan.id,
         ref=plan.ref,
@@ -436,7 +704,7 @@ def serialize_plan(plan: Plan) -> PlanResponse:
                 statut_remediation=v.statut_remediation,
                 actions=v.actions
             ) for v in plan.vulnerabilites
-        ]
+        ] if include_vulnerabilities else []
     )
 
 def compute_vulnerability_summary(vulnerabilities):
@@ -478,7 +746,81 @@ def format_vulnerabilites(vuln_dict):
 
     return "\n".join(lines)
 
+# Balise simple (avec attributs éventuellement entre guillemets), telle que produite par l'éditeur
+SIMPLE_TAG_RE = re.compile(
+    r"""<(/?)([a-zA-Z][^\t\n\r\f />\x00]*)"""
+    r"""(?:\s+[^\s=/>"'<]+(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s"'=<>`]+))?)*\s*/?>"""
+)
+# Contenus que html.parser/BeautifulSoup traitent à part : on laisse BeautifulSoup s'en charger
+COMPLEX_TAGS = {"script", "style", "template", "pre", "textarea", "title", "xmp", "plaintext", "noscript", "iframe", "noembed", "noframes"}
+ASCII_SPACES = {ord(c): None for c in "\x20\x0a\x09\x0c\x0d"}
+CLEAN_HTML_CACHE_SIZE = 4096
+
+_clean_html_cache = OrderedDict()
+_clean_html_lock = threading.Lock()
+
+def _clean_simple_html(raw_html: str) -> Optional[str]:
+    # Chemin rapide : retourne None si le contenu sort du sous-ensemble simple
+    if "&" in raw_html:
+        return None
+
+    strings = []
+    position = 0
+    for match in SIMPLE_TAG_RE.finditer(raw_html):
+        if match.group(2).lower() in COMPLEX_TAGS:
+            return None
+        strings.append(raw_html[position:match.start()])
+        position = match.end()
+    strings.append(raw_html[position:])
+
+    texts = []
+    for text in strings:
+        if not text:
+            continue
+        if "<" in text:
+            return None
+        # Même règle que BeautifulSoup : une chaîne faite d'espaces devient "\n" ou " "
+        if not text.translate(ASCII_SPACES):
+            text = "\n" if "\n" in text else " "
+        texts.append(text)
+
+    return " ".join(texts).strip()
+
 def clean_html(raw_html):
     if not raw_html:
         return ""
-    return BeautifulSoup(raw_html, "html.parser").get_text(separator=" ").strip()
\ No newline at end of file
+    cleaned = _clean_simple_html(raw_html)
+    if cleaned is not None:
+        return cleaned
+    return BeautifulSoup(raw_html, "html.parser").get_text(separator=" ").strip()
+
+def clean_html_cached(plan_id, raw_html) -> str:
+    # Mémoïsation par plan et empreinte du contenu : un commentaire répété sur chaque
+    # vulnérabilité du plan n'est nettoyé qu'une fois
+    if not raw_html:
+        return ""
+
+    key = (plan_id, hashlib.sha1(raw_html.encode("utf-8")).digest())
+    with _clean_html_lock:
+        if key in _clean_html_cache:
+            _clean_html_cache.move_to_end(key)
+            return _clean_html_cache[key]
+
+    cleaned = clean_html(raw_html)
+    with _clean_html_lock:
+        _clean_html_cache[key] = cleaned
+        if len(_clean_html_cache) > CLEAN_HTML_CACHE_SIZE:
+            _clean_html_cache.popitem(last=False)
+    return cleaned
+
+def clean_html_column(plan_ids, raw_values) -> List[str]:
+    # Nettoyage d'une colonne entière en un lot : chaque couple (plan, contenu) distinct
+    # n'est traité qu'une seule fois
+    cleaned = {}
+    result = []
+    for plan_id, raw_html in zip(plan_ids, raw_values):
+        key = (plan_id, raw_html)
+        if key not in cleaned:
+            cleaned[key] = clean_html_cached(plan_id, raw_html)
+        result.append(cleaned[key])
+    return result
\ No newline at end of file
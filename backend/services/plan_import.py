@@ -0,0 +1,183 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Optional, List
+
+from sqlalchemy.orm import Session
+
+from backend.services.plan import parse_plan_workbook, insert_plans
+from database import engine
+from log_config import setup_logger
+
+logger = setup_logger()
+
+# File locale en mémoire (tient lieu de broker) : l'analyse pandas tourne dans un pool
+# de processus, les écritures SQLAlchemy dans un unique thread dédié
+PLAN_IMPORT_PARSE_WORKERS = int(os.getenv("PLAN_IMPORT_PARSE_WORKERS", "2"))
+PLAN_IMPORT_QUEUE_SIZE = int(os.getenv("PLAN_IMPORT_QUEUE_SIZE", "20"))
+PLAN_IMPORT_MAX_JOBS = int(os.getenv("PLAN_IMPORT_MAX_JOBS", "100"))
+
+STATUS_EN_ATTENTE = "en_attente"
+STATUS_INSERTION = "insertion"
+STATUS_TERMINE = "termine"
+STATUS_ECHEC = "echec"
+
+_jobs = {}
+_jobs_lock = threading.Lock()
+_job_queue = queue.Queue(maxsize=PLAN_IMPORT_QUEUE_SIZE)
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_writer_thread: Optional[threading.Thread] = None
+_start_lock = threading.Lock()
+
+
+class ImportQueueFull(Exception):
+    pass
+
+
+def _update_job(job_id: str, **fields):
+    with _jobs_lock:
+        _jobs[job_id].update(fields)
+
+
+def _prune_jobs():
+    # Ne conserver que les derniers jobs terminés
+    finished = [job for job in _jobs.values() if job["status"] in (STATUS_TERMINE, STATUS_ECHEC)]
+    excess = len(_jobs) - PLAN_IMPORT_MAX_JOBS
+    for job in sorted(finished, key=lambda j: j["created_at"])[:max(excess, 0)]:
+        del _jobs[job["job_id"]]
+
+
+def _ensure_started() -> ProcessPoolExecutor:
+    global _parse_pool, _writer_thread
+    with _start_lock:
+        if _parse_pool is None:
+            # spawn : pool créé dans un processus qui a déjà des threads (écriture des imports,
+            # emails, rendus PDF), un fork pourrait copier un verrou détenu par l'un d'eux
+            _parse_pool = ProcessPoolExecutor(
+                max_workers=PLAN_IMPORT_PARSE_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, name="plan-import-writer", daemon=True)
+            _writer_thread.start()
+        # Pool lu sous le verrou : shutdown_plan_imports peut le remplacer entre-temps
+        return _parse_pool
+
+
+def _writer_loop():
+    while True:
+        job_id, future = _job_queue.get()
+        try:
+            _run_job(job_id, future)
+        except Exception as e:
+            logger.error(f"Erreur inattendue pour l'import {job_id} : {e}", exc_info=True)
+            _update_job(job_id, status=STATUS_ECHEC, message=str(e), finished_at=datetime.utcnow())
+        finally:
+            _job_queue.task_done()
+
+
+def _run_job(job_id: str, future):
+    try:
+        rows_parsed, plans, vulnerabilites, errors = future.result()
+    except Exception as e:
+        logger.error(f"Erreur lors de l'analyse du fichier pour l'import {job_id} : {e}")
+        _update_job(job_id, status=STATUS_ECHEC, message=str(e), finished_at=datetime.utcnow())
+        return
+
+    _update_job(
+        job_id,
+        status=STATUS_INSERTION,
+        rows_parsed=rows_parsed,
+        plans_total=len(plans) + len(errors),
+        errors=list(errors)
+    )
+
+    def on_progress(inserted: int):
+        _update_job(job_id, plans_inserted=inserted, errors=list(errors))
+
+    with Session(engine) as db:
+        try:
+            inserted = insert_plans(db, plans, vulnerabilites, errors, on_progress=on_progress)
+        except Exception as e:
+            db.rollback()
+            error_message = str(e.orig) if hasattr(e, 'orig') else str(e)
+            logger.error(f"Erreur lors de l'insertion pour l'import {job_id} : {error_message}")
+            _update_job(job_id, status=STATUS_ECHEC, message=error_message, errors=list(errors),
+                        finished_at=datetime.utcnow())
+            return
+
+    _update_job(
+        job_id,
+        status=STATUS_TERMINE,
+        plans_inserted=inserted,
+        errors=list(errors),
+        message="Importation réussie" if not errors else "Importation terminée avec des erreurs",
+        finished_at=datetime.utcnow()
+    )
+    logger.info(f"Import {job_id} terminé : {inserted} plan(s) insérés, {len(errors)} ref(s) en erreur.")
+
+
+def submit_plan_import(contents: bytes, filename: str, username: Optional[str] = None) -> dict:
+    parse_pool = _ensure_started()
+
+    job_id = uuid.uuid4().hex
+    job = {
+        "job_id": job_id,
+        "filename": filename,
+        "username": username,
+        "status": STATUS_EN_ATTENTE,
+        "rows_parsed": 0,
+        "plans_total": 0,
+        "plans_inserted": 0,
+        "errors": [],
+        "message": None,
+        "created_at": datetime.utcnow(),
+        "finished_at": None,
+    }
+
+    with _jobs_lock:
+        _jobs[job_id] = job
+        _prune_jobs()
+
+    # L'analyse démarre tout de suite dans le pool, en parallèle des écritures en cours
+    future = parse_pool.submit(parse_plan_workbook, contents)
+    try:
+        _job_queue.put_nowait((job_id, future))
+    except queue.Full:
+        future.cancel()
+        with _jobs_lock:
+            del _jobs[job_id]
+        raise ImportQueueFull("File d'import pleine, réessayez plus tard.")
+
+    logger.info(f"Import de plan {job_id} mis en file ({filename})")
+    return dict(job)
+
+
+def get_plan_import(job_id: str) -> Optional[dict]:
+    with _jobs_lock:
+        job = _jobs.get(job_id)
+        return dict(job) if job else None
+
+
+def list_plan_imports() -> List[dict]:
+    with _jobs_lock:
+        return sorted((dict(job) for job in _jobs.values()), key=lambda j: j["created_at"], reverse=True)
+
+
+def shutdown_plan_imports(timeout: float) -> bool:
+    # Arrêt de l'application : attente (bornée) des imports en file, puis arrêt du pool
+    # d'analyse (les analyses pas encore commencées sont annulées, leur job passe en échec)
+    global _parse_pool
+    deadline = time.monotonic() + timeout
+    while _job_queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.05)
+    with _start_lock:
+        if _parse_pool is not None:
+            _parse_pool.shutdown(wait=True, cancel_futures=True)
+            _parse_pool = None
+    return not _job_queue.unfinished_tasks
@@ -0,0 +1,214 @@
+import os
+import re
+from functools import lru_cache
+from typing import Optional, List, Iterable, Tuple
+
+from sqlalchemy import func, select, exists
+from sqlalchemy.orm import Session
+from unidecode import unidecode
+
+from backend.models.plan import Plan
+from backend.models.plan_search import PlanSearchGram
+from log_config import setup_logger
+
+logger = setup_logger()
+
+PLAN_SEARCH_DEFAULT_LIMIT = int(os.getenv("PLAN_SEARCH_DEFAULT_LIMIT", "20"))
+PLAN_SEARCH_MAX_LIMIT = int(os.getenv("PLAN_SEARCH_MAX_LIMIT", "100"))
+PLAN_SEARCH_MAX_CANDIDATES = int(os.getenv("PLAN_SEARCH_MAX_CANDIDATES", "5000"))
+PLAN_SEARCH_BACKFILL_BATCH = 1000
+
+GRAM_SIZE = 3
+SEARCH_TEXT_CACHE_SIZE = 16384
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def search_tokens(value) -> List[str]:
+    # Normalisation : translittération (accents, ligatures), minuscules, découpage en mots
+    if value is None:
+        return []
+    value = str(value)
+    if not value.isascii():
+        value = unidecode(value)
+    return TOKEN_RE.findall(value.lower())
+
+
+@lru_cache(maxsize=SEARCH_TEXT_CACHE_SIZE)
+def normalize_search_text(value) -> str:
+    # Mis en cache : les mêmes applications reviennent sur de nombreux plans
+    return " ".join(search_tokens(value))
+
+
+def token_grams(token: str) -> set:
+    # Trigrammes du mot + fins de mot plus courtes, pour que toute sous-chaîne
+    # d'un ou deux caractères soit le préfixe d'un n-gramme indexé
+    return {token[i:i + GRAM_SIZE] for i in range(len(token))}
+
+
+def plan_grams(ref, application) -> set:
+    grams = set()
+    for token in search_tokens(ref) + search_tokens(application):
+        grams |= token_grams(token)
+    return grams
+
+
+def index_plans(db: Session, rows: Iterable[Tuple[int, Optional[str], Optional[str]]]):
+    # (Ré)indexe les plans (id, ref, application) dans la transaction courante, sans commit
+    rows = list(rows)
+    if not rows:
+        return
+
+    db.query(PlanSearchGram).filter(
+        PlanSearchGram.plan_id.in_([plan_id for plan_id, _, _ in rows])
+    ).delete(synchronize_session=False)
+
+    mappings = [
+        {"plan_id": plan_id, "gram": gram}
+        for plan_id, ref, application in rows
+        for gram in plan_grams(ref, application)
+    ]
+    if mappings:
+        db.bulk_insert_mappings(PlanSearchGram, mappings)
+
+
+def index_plan(db: Session, plan: Plan):
+    index_plans(db, [(plan.id, plan.ref, plan.application)])
+
+
+def _unindexed_plans():
+    return (
+        select(Plan.id, Plan.ref, Plan.application)
+        .where(~exists().where(PlanSearchGram.plan_id == Plan.id))
+        .where((Plan.ref.isnot(None)) | (Plan.application.isnot(None)))
+        .order_by(Plan.id)
+    )
+
+
+def has_unindexed_plans(db: Session) -> bool:
+    # Vérification au démarrage (lecture d'une ligne), le rattrapage lui-même passe par
+    # python -m backend.services.schema_upgrade
+    return db.execute(_unindexed_plans().limit(1)).first() is not None
+
+
+def index_missing_plans(db: Session) -> int:
+    # Rattrapage des plans sans entrée d'index (plans antérieurs à l'index, écritures hors API)
+    missing = _unindexed_plans()
+
+    total = 0
+    last_id = 0
+    while True:
+        rows = db.execute(missing.where(Plan.id > last_id).limit(PLAN_SEARCH_BACKFILL_BATCH)).all()
+        if not rows:
+            break
+        index_plans(db, rows)
+        db.commit()
+        total += len(rows)
+        last_id = rows[-1][0]
+
+    if total:
+        logger.info(f"Index de recherche : {total} plan(s) indexé(s).")
+    return total
+
+
+def find_candidate_ids(db: Session, tokens: List[str]) -> List[int]:
+    # Mots de 3 caractères et plus : le plan doit posséder tous leurs trigrammes ;
+    # mots plus courts : au moins un n-gramme commençant par le mot (LIKE préfixe sur l'index)
+    full_grams = set()
+    short_tokens = []
+    for token in tokens:
+        if len(token) >= GRAM_SIZE:
+            full_grams |= {token[i:i + GRAM_SIZE] for i in range(len(token) - GRAM_SIZE + 1)}
+        else:
+            short_tokens.append(token)
+
+    if full_grams:
+        query = (
+            select(PlanSearchGram.plan_id)
+            .where(PlanSearchGram.gram.in_(full_grams))
+            .group_by(PlanSearchGram.plan_id)
+            .having(func.count(PlanSearchGram.gram) == len(full_grams))
+        )
+    else:
+        token = short_tokens.pop(0)
+        query = (
+            select(PlanSearchGram.plan_id)
+            .where(PlanSearchGram.gram.like(f"{token}%"))
+            .distinct()
+        )
+
+    for token in short_tokens:
+        query = query.where(PlanSearchGram.plan_id.in_(
+            select(PlanSearchGram.plan_id).where(PlanSearchGram.gram.like(f"{token}%"))
+        ))
+
+    query = query.order_by(PlanSearchGram.plan_id.desc()).limit(PLAN_SEARCH_MAX_CANDIDATES)
+    return list(db.execute(query).scalars())
+
+
+def find_ref_match_ids(db: Session, q: str) -> List[int]:
+    # Ref exacte et refs commençant par la saisie (index de plans.ref), toujours candidates :
+    # la limite PLAN_SEARCH_MAX_CANDIDATES des trigrammes (plans les plus récents) ne doit pas
+    # écarter les meilleurs résultats pour une recherche large
+    raw = q.strip()
+    if not raw:
+        return []
+    exact = select(Plan.id).where(Plan.ref == raw)
+    prefix = (
+        select(Plan.id)
+        .where(Plan.ref.startswith(raw, autoescape=True))
+        .order_by(Plan.id.desc())
+        .limit(PLAN_SEARCH_MAX_LIMIT)
+    )
+    return list(db.execute(exact).scalars()) + list(db.execute(prefix).scalars())
+
+
+def rank_match(needle: str, tokens: List[str], ref_text: str, application_text: str) -> Optional[tuple]:
+    # Classement : ref exacte, préfixe de ref, ref contenant la saisie,
+    # puis application (préfixe, contenu), enfin mots répartis sur les deux champs
+    if ref_text == needle:
+        return (0, 0)
+    position = ref_text.find(needle)
+    if position >= 0:
+        return (1 if position == 0 else 2, position)
+    position = application_text.find(needle)
+    if position >= 0:
+        return (3 if position == 0 else 4, position)
+    combined = f"{ref_text} {application_text}"
+    if all(token in combined for token in tokens):
+        return (5, 0)
+    return None
+
+
+def search_plans(db: Session, q: str, limit: int = PLAN_SEARCH_DEFAULT_LIMIT) -> List[dict]:
+    tokens = search_tokens(q)
+    if not tokens:
+        return []
+
+    candidate_ids = set(find_candidate_ids(db, tokens)) | set(find_ref_match_ids(db, q))
+    if not candidate_ids:
+        return []
+
+    # Vérification et classement sur les seuls candidats (l'index ne garantit pas la contiguïté)
+    needle = " ".join(tokens)
+    rows = db.query(
+        Plan.id, Plan.ref, Plan.application, Plan.type_audit, Plan.date_realisation
+    ).filter(Plan.id.in_(candidate_ids)).all()
+
+    ranked = []
+    for row in rows:
+        rank = rank_match(needle, tokens, normalize_search_text(row.ref), normalize_search_text(row.application))
+        if rank is not None:
+            ranked.append((rank, -row.id, row))
+
+    ranked.sort(key=lambda item: (item[0], item[1]))
+    return [
+        {
+            "id": row.id,
+            "ref": row.ref,
+            "application": row.application,
+            "type_audit": row.type_audit,
+            "date_realisation": row.date_realisation,
+            "rank": rank[0],
+        }
+        for rank, _, row in ranked[:limit]
+    ]
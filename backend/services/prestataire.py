@@ -1,13 +1,15 @@
 import os
-import shutil
 from typing import List
 
-from fastapi import UploadFile
+from fastapi import UploadFile, HTTPException
 from sqlalchemy.orm import Session
 from datetime import datetime
 
 from backend.models.prestataire import Prestataire
 from backend.schemas.prestataire import PrestataireCreate, PrestataireUpdate
+from backend.services.kpi_snapshot import invalidate_kpis
+from backend.services.blob_store import release_files
+from backend.services.upload_storage import save_upload, UPLOAD_KIND_PRESTATAIRE
 from log_config import setup_logger
 
 logger = setup_logger()
@@ -15,14 +17,12 @@ logger = setup_logger()
 def save_file(file: UploadFile, prestataire_name: str, upload_folder: str = "prestataire") -> str:
     try:
         folder = os.path.join(upload_folder, prestataire_name.replace(" ", "_"))
-        os.makedirs(folder, exist_ok=True)
-        file_path = os.path.join(folder, file.filename)
+        stored = save_upload(file, folder, file.filename, UPLOAD_KIND_PRESTATAIRE)
 
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        logger.info(f"Fichier sauvegardé : {file_path}")
-        return file_path
+        logger.info(f"Fichier sauvegardé : {stored.path} ({stored.size} octets, sha256 {stored.sha256})")
+        return stored.path
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erreur sauvegarde : {str(e)}")
         return None
@@ -51,6 +51,7 @@ def create_prestataire(db: Session, prestataire: PrestataireCreate):
     db.add(db_obj)
     db.commit()
     db.refresh(db_obj)
+    invalidate_kpis("prestataires")
     return db_obj
 
 def update_prestataire_with_files(
@@ -82,6 +83,7 @@ def update_prestataire_with_files(
 
     db.commit()
     db.refresh(db_obj)
+    invalidate_kpis("prestataires")
     return db_obj
 
 def prestataire_to_dict(prestataire: Prestataire) -> dict:
@@ -113,8 +115,12 @@ def get_prestataire_obj(db: Session, id: int):
 def delete_prestataire(db: Session, id: int):
     obj = get_prestataire_obj(db, id)
     if obj:
+        files = [obj.lettre_commande, obj.pv_reception, *(obj.pieces_jointes or [])]
         db.delete(obj)
         db.commit()
+        # Fichiers supprimés après la validation (blob libéré avec son dernier lien)
+        release_files(files)
+        invalidate_kpis("prestataires")
     return obj
 
 def add_pieces_jointes(db: Session, prestataire_id: int, files: List[UploadFile]):
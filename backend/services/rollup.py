@@ -0,0 +1,134 @@
+from collections import Counter
+from typing import Optional, Iterable
+
+from sqlalchemy import extract, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from backend.models.audit import Audit
+from backend.models.plan import Plan
+from backend.models.rollup import KpiRollup
+from log_config import setup_logger
+
+logger = setup_logger()
+
+METRIC_PLANS_REALISES = "plans_realises"
+METRIC_AUDITS_TERMINES = "audits_termines"
+
+# "Terminé" est la valeur écrite par change_audit_etat, "TERMINE" celle des données historiques
+AUDIT_ETATS_TERMINES = ("TERMINE", "Terminé")
+
+
+def month_key(value) -> Optional[tuple]:
+    if value is None:
+        return None
+    return value.year, value.month
+
+
+def bump_rollup(db: Session, metric: str, deltas: Counter):
+    # Incrément des compteurs (année, mois) dans la transaction de l'appelant, sans commit
+    for (annee, mois), delta in deltas.items():
+        if not delta:
+            continue
+        filters = (KpiRollup.metric == metric, KpiRollup.annee == annee, KpiRollup.mois == mois)
+        updated = db.query(KpiRollup).filter(*filters).update(
+            {KpiRollup.total: KpiRollup.total + delta}, synchronize_session=False
+        )
+        if updated:
+            continue
+        try:
+            with db.begin_nested():
+                db.add(KpiRollup(metric=metric, annee=annee, mois=mois, total=delta))
+        except IntegrityError:
+            # Ligne créée entre-temps par une autre transaction
+            db.query(KpiRollup).filter(*filters).update(
+                {KpiRollup.total: KpiRollup.total + delta}, synchronize_session=False
+            )
+
+
+def record_plans_realises(db: Session, dates: Iterable, sign: int = 1):
+    deltas = Counter()
+    for value in dates:
+        key = month_key(value)
+        if key:
+            deltas[key] += sign
+    bump_rollup(db, METRIC_PLANS_REALISES, deltas)
+
+
+def record_audit_etat_change(db: Session, old_etat: str, old_start, new_etat: str, new_start):
+    was_termine = old_etat in AUDIT_ETATS_TERMINES
+    is_termine = new_etat in AUDIT_ETATS_TERMINES
+    if was_termine == is_termine:
+        return
+
+    deltas = Counter()
+    if was_termine and month_key(old_start):
+        deltas[month_key(old_start)] -= 1
+    if is_termine and month_key(new_start):
+        deltas[month_key(new_start)] += 1
+    bump_rollup(db, METRIC_AUDITS_TERMINES, deltas)
+
+
+def get_rollup_series(db: Session, metric: str, annee_debut: int, annee_fin: int) -> list:
+    return (
+        db.query(KpiRollup.annee, KpiRollup.mois, KpiRollup.total)
+        .filter(
+            KpiRollup.metric == metric,
+            KpiRollup.annee >= annee_debut,
+            KpiRollup.annee <= annee_fin,
+            KpiRollup.total > 0
+        )
+        .order_by(KpiRollup.annee, KpiRollup.mois)
+        .all()
+    )
+
+
+def _count_by_month(db: Session, column, *filters) -> list:
+    annee = extract("year", column)
+    mois = extract("month", column)
+    return (
+        db.query(annee, mois, func.count())
+        .filter(column.isnot(None), *filters)
+        .group_by(annee, mois)
+        .all()
+    )
+
+
+def rebuild_rollups(db: Session) -> int:
+    # Reconstruction complète depuis les tables sources, en une transaction
+    sources = {
+        METRIC_PLANS_REALISES: _count_by_month(db, Plan.date_realisation),
+        METRIC_AUDITS_TERMINES: _count_by_month(db, Audit.start_time, Audit.etat.in_(AUDIT_ETATS_TERMINES)),
+    }
+
+    db.query(KpiRollup).filter(KpiRollup.metric.in_(list(sources))).delete(synchronize_session=False)
+    rows = [
+        {"metric": metric, "annee": int(annee), "mois": int(mois), "total": total}
+        for metric, counts in sources.items()
+        for annee, mois, total in counts
+    ]
+    if rows:
+        db.bulk_insert_mappings(KpiRollup, rows)
+    db.commit()
+
+    logger.info(f"Rollups KPI reconstruits : {len(rows)} ligne(s)")
+    return len(rows)
+
+
+def rollups_empty(db: Session) -> bool:
+    return db.query(KpiRollup.metric).first() is None
+
+
+def ensure_rollups(db: Session):
+    # Premier déploiement : table vide, on la remplit depuis l'historique
+    # (python -m backend.services.schema_upgrade, pas au démarrage de chaque worker)
+    if rollups_empty(db):
+        rebuild_rollups(db)
+
+
+if __name__ == "__main__":
+    # Backfill : python -m backend.services.rollup
+    from database import engine
+
+    with Session(engine) as session:
+        rebuild_rollups(session)
@@ -0,0 +1,90 @@
+from typing import List
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+from backend.models.affectation import Affectation
+from backend.models.demande_audit import Demande_Audit
+from backend.models.email import Email
+from backend.models.PieceJointe import PieceJointe
+from backend.models.plan import Plan
+from database import Base
+from log_config import setup_logger
+
+logger = setup_logger()
+
+# Évolutions des tables existantes que create_all ne fait pas (il ne crée que les tables
+# absentes). À lancer une fois au déploiement, avant le démarrage des workers :
+#     python -m backend.services.schema_upgrade
+# Chaque étape vérifie l'état de la base avant d'agir : relancer la commande est sans effet
+ADDED_COLUMNS = {
+    Email: ("message_id", "attempts", "latency_ms", "created_at", "mime_payload"),
+    Demande_Audit: ("pdf_status",),
+    Affectation: ("pdf_status",),
+    PieceJointe: ("taille", "sha256"),
+}
+
+# Tables existantes dont les modèles déclarent de nouveaux index (après l'ajout des colonnes)
+INDEXED_MODELS = (Plan, Demande_Audit, Email)
+
+
+def missing_columns(engine: Engine) -> List[str]:
+    inspector = inspect(engine)
+    missing = []
+    for model, column_names in ADDED_COLUMNS.items():
+        table_name = model.__tablename__
+        if not inspector.has_table(table_name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table_name)}
+        missing.extend(f"{table_name}.{name}" for name in column_names if name not in existing)
+    return missing
+
+
+def upgrade_schema(engine: Engine) -> dict:
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    for qualified_name in missing_columns(engine):
+        table_name, column_name = qualified_name.split(".")
+        column = Base.metadata.tables[table_name].c[column_name]
+        column_type = column.type.compile(dialect=engine.dialect)
+        with engine.begin() as connection:
+            connection.execute(text(
+                f"ALTER TABLE {preparer.quote(table_name)} ADD COLUMN {preparer.quote(column_name)} {column_type}"
+            ))
+        logger.info(f"Colonne ajoutée : {qualified_name}")
+        added.append(qualified_name)
+
+    created = []
+    inspector = inspect(engine)
+    for model in INDEXED_MODELS:
+        if not inspector.has_table(model.__tablename__):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(model.__tablename__)}
+        for index in model.__table__.indexes:
+            if index.name not in existing:
+                index.create(bind=engine)
+                logger.info(f"Index créé : {index.name}")
+                created.append(index.name)
+
+    return {"colonnes_ajoutees": added, "index_crees": created}
+
+
+if __name__ == "__main__":
+    from sqlalchemy.orm import Session
+
+    # Tous les modèles : les relations doivent être résolues pour les rattrapages ci-dessous
+    import backend.models.audit, backend.models.auditeur, backend.models.commentaire, backend.models.DemandeurContact
+    import backend.models.ip, backend.models.ports, backend.models.prestataire, backend.models.vulnerability
+    from backend.services.plan_search import index_missing_plans
+    from backend.services.rollup import ensure_rollups
+    from backend.services.email_outbox import purge_sent_payloads
+    from database import engine
+
+    Base.metadata.create_all(bind=engine)
+    print(upgrade_schema(engine))
+
+    # Rattrapages de données, une seule fois et non par chaque worker au démarrage
+    with Session(engine) as db:
+        print({"plans_indexes": index_missing_plans(db)})
+        ensure_rollups(db)
+        print({"emails_purges": purge_sent_payloads(db)})
@@ -0,0 +1,76 @@
+import hashlib
+import os
+from typing import NamedTuple
+
+from fastapi import HTTPException, UploadFile
+
+from backend.services.blob_store import new_temp_file, store_file
+from log_config import setup_logger
+
+logger = setup_logger()
+
+# Enregistrement commun des fichiers reçus : copie par blocs de taille fixe (jamais le fichier
+# entier en mémoire), plafond par type de fichier contrôlé pendant la copie et empreinte
+# SHA-256 calculée au fil de l'eau
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+
+UPLOAD_KIND_DEMANDE = "demande_audit"
+UPLOAD_KIND_PRESTATAIRE = "prestataire"
+UPLOAD_KIND_PIECE_JOINTE = "piece_jointe"
+
+# Tailles maximales en Mo, par type de fichier
+UPLOAD_MAX_SIZES_MB = {
+    UPLOAD_KIND_DEMANDE: int(os.getenv("UPLOAD_MAX_SIZE_DEMANDE_MB", "20")),
+    UPLOAD_KIND_PRESTATAIRE: int(os.getenv("UPLOAD_MAX_SIZE_PRESTATAIRE_MB", "20")),
+    UPLOAD_KIND_PIECE_JOINTE: int(os.getenv("UPLOAD_MAX_SIZE_PIECE_JOINTE_MB", "50")),
+}
+
+
+class StoredUpload(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+
+
+def upload_too_large(filename: str, kind: str) -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Fichier trop volumineux : {filename} (maximum {UPLOAD_MAX_SIZES_MB[kind]} Mo)"
+    )
+
+
+def save_upload(upload: UploadFile, folder: str, filename: str, kind: str) -> StoredUpload:
+    max_size = UPLOAD_MAX_SIZES_MB[kind] * 1024 * 1024
+
+    # Taille déjà connue : refus immédiat, sans rien écrire
+    announced_size = getattr(upload, "size", None)
+    if announced_size is not None and announced_size > max_size:
+        logger.warning(f"Fichier refusé ({announced_size} octets > {max_size}) : {upload.filename}")
+        raise upload_too_large(upload.filename, kind)
+
+    file_path = os.path.join(folder, filename)
+
+    # Écriture dans un fichier temporaire du stockage par contenu, puis rangement sous son
+    # empreinte (voir blob_store) : jamais de fichier tronqué à la place du fichier final
+    digest = hashlib.sha256()
+    size = 0
+    buffer = new_temp_file()
+    try:
+        with buffer:
+            while chunk := upload.file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    logger.warning(f"Fichier refusé (plus de {max_size} octets) : {upload.filename}")
+                    raise upload_too_large(upload.filename, kind)
+                digest.update(chunk)
+                buffer.write(chunk)
+    except BaseException:
+        try:
+            os.remove(buffer.name)
+        except OSError:
+            pass
+        raise
+
+    store_file(buffer.name, digest.hexdigest(), file_path)
+    return StoredUpload(file_path, size, digest.hexdigest())
+
@@ -0,0 +1,29 @@
+import logging
+import os
+import sys
+import types
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# Racine du dépôt : les modules s'importent en backend.*
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# database et log_config sont fournis par l'environnement de déploiement et absents du dépôt :
+# à défaut, les tests tournent sur une base SQLite en mémoire et le logger standard
+try:
+    import database
+except ImportError:
+    database = types.ModuleType("database")
+    database.engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    database.SessionLocal = sessionmaker(bind=database.engine)
+    database.Base = declarative_base()
+    sys.modules["database"] = database
+
+try:
+    import log_config
+except ImportError:
+    log_config = types.ModuleType("log_config")
+    log_config.setup_logger = lambda: logging.getLogger("audit_app")
+    sys.modules["log_config"] = log_config
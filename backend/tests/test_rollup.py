@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+# Tous les modèles : les relations et clés étrangères doivent être résolues
+import backend.models.affectation
+import backend.models.audit
+import backend.models.auditeur
+import backend.models.commentaire
+import backend.models.demande_audit
+import backend.models.DemandeurContact
+import backend.models.email
+import backend.models.ip
+import backend.models.PieceJointe
+import backend.models.plan
+import backend.models.plan_search
+import backend.models.ports
+import backend.models.prestataire
+import backend.models.rollup
+import backend.models.vulnerability
+from backend.models.affectation import Affectation
+from backend.models.audit import Audit
+from backend.services.audit import change_audit_etat
+from backend.services.rollup import METRIC_AUDITS_TERMINES, get_rollup_series, rebuild_rollups
+from database import Base
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+
+def add_audit(db: Session, audit_id: int, etat: str, start_time: datetime) -> Audit:
+    db.add(Affectation(id=audit_id, demande_audit_id=audit_id, type_audit="Test"))
+    audit = Audit(id=audit_id, demande_audit_id=audit_id, affectation_id=audit_id, etat=etat, start_time=start_time)
+    db.add(audit)
+    db.commit()
+    return audit
+
+
+def assert_rollup_matches_rebuild(db: Session):
+    incremental = get_rollup_series(db, METRIC_AUDITS_TERMINES, 2000, 2100)
+    rebuild_rollups(db)
+    assert incremental == get_rollup_series(db, METRIC_AUDITS_TERMINES, 2000, 2100)
+
+
+def test_reouverture_audit_termine_decremente_le_mois(db):
+    add_audit(db, 1, "En cours", datetime(2024, 3, 4))
+
+    change_audit_etat(db, 1, "Terminé")
+    assert sum(row.total for row in get_rollup_series(db, METRIC_AUDITS_TERMINES, 2000, 2100)) == 1
+
+    change_audit_etat(db, 1, "En cours")
+    assert get_rollup_series(db, METRIC_AUDITS_TERMINES, 2000, 2100) == []
+
+    change_audit_etat(db, 1, "Terminé")
+    assert_rollup_matches_rebuild(db)
+
+
+def test_suspension_audit_termine_historique(db):
+    add_audit(db, 1, "Terminé", datetime(2024, 3, 4))
+    add_audit(db, 2, "Terminé", datetime(2024, 3, 11))
+    rebuild_rollups(db)
+
+    change_audit_etat(db, 1, "Suspendu")
+    assert [tuple(row) for row in get_rollup_series(db, METRIC_AUDITS_TERMINES, 2000, 2100)] == [(2024, 3, 1)]
+
+    change_audit_etat(db, 1, "En cours")
+    change_audit_etat(db, 1, "Terminé")
+    assert_rollup_matches_rebuild(db)
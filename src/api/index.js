@@ -1,4 +1,5 @@
 import axios from 'axios';
+import { toast } from 'sonner';
 import keycloak from '../keycloak';
 
 const api = axios.create({
@@ -20,4 +21,27 @@ api.interceptors.request.use(async (config) => {
   return config;
 });
 
+// Fichiers servis par /fichiers (contrôle d'accès côté backend) : téléchargés avec le jeton
+// puis ouverts dans un nouvel onglet, un simple lien ne transmettant pas l'en-tête Authorization
+export const openFichier = async (path) => {
+  if (!path) return;
+  const cleanedPath = path.replace(/\\/g, '/').replace(/^\/+/, '');
+  const encodedPath = cleanedPath.split('/').map(encodeURIComponent).join('/');
+  // Onglet ouvert pendant le clic : ouvert après l'appel, il serait bloqué par le navigateur
+  const win = window.open('', '_blank');
+  try {
+    const response = await api.get(`/fichiers/${encodedPath}`, { responseType: 'blob' });
+    const url = URL.createObjectURL(response.data);
+    if (win) {
+      win.location.href = url;
+    } else {
+      window.open(url, '_blank');
+    }
+    setTimeout(() => URL.revokeObjectURL(url), 60000);
+  } catch (err) {
+    if (win) win.close();
+    toast.error(err.response?.status === 403 ? 'Accès refusé à ce fichier.' : 'Impossible d\'ouvrir le fichier.');
+  }
+};
+
 export default api;
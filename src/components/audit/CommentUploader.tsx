@@ -4,7 +4,7 @@ import { Input } from "@/components/ui/input";
 import { Button } from "@/components/ui/button";
 import { MessageCircle, Paperclip, Send } from "lucide-react";
 import { toast } from "sonner";
-import api from "@/api";
+import api, { openFichier } from "@/api";
 
 const CommentUploader = ({ auditId, refresh }) => {
   const [commentaire, setCommentaire] = useState("");
@@ -145,9 +145,8 @@ const CommentUploader = ({ auditId, refresh }) => {
                 <div key={f.id} className="p-2 border rounded-md bg-muted text-sm">
                 <div className="font-medium">{f.auteur}</div>
                 <a
-                    href={`http://localhost:8000/${f.filepath}`}
-                    target="_blank"
-                    rel="noopener noreferrer"
+                    href="#"
+                    onClick={(e) => { e.preventDefault(); openFichier(f.filepath); }}
                     className="text-blue-600 hover:underline"
                 >
                     📎 {f.filename}
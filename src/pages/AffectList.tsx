@@ -15,7 +15,7 @@ import {
   Select, SelectContent, SelectItem, SelectTrigger, SelectValue
 } from "@/components/ui/select";
 import { Button } from "@/components/ui/button";
-import api from "@/api";
+import api, { openFichier } from "@/api";
 
 interface Prestataire {
   id: number | string;
@@ -318,9 +318,8 @@ const AffectList = () => {
               {selectedAffectation.affectationpath && (
                 <div className="mt-4">
                   <a
-                    href={`http://localhost:8000/${selectedAffectation.affectationpath}`}
-                    target="_blank"
-                    rel="noopener noreferrer"
+                    href="#"
+                    onClick={(e) => { e.preventDefault(); openFichier(selectedAffectation.affectationpath); }}
                     className="text-gacam-green hover:text-gacam-green-dark underline flex items-center"
                   >
                     <svg xmlns="http://www.w3.org/2000/svg" className="h-4 w-4 mr-1" fill="none" viewBox="0 0 24 24" stroke="currentColor">
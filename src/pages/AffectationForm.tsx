@@ -19,7 +19,7 @@ import {
   Table, TableBody, TableCell, TableRow 
 } from "@/components/ui/table";
 import { useNavigate } from "react-router-dom";
-import api from "@/api";
+import api, { openFichier } from "@/api";
 
 interface Contact {
   nom: string;
@@ -76,6 +76,7 @@ const AffectationForm = () => {
   const [selectedAuditeurs, setSelectedAuditeurs] = useState<number[]>([]);
   const [ips, setIps] = useState<IP[]>([{ adresse_ip: "", ports: [{ port: "" }] }]);
   const [affectationFile, setAffectationFile] = useState<string | null>(null);
+  const [affectationPdfPending, setAffectationPdfPending] = useState(false);
   const [editingAuditeur, setEditingAuditeur] = useState<Auditeur | null>(null);
   const [editDialogOpen, setEditDialogOpen] = useState(false);
   const [selectedTypeAudit, setSelectedTypeAudit] = useState<string>("");
@@ -330,7 +331,9 @@ const AffectationForm = () => {
       
       const response2 = await api.post("/affectation/affects", affectationData, );
       
-      setAffectationFile(response2.data.affectationpath);
+      // La fiche PDF est générée en arrière-plan : suivi jusqu'à la fin du rendu
+      setAffectationFile(null);
+      handleAffectationPdf(response2.data);
       
       toast("Succès", {
         description: "Affectation créée avec succès !"
@@ -343,6 +346,35 @@ const AffectationForm = () => {
     }
   };
 
+  const handleAffectationPdf = (affectation) => {
+    if (affectation.pdf_status === "pending") {
+      setAffectationPdfPending(true);
+      setTimeout(() => pollAffectationPdf(affectation.id), 1000);
+      return;
+    }
+    setAffectationPdfPending(false);
+    if (affectation.affectationpath) {
+      setAffectationFile(affectation.affectationpath);
+    } else if (affectation.pdf_status === "failed") {
+      toast("Erreur", {
+        description: "La fiche d'affectation n'a pas pu être générée"
+      });
+    }
+  };
+
+  const pollAffectationPdf = async (affectationId) => {
+    try {
+      const response = await api.get(`/affectation/affects/${affectationId}`);
+      handleAffectationPdf(response.data);
+    } catch (error) {
+      console.error("Erreur lors du suivi de la fiche d'affectation :", error);
+      setAffectationPdfPending(false);
+      toast("Erreur", {
+        description: "Impossible de récupérer la fiche d'affectation"
+      });
+    }
+  };
+
   return (
     <div className="container mx-auto py-8 px-4">
       <h1 className="text-3xl font-bold text-gacam-green mb-6">Fiche d'Affectation</h1>
@@ -410,9 +442,8 @@ const AffectationForm = () => {
                         {auditData.fichiers_attaches.map((file: string, idx: number) => (
                           <li key={idx}>
                             <a 
-                              href={`http://localhost:8000/${file}`} 
-                              target="_blank" 
-                              rel="noopener noreferrer"
+                              href="#"
+                              onClick={(e) => { e.preventDefault(); openFichier(file); }}
                               className="text-gacam-green hover:text-gacam-green-dark underline"
                             >
                               Télécharger fichier {idx + 1}
@@ -429,9 +460,8 @@ const AffectationForm = () => {
                     <TableCell className="font-medium">Voir la demande d'audit</TableCell>
                     <TableCell>
                       <a 
-                        href={`http://localhost:8000/${auditData.fiche_demande_path}`}
-                        target="_blank" 
-                        rel="noopener noreferrer"
+                        href="#"
+                        onClick={(e) => { e.preventDefault(); openFichier(auditData.fiche_demande_path); }}
                         className="text-gacam-green hover:text-gacam-green-dark underline flex items-center"
                       >
                         <svg xmlns="http://www.w3.org/2000/svg" className="h-4 w-4 mr-1" fill="none" viewBox="0 0 24 24" stroke="currentColor">
@@ -678,12 +708,17 @@ const AffectationForm = () => {
             Valider l'affectation
           </Button>
           
+          {affectationPdfPending && (
+            <div className="flex justify-center mt-4 text-gray-500">
+              Génération de la fiche d'affectation en cours...
+            </div>
+          )}
+
           {affectationFile && (
             <div className="flex justify-center mt-4">
               <a
-                href={`http://localhost:8000/${affectationFile}`}
-                target="_blank"
-                rel="noopener noreferrer"
+                href="#"
+                onClick={(e) => { e.preventDefault(); openFichier(affectationFile); }}
                 className="inline-flex items-center gap-2 px-4 py-2 bg-green-600 text-white rounded-md hover:bg-green-700 transition-colors"
               >
                 <svg xmlns="http://www.w3.org/2000/svg" className="h-5 w-5" fill="none" viewBox="0 0 24 24" stroke="currentColor">
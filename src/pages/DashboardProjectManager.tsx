@@ -10,6 +10,7 @@ import {
   CheckCircle2,
   XCircle,
 } from "lucide-react";
+import { openFichier } from "@/api";
 
 export default function DashboardProjectManager() {
   const { demandes, loading } = useMesDemandes();
@@ -96,9 +97,8 @@ export default function DashboardProjectManager() {
                   </div>
 
                   <a
-                    href={`http://localhost:8000/${demande.fiche_demande_path}`}
-                    target="_blank"
-                    rel="noreferrer"
+                    href="#"
+                    onClick={(e) => { e.preventDefault(); openFichier(demande.fiche_demande_path); }}
                     className="flex items-center gap-1 text-blue-600 hover:underline text-sm"
                     >
                     <FileText className="w-4 h-4" />
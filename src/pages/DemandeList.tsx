@@ -4,7 +4,7 @@ import { toast } from "@/components/ui/sonner";
 import { Dialog, DialogContent, DialogHeader, DialogFooter, DialogDescription, DialogTitle } from "@/components/ui/dialog"
 import { Button } from "@/components/ui/button"
 import { Check, X, UserPlus } from "lucide-react";
-import api from "@/api";
+import api, { openFichier } from "@/api";
 
 interface Contact {
   nom: string;
@@ -67,7 +67,8 @@ const DemandeList = () => {
 
   const fetchAudits = async () => {
     try {
-      const response = await api.get("/audits", );
+      // Projection allégée : le détail complet est chargé à l'ouverture d'une demande
+      const response = await api.get("/audits/summary", );
       setAudits(response.data);
     } catch (error) {
       console.error('Erreur de chargement:', error);
@@ -133,12 +134,13 @@ const DemandeList = () => {
     }
   };
 
-  const handleAffecter = (auditId: number, e: React.MouseEvent) => {
+  const handleAffecter = async (auditId: number, e: React.MouseEvent) => {
     e.stopPropagation();
-    const auditToAssign = audits.find(audit => audit.id === auditId);
-    if (auditToAssign) {
-      navigate('/assign', { state: { auditData: auditToAssign } });
-    } else {
+    try {
+      // La grille ne contient que le résumé : la demande complète est chargée pour l'affectation
+      const response = await api.get(`/audits/${auditId}`, );
+      navigate('/assign', { state: { auditData: response.data } });
+    } catch (error) {
       toast("Erreur", {
         description: "Impossible de trouver cette demande d'audit"
       });
@@ -341,9 +343,8 @@ const DemandeList = () => {
                       <div className="mt-4">
                         <p className="text-sm text-gray-600 mb-2">Fichier Architecture</p>
                         <a
-                          href={`http://localhost:8000/${selectedAudit.architecture_file_path}`}
-                          target="_blank"
-                          rel="noopener noreferrer"
+                          href="#"
+                          onClick={(e) => { e.preventDefault(); openFichier(selectedAudit.architecture_file_path); }}
                           className="text-blue-600 hover:text-blue-800 hover:underline flex items-center"
                         >
                           <svg xmlns="http://www.w3.org/2000/svg" className="h-4 w-4 mr-1" fill="none" viewBox="0 0 24 24" stroke="currentColor">
@@ -519,9 +520,8 @@ const DemandeList = () => {
                         {selectedAudit.fichiers_attaches.map((file, idx) => (
                           <li key={idx} className="flex">
                             <a 
-                              href={`http://localhost:8000/${file}`} 
-                              target="_blank" 
-                              rel="noopener noreferrer"
+                              href="#"
+                              onClick={(e) => { e.preventDefault(); openFichier(file); }}
                               className="text-blue-600 hover:text-blue-800 hover:underline flex items-center"
                             >
                               <svg xmlns="http://www.w3.org/2000/svg" className="h-4 w-4 mr-1" fill="none" viewBox="0 0 24 24" stroke="currentColor">
@@ -560,9 +560,8 @@ const DemandeList = () => {
                     <div className="mt-4">
                       <p className="text-sm text-gray-600 mb-2">Fiche Demande</p>
                       <a 
-                        href={`http://localhost:8000/${selectedAudit.fiche_demande_path}`} 
-                        target="_blank" 
-                        rel="noopener noreferrer"
+                        href="#"
+                        onClick={(e) => { e.preventDefault(); openFichier(selectedAudit.fiche_demande_path); }}
                         className="text-blue-600 hover:text-blue-800 hover:underline flex items-center"
                       >
                         <svg xmlns="http://www.w3.org/2000/svg" className="h-4 w-4 mr-1" fill="none" viewBox="0 0 24 24" stroke="currentColor">
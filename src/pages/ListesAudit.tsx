@@ -34,7 +34,7 @@ import {
   ArrowUp,
   PlusCircle
 } from "lucide-react";
-import api from "@/api";
+import api, { openFichier } from "@/api";
 import AddToPlanForm from "@/components/plan/AddToPlanForm";
 import CommentUploader from "@/components/audit/CommentUploader";
 
@@ -141,10 +141,7 @@ const ListesAudit = () => {
       return;
     }
   
-    const cleanedPath = path.replace(/\\/g, "/");
-    const url = `http://localhost:8000/${cleanedPath}`;
-  
-    window.open(url, "_blank");
+    openFichier(path);
   };
 
   const handleRequestSort = (property) => {
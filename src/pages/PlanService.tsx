@@ -143,17 +143,39 @@ const PlanService = () => {
     const formData = new FormData();
     formData.append("file", file);
     try {
-      await api.post(`/plan/upload`, formData, {
+      const response = await api.post(`/plan/upload`, formData, {
         
       });
-      toast.success("Fichier uploadé avec succès !");
-      fetchPlans();
+      toast.success("Fichier uploadé avec succès, importation en cours...");
+      pollImport(response.data.job_id);
     } catch (error) {
       console.error("Erreur lors de l'importation :", error);
       toast.error("Erreur lors de l'importation !");
     }
   };
 
+  const pollImport = async (jobId) => {
+    try {
+      const response = await api.get(`/plan/imports/${jobId}`);
+      const job = response.data;
+      if (job.status === "termine") {
+        if (job.errors.length > 0) {
+          toast.warning(`${job.plans_inserted} plan(s) importé(s), ${job.errors.length} ref(s) en erreur.`);
+        } else {
+          toast.success(`${job.plans_inserted} plan(s) importé(s) avec succès !`);
+        }
+        fetchPlans();
+      } else if (job.status === "echec") {
+        toast.error("Erreur lors de l'importation !");
+      } else {
+        setTimeout(() => pollImport(jobId), 1000);
+      }
+    } catch (error) {
+      console.error("Erreur lors du suivi de l'importation :", error);
+      toast.error("Erreur lors du suivi de l'importation !");
+    }
+  };
+
   const downloadPlans = async () => {
     try {
       const filteredParams = Object.fromEntries(
@@ -26,7 +26,7 @@ import {
 } from "@/components/ui/dialog";
 import { FileText, FileCheck2 } from "lucide-react";
 import { Label } from "@/components/ui/label";
-import api from "@/api";
+import api, { openFichier } from "@/api";
 
 interface Prestataire {
   id?: number;
@@ -202,14 +202,14 @@ const PrestataireList = () => {
                         <TableCell>{p.solde || "-"} MAD</TableCell>
                         <TableCell>
                           {typeof p.lettre_commande === "string" ? (
-                            <a href={`http://localhost:8000/${p.lettre_commande}`} target="_blank" rel="noreferrer" className="underline text-blue-600">
+                            <a href="#" onClick={(e) => { e.preventDefault(); openFichier(p.lettre_commande); }} className="underline text-blue-600">
                               Voir
                             </a>
                           ) : "-"}
                         </TableCell>
                         <TableCell>
                           {typeof p.pv_reception === "string" ? (
-                            <a href={`http://localhost:8000/${p.pv_reception}`} target="_blank" rel="noreferrer" className="underline text-blue-600">
+                            <a href="#" onClick={(e) => { e.preventDefault(); openFichier(p.pv_reception); }} className="underline text-blue-600">
                               Voir
                             </a>
                           ) : "-"}
@@ -217,7 +217,7 @@ const PrestataireList = () => {
                         <TableCell>
                           {p.pieces_jointes?.length ? (
                             p.pieces_jointes.map((file, idx) => (
-                              <a key={idx} href={`http://localhost:8000/${file}`} target="_blank" rel="noreferrer" className="block text-sm text-blue-500 underline">
+                              <a key={idx} href="#" onClick={(e) => { e.preventDefault(); openFichier(file); }} className="block text-sm text-blue-500 underline">
                                 Fichier {idx + 1}
                               </a>
                             ))